@@ -1,7 +1,9 @@
 import pandas as pd
 import numpy as np
 import os
+import re
 import sys
+import profiler
 
 # --- CONFIGURATION (EDIT THIS) ---
 
@@ -23,6 +25,22 @@ KNOWN_PHYSICAL_DISTANCE_MM = 10.0
 # Example: 35.75
 MEASURED_PIXEL_DISTANCE = 750.05 # <<< PASTE YOUR D_px VALUE HERE!
 
+# --- CHANNELS ---
+
+# Tracker columns and the displacement columns they are converted to. Every axis of every
+# marker is one channel; all channels are converted together in one array operation.
+# Rotation (degrees) is only zeroed, not scaled.
+PIXEL_CHANNEL_PATTERN = re.compile(r'^(x_pixel|y_pixel|rotation_deg)_M(\d+)$')
+
+def output_column(pixel_column):
+    """Output name of a tracker channel (y keeps the original 'displacement_M1_mm' name)."""
+    kind, marker = PIXEL_CHANNEL_PATTERN.match(pixel_column).groups()
+    if kind == 'y_pixel':
+        return f'displacement_M{marker}_mm'
+    if kind == 'x_pixel':
+        return f'displacement_x_M{marker}_mm'
+    return f'rotation_M{marker}_deg'
+
 # --- MAIN CONVERSION LOGIC ---
 
 def process_data_and_calibrate(input_path, output_path, known_mm, measured_px):
@@ -37,7 +55,9 @@ def process_data_and_calibrate(input_path, output_path, known_mm, measured_px):
         print("Please ensure vision_tracker.py was run successfully and the path is correct.")
         sys.exit(1)
         
-    df = pd.read_csv(input_path)
+    with profiler.stage('read_csv'):
+        df = pd.read_csv(input_path)
+    profiler.add_items('convert', len(df))
     
     # 2. Calculate the Conversion Factor
     # Factor is MM per Pixel: (Known MM) / (Measured Pixels)
@@ -46,29 +66,35 @@ def process_data_and_calibrate(input_path, output_path, known_mm, measured_px):
 
     # 3. Determine the Baseline (Zero-point)
     # We use the mean of the first 50 frames to establish the stationary zero position.
-    baseline_M1 = df['y_pixel_M1'].head(50).mean()
-    baseline_M2 = df['y_pixel_M2'].head(50).mean()
-    print(f"Baseline M1 (Average Y-Pixel): {baseline_M1:.2f} px")
-    print(f"Baseline M2 (Average Y-Pixel): {baseline_M2:.2f} px")
+    # Samples where the tracker could not measure (NaN, e.g. a failed rotation fit) are left out.
+    pixel_columns = [c for c in df.columns if PIXEL_CHANNEL_PATTERN.match(c)]
+    if not pixel_columns:
+        print("FATAL ERROR: No marker columns (x_pixel_M*, y_pixel_M*) found in the input file.")
+        sys.exit(1)
+    pixels = df[pixel_columns].to_numpy(dtype=np.float64) # samples x channels
+    baselines = np.nanmean(pixels[:50], axis=0)
+    for column, baseline in zip(pixel_columns, baselines):
+        print(f"Baseline {column} (Average of the first 50 frames): {baseline:.2f}")
     
     # 4. Convert Pixel Displacement to Millimeters
     
     # Note: Subtracting the baseline (mean position) from the raw pixel data centers 
     # the motion around the mean (y=0), giving us relative displacement in pixels.
     
-    # Calculate relative displacement in pixels
-    df['displacement_M1_px'] = df['y_pixel_M1'] - baseline_M1
-    df['displacement_M2_px'] = df['y_pixel_M2'] - baseline_M2
+    with profiler.stage('convert'):
+        # One scale factor per channel: mm per pixel for positions, 1 for rotations
+        scale = np.array([1.0 if c.startswith('rotation') else MM_PER_PIXEL_FACTOR for c in pixel_columns])
 
-    # Apply the conversion factor to get displacement in millimeters (mm)
-    df['displacement_M1_mm'] = df['displacement_M1_px'] * MM_PER_PIXEL_FACTOR
-    df['displacement_M2_mm'] = df['displacement_M2_px'] * MM_PER_PIXEL_FACTOR
+        # Relative displacement in pixels, then millimeters (mm), for all channels at once
+        converted = (pixels - baselines) * scale
     
     # 5. Prepare Output DataFrame (Select only necessary columns)
-    output_df = df[['time_s', 'displacement_M1_mm', 'displacement_M2_mm']].copy()
+    output_df = pd.DataFrame(converted, columns=[output_column(c) for c in pixel_columns])
+    output_df.insert(0, 'time_s', df['time_s'].values)
     
     # 6. Save the Final Processed Data
-    output_df.to_csv(output_path, index=False)
+    with profiler.stage('csv_write'):
+        output_df.to_csv(output_path, index=False)
     
     print("\n--- Data Conversion Complete ---")
     print(f"Data saved to: {output_path}")
@@ -2,6 +2,7 @@ import cv2
 import numpy as np
 import os 
 import sys 
+import frame_cache
 
 # --- CONFIGURATION (EDIT THIS) ---
 # Change this to the exact path of your video file. 
@@ -41,37 +42,47 @@ def click_event(event, x, y, flags, param):
                 print("\nUSE THIS D_px VALUE to update 'MEASURED_PIXEL_DISTANCE' in calibration_converter.py")
                 print("--- PRESS ANY KEY TO CLOSE WINDOWS ---")
 
-# --- Main Script Execution ---
+def measure_pixel_distance(video_path):
+    """
+    Shows the first frame of the video, lets the user click two ruler marks and
+    returns the pixel distance D_px between them (None if fewer than two points were clicked).
+    """
+    global img
 
-if __name__ == "__main__":
     # Robust check to ensure the video file exists before trying to open it
-    if not os.path.exists(VIDEO_PATH):
+    if not os.path.exists(video_path):
         print(f"\nFATAL ERROR: Video file not found at the specified path.")
-        print(f"Path configured: {VIDEO_PATH}")
+        print(f"Path configured: {video_path}")
         print("Please check the VIDEO_PATH variable in the script.")
         sys.exit(1)
 
-    cap = cv2.VideoCapture(VIDEO_PATH)
+    # First frame from the shared frame cache when the video was already decoded (e.g. by the tracker)
+    img = frame_cache.read_frame(video_path, 0)
+
+    if img is None:
+        print(f"Error: Could not read a frame from the video at {video_path}. File might be corrupted, empty or an unsupported format.")
+        return None
 
-    if not cap.isOpened():
-        print(f"Error: Could not open video file at {VIDEO_PATH}. File might be corrupted or an unsupported format.")
-        exit()
+    points.clear()
+    cv2.namedWindow('Calibration Frame')
+    cv2.setMouseCallback('Calibration Frame', click_event)
+    
+    print("INSTRUCTIONS:")
+    print("1. Click on the FIRST point on your ruler (e.g., the 10 mm mark).")
+    print("2. Click on the SECOND point (e.g., the 20 mm mark, or 10 mm away from the first).")
+    print("3. The pixel distance (D_px) will print in the console.")
+    
+    cv2.imshow('Calibration Frame', img)
+    
+    cv2.waitKey(0)
+    cv2.destroyAllWindows()
 
-    ret, img = cap.read() # Read the first frame into the variable 'img'
-    cap.release() 
+    if len(points) < 2:
+        return None
+    (x1, y1), (x2, y2) = points[:2]
+    return float(np.sqrt((x2 - x1)**2 + (y2 - y1)**2))
 
-    if ret:
-        cv2.namedWindow('Calibration Frame')
-        cv2.setMouseCallback('Calibration Frame', click_event)
-        
-        print("INSTRUCTIONS:")
-        print("1. Click on the FIRST point on your ruler (e.g., the 10 mm mark).")
-        print("2. Click on the SECOND point (e.g., the 20 mm mark, or 10 mm away from the first).")
-        print("3. The pixel distance (D_px) will print in the console.")
-        
-        cv2.imshow('Calibration Frame', img)
-        
-        cv2.waitKey(0)
-        cv2.destroyAllWindows()
-    else:
-        print("Error: Could not read a frame from the video. Check if the video is empty.")
\ No newline at end of file
+# --- Main Script Execution ---
+
+if __name__ == "__main__":
+    measure_pixel_distance(VIDEO_PATH)
\ No newline at end of file
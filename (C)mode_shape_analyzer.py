@@ -1,8 +1,10 @@
-import pandas as pd
 import numpy as np
 from scipy.fft import fft, fftfreq
 import os
 import sys
+import profiler
+import spectral_cache
+import timebase
 
 # --- CONFIGURATION (EDIT THIS) ---
 
@@ -32,12 +34,21 @@ def analyze_mode_shape(input_path, skip_samples, target_fn):
         print(f"FATAL ERROR: Processed data file not found at: {input_path}")
         sys.exit(1)
         
-    df = pd.read_csv(input_path)
+    with profiler.stage('read_csv'):
+        columns = spectral_cache.read_columns(input_path, ['time_s', 'displacement_M1_mm', 'displacement_M2_mm'])
     
     # 2. Prepare Data for Analysis
-    time_s = df['time_s'].values[skip_samples:]
-    disp_M1 = df['displacement_M1_mm'].values[skip_samples:]
-    disp_M2 = df['displacement_M2_mm'].values[skip_samples:]
+    time_s = columns['time_s'][skip_samples:]
+    disp_M1 = columns['displacement_M1_mm'][skip_samples:]
+    disp_M2 = columns['displacement_M2_mm'][skip_samples:]
+
+    # Gaps from dropped frames would shift the phase of the FFT: resample both markers
+    # onto a uniform time grid first (the phase needs uniform sampling).
+    gaps = timebase.detect_gaps(time_s)
+    if gaps['has_gaps']:
+        print(f"WARNING: {len(gaps['gap_indices'])} gap(s) in the time axis, resampling to a uniform grid.")
+        time_s, resampled, _ = timebase.resample_uniform(time_s, np.column_stack([disp_M1, disp_M2]))
+        disp_M1, disp_M2 = resampled[:, 0], resampled[:, 1]
 
     N = len(disp_M1) 
     
@@ -50,8 +61,15 @@ def analyze_mode_shape(input_path, skip_samples, target_fn):
     print(f"Target Frequency (f_n): {target_fn:.3f} Hz")
     
     # 3. Perform Fast Fourier Transform (FFT) on both signals
-    yf_M1 = fft(disp_M1)
-    yf_M2 = fft(disp_M2)
+    # The complex spectra are cached on disk, keyed by the file contents and the settings
+    with profiler.stage('fft'):
+        spectra = spectral_cache.cached_for_file(
+            input_path, lambda: {'yf_M1': fft(disp_M1), 'yf_M2': fft(disp_M2)},
+            analysis='complex_spectrum', column=['displacement_M1_mm', 'displacement_M2_mm'],
+            skip_samples=skip_samples, Fs=Fs, window='none'
+        )
+    profiler.add_items('fft', 2 * N)
+    yf_M1, yf_M2 = spectra['yf_M1'], spectra['yf_M2']
 
     # 4. Find the Frequency Index
     # Locate the index in the frequency array (xf) that is closest to our target f_n
@@ -98,6 +116,9 @@ def analyze_mode_shape(input_path, skip_samples, target_fn):
     print(f"Identified Mode Shape: {mode}")
     print(f"Description: {description}")
 
+    # The relative phase is returned for downstream use (e.g. damage_detector.py)
+    return relative_phase_deg
+
 
 if __name__ == "__main__":
     analyze_mode_shape(
@@ -2,6 +2,10 @@ import cv2
 import numpy as np
 import pandas as pd
 import os
+from array import array
+import frame_cache
+import profiler
+import timebase
 
 # --- CONFIGURATION (EDIT THIS) ---
 # UPDATE THIS with the path to your video file (MP4, AVI, etc.)
@@ -9,121 +13,465 @@ VIDEO_PATH = r"C:\Users\harin\Desktop\sem1\EL\data\VIDEO2.mp4"
 # UPDATE THIS with the desired output CSV file path
 OUTPUT_CSV_PATH =  r"C:\Users\harin\Desktop\sem1\EL\data\raw_pixel_positions1.csv"
 # NEW: Set the Frame Rate (Frames Per Second) of your video camera!
+# Only used as a fallback: time_s is taken from the real frame timestamps stored in the
+# video container, and the nominal rate from the container when it reports one.
 VIDEO_FRAME_RATE = 90.0 # <--- Set this to your camera's FPS (e.g., 30.0, 60.0, 120.0)
+# For permanent installations, live_capture.py tracks a camera (or any frame source)
+# in real time instead of a recorded file.
+
+# NEW: Decode-once frame cache (frame_cache.py). Set to True to decode the video once into a
+# memory-mapped file; re-runs with other ROIs or tracker settings then read the frames from
+# there and skip the codec. The file holds full uncompressed BGR frames (width x height x 3
+# bytes each, often 20-30x the compressed video; the size is printed when it is built), and
+# the saving is small when the tracker itself dominates the run time (~10 % with CSRT).
+# Worth it for repeated runs with a fast tracker (KCF, MOSSE) on a disk with space to spare.
+USE_FRAME_CACHE = False
+
+# NEW: Output of the full 2-D motion. Every marker gets x_pixel_M*, y_pixel_M* (box center,
+# float32). Optionally also the in-plane rotation rotation_deg_M* (counter-clockwise, relative
+# to the first frame) for torsional modes; it needs a textured marker and REACQUIRE_ENABLED
+# (the rotation is measured against the same marker templates).
+TRACK_ROTATION = False
+# Stop criteria of the ECC rotation fit (max. iterations, convergence threshold)
+ECC_CRITERIA = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 50, 1e-4)
+
+# NEW: Automatic recovery after tracking failures (occlusion, motion blur, glare).
+# A lost marker is searched for with template matching in a window around its last known
+# position; the window doubles with every frame the marker stays lost. When found, the
+# CSRT tracker is re-initialized there and tracking continues.
+REACQUIRE_ENABLED = True
+REACQUIRE_START_MARGIN_PX = 16 # Search margin around the last box on the first failed frame
+REACQUIRE_MAX_MARGIN_PX = 160 # The window stops growing here (markers only move a little)
+REACQUIRE_MIN_SCORE = 0.6 # Normalized correlation a match needs to be accepted (0...1)
+# Confidence = normalized correlation between the tracked box and the marker template.
+# A CSRT "success" below this value is treated as drift and triggers a re-acquisition too.
+MIN_CONFIDENCE = 0.4
+
+# NEW: Adaptive frame skipping for high-speed video (240-1000 fps).
+# The first PRELIMINARY_SECONDS are tracked on every frame; their spectrum gives the highest
+# frequency with real motion, and from then on only every k-th frame is tracked, with k chosen
+# so that this frequency is still sampled SKIP_OVERSAMPLING times per period (2.5x the Nyquist rate).
+# Skipped frames are only grabbed, not decoded for tracking. The real timestamps are kept,
+# so the analyzers see the effective (lower) sample rate.
+ADAPTIVE_FRAME_SKIPPING = False
+PRELIMINARY_SECONDS = 1.0
+SKIP_OVERSAMPLING = 5.0
+MAX_FRAME_STEP = 32
+MAX_MODE_FREQUENCY_HZ = 30.0 # Assumed when the preliminary window shows no clear motion
+SPECTRUM_PEAK_FRACTION = 0.1 # Spectral lines above this fraction of the largest count as motion
+MIN_MOTION_PX = 0.5 # Smaller amplitudes are pixel quantization noise, not motion
+# A jump between two tracked frames larger than MOTION_THRESHOLD_FACTOR x the largest jump over
+# k frames in the preliminary window (and at least MOTION_THRESHOLD_PX), e.g. a new impact,
+# switches back to tracking every frame for REFINE_HOLD_S seconds.
+MOTION_THRESHOLD_FACTOR = 2.0
+MOTION_THRESHOLD_PX = 3.0
+REFINE_HOLD_S = 0.5
 
 # --- MAIN FUNCTIONS ---
 
-def track_markers(video_path, output_csv_path):
+# Box colors (BGR) used for the visualization of each marker: M1 blue, M2 red, ...
+MARKER_COLORS = [(255, 0, 0), (0, 0, 255), (0, 255, 0), (0, 255, 255), (255, 0, 255), (255, 255, 0)]
+
+def create_trackers(frame, rois):
     """
-    Initializes two CSRT trackers, tracks two markers (M1 & M2) frame-by-frame,
-    and saves the raw center Y-pixel positions and time to a CSV file.
+    Initializes one CSRT tracker per ROI (x, y, w, h) on the given frame.
     """
-    
-    # Check if the video file exists before loading
-    if not os.path.exists(video_path):
-        print(f"FATAL ERROR: Video file not found at: {video_path}")
-        print("Please update the VIDEO_PATH variable in the script.")
-        return
+    trackers = []
+    for roi in rois:
+        tracker = cv2.TrackerCSRT_create()
+        tracker.init(frame, tuple(int(v) for v in roi))
+        trackers.append(tracker)
+    return trackers
 
-    print(f"Loading video from: {video_path}")
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        print(f"Error: Could not open video at {video_path}")
-        return
+def new_recovery_state(frame, rois):
+    """
+    Per-marker data for the failure recovery: the marker templates cut from the
+    initialization frame, the last known boxes and the number of consecutive failures.
+    """
+    boxes = [tuple(int(v) for v in roi) for roi in rois]
+    templates = [frame[y:y + h, x:x + w].copy() for x, y, w, h in boxes]
+    return {'templates': templates, 'last_boxes': boxes, 'failures': [0] * len(boxes), 'reacquired': 0}
 
-    # 1. READ FIRST FRAME & INITIALIZE
-    ret, frame = cap.read()
-    if not ret:
-        print("Error: Could not read first frame.")
-        return
+def box_confidence(frame, box, template):
+    """Normalized correlation (TM_CCOEFF_NORMED) between the frame inside box and the template."""
+    x, y, w, h = [int(v) for v in box]
+    if x < 0 or y < 0:
+        return 0.0
+    patch = frame[y:y + h, x:x + w]
+    if patch.shape != template.shape:
+        return 0.0
+    return float(cv2.matchTemplate(patch, template, cv2.TM_CCOEFF_NORMED)[0, 0])
 
-    # --- Marker Initialization ---
-    trackers = []
-    
-    # --- Marker 1 (Center Span) Selection ---
-    print("\n--- Marker 1 (Center Span) Setup ---")
-    print("Draw a tight bounding box around the center marker and press ENTER/SPACE.")
-    roi1 = cv2.selectROI("Select Marker 1 ROI (Center Span)", frame, False)
-    
-    # Initialize and start Tracker 1
-    tracker1 = cv2.TrackerCSRT_create()
-    tracker1.init(frame, roi1)
-    trackers.append(tracker1)
-    
-    # --- Marker 2 (Quarter Span) Selection ---
-    print("\n--- Marker 2 (Quarter Span) Setup ---")
-    print("Draw a tight bounding box around the quarter-span marker and press ENTER/SPACE.")
-    roi2 = cv2.selectROI("Select Marker 2 ROI (Quarter Span)", frame, False)
-    
-    # Initialize and start Tracker 2
-    tracker2 = cv2.TrackerCSRT_create()
-    tracker2.init(frame, roi2)
-    trackers.append(tracker2)
-    
-    cv2.destroyAllWindows()
-    
-    # UPDATED: Added 'time_s' column
-    data = {'frame_index': [], 'time_s': [], 'y_pixel_M1': [], 'y_pixel_M2': []}
+def boxes_overlap(box_a, box_b):
+    """True if the two (x, y, w, h) boxes share at least one pixel."""
+    ax, ay, aw, ah = [int(v) for v in box_a]
+    bx, by, bw, bh = [int(v) for v in box_b]
+    return ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah
+
+def reacquire_marker(frame, template, last_box, margin, exclude_boxes=()):
+    """
+    Template search in a window of +-margin pixels around the last known box.
+    Positions overlapping one of exclude_boxes (the other markers, which usually look
+    the same) are not considered. Returns (box, score) of the best match.
+    """
+    x, y, w, h = last_box
+    height, width = frame.shape[:2]
+    x0, y0 = max(x - margin, 0), max(y - margin, 0)
+    x1, y1 = min(x + w + margin, width), min(y + h + margin, height)
+    window = frame[y0:y1, x0:x1]
+    if window.shape[0] < h or window.shape[1] < w:
+        return last_box, 0.0
+
+    scores = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+    for ex, ey, ew, eh in exclude_boxes:
+        # Every top-left corner whose box would overlap the excluded box
+        rows = slice(max(ey - h + 1 - y0, 0), max(ey + eh - y0, 0))
+        cols = slice(max(ex - w + 1 - x0, 0), max(ex + ew - x0, 0))
+        scores[rows, cols] = -1.0
+    _, best_score, _, (best_x, best_y) = cv2.minMaxLoc(scores)
+    return (x0 + best_x, y0 + best_y, w, h), float(best_score)
+
+def gray_float(patch):
+    """Grayscale float32 copy of an image patch (input format of findTransformECC)."""
+    if patch.ndim == 3:
+        patch = cv2.cvtColor(patch, cv2.COLOR_BGR2GRAY)
+    return patch.astype(np.float32)
+
+def marker_rotation_deg(frame, box, template_gray):
+    """
+    In-plane rotation (degrees, counter-clockwise) of the marker inside box relative to its
+    template, from an ECC alignment with a Euclidean (rotation + translation) motion model.
+    Returns NaN when the alignment does not converge.
+    """
+    x, y, w, h = [int(v) for v in box]
+    patch = frame[max(y, 0):y + h, max(x, 0):x + w]
+    if patch.shape[:2] != template_gray.shape:
+        return float('nan')
+    warp = np.eye(2, 3, dtype=np.float32)
+    try:
+        _, warp = cv2.findTransformECC(template_gray, gray_float(patch), warp, cv2.MOTION_EUCLIDEAN, ECC_CRITERIA, None, 1)
+    except cv2.error:
+        return float('nan')
+    return float(-np.degrees(np.arctan2(warp[1, 0], warp[0, 0])))
+
+def update_markers(frame, trackers, recovery=None):
+    """
+    Updates every tracker on the frame and returns one (ok, box, confidence) per marker.
+    With a recovery state, lost or drifting markers are re-acquired by template search
+    and their tracker is replaced by a new one initialized at the found box.
+    Without one, confidence is NaN (not computed).
+    """
+    results = []
+    for i, tracker in enumerate(trackers):
+        ok, box = tracker.update(frame)
+        if recovery is None:
+            results.append((ok, box, float('nan')))
+            continue
+
+        template = recovery['templates'][i]
+        others = [b for j, b in enumerate(recovery['last_boxes']) if j != i]
+        confidence = box_confidence(frame, box, template) if ok else 0.0
+        # A box on top of another marker means the tracker jumped to the wrong (identical) marker
+        if not ok or confidence < MIN_CONFIDENCE or any(boxes_overlap(box, b) for b in others):
+            ok = False
+            margin = min(REACQUIRE_START_MARGIN_PX * 2 ** min(recovery['failures'][i], 16), REACQUIRE_MAX_MARGIN_PX)
+            found_box, score = reacquire_marker(frame, template, recovery['last_boxes'][i], margin, others)
+            if score >= REACQUIRE_MIN_SCORE:
+                trackers[i] = cv2.TrackerCSRT_create()
+                trackers[i].init(frame, found_box)
+                ok, box, confidence = True, found_box, score
+                recovery['reacquired'] += 1
+
+        if ok:
+            recovery['last_boxes'][i] = tuple(int(v) for v in box)
+            recovery['failures'][i] = 0
+        else:
+            recovery['failures'][i] += 1
+        results.append((ok, box, confidence))
+    return results
+
+def container_frame_rate(cap, fallback_rate):
+    """
+    Returns the nominal frame rate stored in the video container, or the fallback
+    (e.g. VIDEO_FRAME_RATE) if the backend does not report a usable value.
+    """
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if fps and 1.0 <= fps <= 100000.0:
+        return fps
+    return fallback_rate
+
+def frame_timestamp(cap, frame_count, frame_rate, previous_s):
+    """
+    Returns the presentation time (s) of the frame that was just read, from the
+    container timestamp (CAP_PROP_POS_MSEC). Backends that do not provide timestamps
+    return 0 or non-increasing values; then the time is derived from the frame rate.
+    """
+    timestamp_s = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+    if timestamp_s > 0 and (previous_s is None or timestamp_s > previous_s):
+        return timestamp_s
+    if previous_s is None:
+        return frame_count / frame_rate
+    return max(frame_count / frame_rate, previous_s + 1.0 / frame_rate)
+
+def choose_frame_step(positions, frame_rate):
+    """
+    Picks k (track every k-th frame) from marker positions (samples x markers) tracked on
+    every frame: the highest frequency with significant motion must still be sampled
+    SKIP_OVERSAMPLING times per period. Returns (k, highest frequency in Hz).
+    """
+    positions = np.asarray(positions, dtype=float)
+    n = len(positions)
+    f_max = MAX_MODE_FREQUENCY_HZ
+    if n >= 16:
+        spectrum = 2.0 / n * np.abs(np.fft.rfft(positions - positions.mean(axis=0), axis=0))[1:]
+        freqs = np.fft.rfftfreq(n, 1.0 / frame_rate)[1:]
+        strongest = spectrum.max()
+        if strongest >= MIN_MOTION_PX:
+            significant = np.flatnonzero((spectrum >= SPECTRUM_PEAK_FRACTION * strongest).any(axis=1))
+            f_max = float(freqs[significant.max()])
+
+    k = int(frame_rate / (SKIP_OVERSAMPLING * f_max))
+    return min(max(k, 1), MAX_FRAME_STEP), f_max
+
+def output_columns(n_markers, recovery=None):
+    """
+    Names of the per-marker output columns: (x, y, rotation, confidence) lists. Rotation
+    needs TRACK_ROTATION and the marker templates of a recovery state, confidence a recovery state.
+    """
+    x_columns = [f'x_pixel_M{i + 1}' for i in range(n_markers)]
+    y_columns = [f'y_pixel_M{i + 1}' for i in range(n_markers)]
+    track_rotation = TRACK_ROTATION and recovery is not None
+    rotation_columns = [f'rotation_deg_M{i + 1}' for i in range(n_markers)] if track_rotation else []
+    confidence_columns = [f'confidence_M{i + 1}' for i in range(n_markers)] if recovery else []
+    return x_columns, y_columns, rotation_columns, confidence_columns
+
+def run_tracking_loop(cap, trackers, frame_rate, show_window=True, recovery=None, adaptive=False, progress=None):
+    """
+    Updates all trackers frame-by-frame until the video ends (or 'q' is pressed)
+    and returns the collected data columns, the number of frames read and the
+    indices of the frames where tracking failed (those frames are not stored).
+    Marker i is stored in the float32 columns 'x_pixel_M{i+1}' and 'y_pixel_M{i+1}'
+    (and 'rotation_deg_M{i+1}' with TRACK_ROTATION). With show_window=False the
+    loop runs headless (no drawing, no window), e.g. for batch runs and benchmarks.
+    'time_s' holds the real frame timestamps, relative to the first tracked frame.
+    With a recovery state (new_recovery_state) lost markers are re-acquired and the
+    per-sample tracking confidence is stored in 'confidence_M{i+1}'.
+    With adaptive=True only every k-th frame is tracked (see ADAPTIVE_FRAME_SKIPPING).
+    'progress' is an optional callable progress(frame_count, total_frames), called about
+    once per second of video (total_frames is 0 when the container does not report it).
+    """
+    x_columns, y_columns, rotation_columns, confidence_columns = output_columns(len(trackers), recovery)
+    track_rotation = bool(rotation_columns)
+    template_grays = [gray_float(t) for t in recovery['templates']] if track_rotation else []
+
+    # Compact typed arrays (4 bytes per float32 value instead of a Python float object)
+    data = {'frame_index': array('l'), 'time_s': array('d')}
+    for column in x_columns + y_columns + rotation_columns + confidence_columns:
+        data[column] = array('f')
+    failed_frames = []
     frame_count = 0
+    first_timestamp_s = None
+    previous_timestamp_s = None
 
-    # 2. TRACKING LOOP
-    print("\nStarting frame-by-frame tracking... Press 'q' to stop early.")
+    # Adaptive frame skipping state
+    preliminary_frames = int(PRELIMINARY_SECONDS * frame_rate) if adaptive else None
+    base_step = 1
+    motion_limit_px = float('inf')
+    next_tracked_frame = 0
+    refine_until_frame = -1
+    last_centers = None
+
+    total_frames = max(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), 0)
+    progress_interval = max(int(round(frame_rate)), 1)
+
+    loop_start = profiler.now()
     while cap.isOpened():
-        ret, frame = cap.read()
+        if frame_count < next_tracked_frame:
+            # Skipped frame: advance the stream without decoding it for tracking
+            with profiler.frame('video_grab'):
+                ret = cap.grab()
+            if not ret:
+                break
+            frame_count += 1
+            continue
+
+        with profiler.frame('video_decode'):
+            ret, frame = cap.read()
         if not ret:
             break
+
+        # Real timestamp of this frame (keeps gaps from dropped frames visible)
+        timestamp_s = frame_timestamp(cap, frame_count, frame_rate, previous_timestamp_s)
+        previous_timestamp_s = timestamp_s
+        if first_timestamp_s is None:
+            first_timestamp_s = timestamp_s
         
         # Manually update each tracker sequentially
-        success1, box1 = trackers[0].update(frame)
-        success2, box2 = trackers[1].update(frame)
+        with profiler.frame('csrt_update'):
+            results = update_markers(frame, trackers, recovery)
         
-        success = success1 and success2 # Overall success is only true if both succeed
+        success = all(ok for ok, _, _ in results) # Overall success is only true if all markers succeed
 
         if success:
-            # Calculate current time
-            current_time = frame_count / VIDEO_FRAME_RATE
-            
-            # Extract data from Tracker 1 (M1)
-            x1, y1, w1, h1 = [int(v) for v in box1]
-            y_center_M1 = y1 + h1 // 2
-            
-            # Extract data from Tracker 2 (M2)
-            x2, y2, w2, h2 = [int(v) for v in box2]
-            y_center_M2 = y2 + h2 // 2
+            # Current time relative to the first tracked frame
+            current_time = timestamp_s - first_timestamp_s
             
             # Store the data
             data['frame_index'].append(frame_count)
             data['time_s'].append(current_time) # Store time in seconds
-            data['y_pixel_M1'].append(y_center_M1)
-            data['y_pixel_M2'].append(y_center_M2)
+
+            for i, (_, box, confidence) in enumerate(results):
+                # Extract the center (x, y) of each marker box
+                x, y, w, h = [int(v) for v in box]
+                data[x_columns[i]].append(x + w / 2.0)
+                data[y_columns[i]].append(y + h / 2.0)
+                if track_rotation:
+                    data[rotation_columns[i]].append(marker_rotation_deg(frame, box, template_grays[i]))
+                if recovery:
+                    data[confidence_columns[i]].append(confidence)
+                
+                # Optional: Visualization feedback
+                if show_window:
+                    cv2.rectangle(frame, (x, y), (x + w, y + h), MARKER_COLORS[i % len(MARKER_COLORS)], 2)
             
-            # Optional: Visualization feedback
-            cv2.rectangle(frame, (x1, y1), (x1 + w1, y1 + h1), (255, 0, 0), 2)
-            cv2.rectangle(frame, (x2, y2), (x2 + w2, y2 + h2), (0, 0, 255), 2)
-            cv2.putText(frame, f"Time: {current_time:.2f}s | Frame: {frame_count}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+            if show_window:
+                cv2.putText(frame, f"Time: {current_time:.2f}s | Frame: {frame_count}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+
+            # Large motion between two tracked frames: track every frame for a while
+            centers = [data[column][-1] for column in x_columns + y_columns]
+            if adaptive and last_centers is not None and base_step > 1:
+                if max(abs(a - b) for a, b in zip(centers, last_centers)) > motion_limit_px:
+                    refine_until_frame = frame_count + int(REFINE_HOLD_S * frame_rate)
+            last_centers = centers
         
         else:
-            cv2.putText(frame, "Tracking Failed!", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+            # The sample is missing from the output; remember the frame so the gap is reported
+            failed_frames.append(frame_count)
+            if show_window:
+                cv2.putText(frame, "Tracking Failed!", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
 
-        cv2.imshow("Tracking Markers", frame)
-        
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+        if show_window:
+            with profiler.frame('display'):
+                cv2.imshow("Tracking Markers", frame)
+                key = cv2.waitKey(1) & 0xFF
+            
+            if key == ord('q'):
+                break
+
+        if adaptive:
+            if preliminary_frames is not None and frame_count + 1 >= preliminary_frames:
+                # End of the preliminary window: choose the frame step from its spectrum
+                positions = np.column_stack([data[c] for c in x_columns + y_columns])
+                base_step, f_max = choose_frame_step(positions, frame_rate)
+                largest_jump = np.max(np.abs(positions[base_step:] - positions[:-base_step])) if len(positions) > base_step else 0.0
+                motion_limit_px = max(MOTION_THRESHOLD_PX, MOTION_THRESHOLD_FACTOR * largest_jump)
+                preliminary_frames = None
+                # Keep only the preliminary samples on the new grid, so the record is uniform
+                keep = (np.asarray(data['frame_index']) - frame_count) % base_step == 0
+                for column in data:
+                    data[column] = array(data[column].typecode, np.asarray(data[column])[keep].tobytes())
+                print(f"Adaptive frame skipping: motion up to ~{f_max:.1f} Hz, tracking every {base_step}. frame "
+                      f"({frame_rate / base_step:.1f} Hz effective sample rate)")
+            # After a failure the next frame is tracked again (quick recovery)
+            step = 1 if (frame_count < refine_until_frame or not success) else base_step
+            next_tracked_frame = frame_count + step
 
         frame_count += 1
+        if progress is not None and frame_count % progress_interval == 0:
+            progress(frame_count, total_frames)
+
+    if profiler.is_enabled():
+        profiler.record_stage('tracking_loop', profiler.now() - loop_start)
+        profiler.add_items('tracking_loop', frame_count)
+
+    # Typed arrays -> NumPy arrays (no copy of the values)
+    data = {column: np.asarray(values) for column, values in data.items()}
+    return data, frame_count, failed_frames
+
+def track_markers(video_path, output_csv_path, rois=None, show_window=True, progress=None):
+    """
+    Initializes two CSRT trackers, tracks two markers (M1 & M2) frame-by-frame,
+    and saves the raw center (x, y) pixel positions and time to a CSV file.
+    'rois' is an optional list of marker boxes (x, y, w, h); without it both markers are
+    drawn on the first frame. With rois and show_window=False no window is opened at all
+    (e.g. for analysis_service.py). 'progress' is passed on to run_tracking_loop.
+    """
+    
+    # Check if the video file exists before loading
+    if not os.path.exists(video_path):
+        print(f"FATAL ERROR: Video file not found at: {video_path}")
+        print("Please update the VIDEO_PATH variable in the script.")
+        return
+
+    print(f"Loading video from: {video_path}")
+    with profiler.stage('video_open'):
+        cap = frame_cache.open_video(video_path) if USE_FRAME_CACHE else cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"Error: Could not open video at {video_path}")
+        return
+
+    # 1. READ FIRST FRAME & INITIALIZE
+    with profiler.stage('first_frame_decode'):
+        ret, frame = cap.read()
+    if not ret:
+        print("Error: Could not read first frame.")
+        return
+
+    if rois is None:
+        # --- Marker 1 (Center Span) Selection ---
+        print("\n--- Marker 1 (Center Span) Setup ---")
+        print("Draw a tight bounding box around the center marker and press ENTER/SPACE.")
+        roi1 = cv2.selectROI("Select Marker 1 ROI (Center Span)", frame, False)
+        
+        # --- Marker 2 (Quarter Span) Selection ---
+        print("\n--- Marker 2 (Quarter Span) Setup ---")
+        print("Draw a tight bounding box around the quarter-span marker and press ENTER/SPACE.")
+        roi2 = cv2.selectROI("Select Marker 2 ROI (Quarter Span)", frame, False)
+        rois = [roi1, roi2]
+        cv2.destroyAllWindows()
+    rois = [tuple(int(v) for v in roi) for roi in rois]
+    
+    # Initialize and start the trackers
+    trackers = create_trackers(frame, rois)
+    recovery = new_recovery_state(frame, rois) if REACQUIRE_ENABLED else None
+    if TRACK_ROTATION and recovery is None:
+        print("WARNING: TRACK_ROTATION needs REACQUIRE_ENABLED = True (marker templates); rotation is not stored.")
+
+    # 2. TRACKING LOOP
+    print(f"\nStarting frame-by-frame tracking of {len(rois)} marker(s)..." + (" Press 'q' to stop early." if show_window else ""))
+    frame_rate = container_frame_rate(cap, VIDEO_FRAME_RATE)
+    data, frame_count, failed_frames = run_tracking_loop(cap, trackers, frame_rate, show_window=show_window,
+                                                         recovery=recovery, adaptive=ADAPTIVE_FRAME_SKIPPING,
+                                                         progress=progress)
         
     # 3. FINALIZATION AND SAVING
     cap.release()
-    cv2.destroyAllWindows()
+    if show_window:
+        cv2.destroyAllWindows()
     
     # Only save if we captured some data
-    if data['frame_index']:
+    if len(data['frame_index']):
         df = pd.DataFrame(data)
-        df.to_csv(output_csv_path, index=False)
+        with profiler.stage('csv_write'):
+            df.to_csv(output_csv_path, index=False)
         
         print("\n--- Tracking Complete ---")
         print(f"Total frames processed: {frame_count}")
-        print(f"Data sampling rate: {VIDEO_FRAME_RATE} Hz")
+        if ADAPTIVE_FRAME_SKIPPING:
+            print(f"Frames tracked (adaptive frame skipping): {len(data['frame_index'])}")
+        print(f"Nominal frame rate: {frame_rate:.2f} Hz")
+        print(f"Frames lost to tracking failure: {len(failed_frames)}")
+        if recovery:
+            print(f"Markers re-acquired after a failure: {recovery['reacquired']} time(s)")
+            print(f"Lowest tracking confidence: {min(min(data[c]) for c in data if c.startswith('confidence_')):.2f}")
+        if len(data['time_s']) > 1:
+            gaps = timebase.detect_gaps(data['time_s'])
+            print(f"Effective sampling rate (from timestamps): {1.0 / gaps['dt']:.2f} Hz")
+            if len(gaps['dense_indices']):
+                print(f"{len(gaps['dense_indices'])} sample(s) tracked at a higher rate during large motion.")
+            if gaps['has_gaps']:
+                print(f"WARNING: {len(gaps['gap_indices'])} gap(s) in the time axis, about {gaps['missing_samples']} missing sample(s).")
+                print("The analyzers resample (or use a Lomb-Scargle spectrum) to keep the spectrum correct.")
         print(f"Raw pixel data saved to: {output_csv_path}")
     else:
         print("\n--- Tracking Aborted ---")
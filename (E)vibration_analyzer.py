@@ -1,9 +1,13 @@
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy.fft import fft, fftfreq
+from scipy.fft import rfft, rfftfreq
 import os
 import sys
+import out_of_core
+import profiler
+import report_renderer
+import signal_filter
+import spectral_cache
+import timebase
 
 # --- CONFIGURATION (EDIT THIS) ---
 
@@ -20,6 +24,44 @@ TARGET_COLUMN = 'displacement_M1_mm'
 # Useful for skipping the initial transient or impact event.
 SKIP_INITIAL_SAMPLES = 5 
 
+# 4. FILTERING (signal_filter.py)
+# Optional zero-phase band-pass (low_Hz, high_Hz) applied to the signal before the FFT,
+# e.g. (1.0, 20.0) to suppress drift and tracking noise. The filtered signal is decimated
+# as well, so the FFT runs on fewer samples. None analyzes the unfiltered signal.
+FILTER_BAND_HZ = None
+
+# 5. ALL CHANNELS
+# True: analyze every channel of the file at once (x and y displacement of every marker and,
+# if tracked, rotation), in one batched FFT; prints the dominant frequency of each channel.
+# Lateral and torsional modes show up in the x and rotation channels.
+ANALYZE_ALL_CHANNELS = False
+
+# 6. LARGE FILES (out_of_core.py)
+# 'auto': files above out_of_core.OUT_OF_CORE_THRESHOLD_MB are analyzed chunk by chunk in one
+# pass (Welch-averaged spectrum, constant memory) instead of being loaded completely.
+# True/False forces either path.
+OUT_OF_CORE = 'auto'
+
+# --- CORE FUNCTIONS ---
+
+def compute_spectrum(displacement_mm, T):
+    """
+    Performs the FFT of a displacement signal sampled every T seconds and returns
+    the positive frequencies (xf) and the single-sided amplitude spectrum (psd).
+    A 2-D input (samples x channels) is transformed column by column in one batched call.
+    """
+    N = len(displacement_mm)
+
+    # Real input: rfft computes only the positive frequency side (half the work of fft)
+    yf = rfft(displacement_mm, axis=0)
+    xf = rfftfreq(N, T)[:N//2] # Only take the positive frequency side
+
+    # Calculate the Power Spectral Density (PSD)
+    # The magnitude squared gives a measure of power at each frequency
+    # We only care about the positive frequency components
+    psd = 2.0/N * np.abs(yf[0:N//2]) 
+    return xf, psd
+
 # --- MAIN ANALYSIS LOGIC ---
 
 def analyze_and_plot_vibration(input_path, target_column, skip_samples):
@@ -33,13 +75,18 @@ def analyze_and_plot_vibration(input_path, target_column, skip_samples):
         print(f"FATAL ERROR: Processed data file not found at: {input_path}")
         print("Please ensure calibration_converter.py was run successfully and the path is correct.")
         sys.exit(1)
+
+    if out_of_core.use_out_of_core(input_path, OUT_OF_CORE):
+        return analyze_vibration_out_of_core(input_path, target_column, skip_samples)
         
-    df = pd.read_csv(input_path)
+    # Parsed columns are cached, so re-analyzing the same file skips pd.read_csv
+    with profiler.stage('read_csv'):
+        columns = spectral_cache.read_columns(input_path, ['time_s', target_column])
     
     # 2. Prepare Data for Analysis
     # Get the time and displacement arrays, skipping the initial transient data
-    time_s = df['time_s'].values[skip_samples:]
-    displacement_mm = df[target_column].values[skip_samples:]
+    time_s = columns['time_s'][skip_samples:]
+    displacement_mm = columns[target_column][skip_samples:]
 
     if len(displacement_mm) == 0:
         print("Error: Dataset is empty after skipping initial samples.")
@@ -50,28 +97,57 @@ def analyze_and_plot_vibration(input_path, target_column, skip_samples):
     # Calculate the Sample Rate (Fs) and Time Step (T)
     # The time step is the average difference between consecutive time points
     T = np.mean(np.diff(time_s)) 
+
+    # Dropped frames or tracking failures leave gaps, which break the uniform-sampling FFT.
+    # In that case the nominal (median) step is used and the gaps are handled by timebase.py.
+    gaps = timebase.detect_gaps(time_s)
+    if gaps['has_gaps']:
+        T = gaps['dt']
     Fs = 1.0 / T # Sample Frequency (Hz)
 
+    if FILTER_BAND_HZ is not None:
+        # Filtering needs a uniform time axis: gaps are interpolated first
+        if gaps['has_gaps']:
+            time_s, displacement_mm, _ = timebase.resample_uniform(time_s, displacement_mm, T)
+            gaps = timebase.detect_gaps(time_s)
+        time_s, displacement_mm, Fs = signal_filter.filter_and_decimate(time_s, displacement_mm, Fs, FILTER_BAND_HZ)
+        T = 1.0 / Fs
+        N = len(displacement_mm)
+
     print(f"\n--- Analysis Parameters ---")
     print(f"Sampling Frequency (Fs): {Fs:.2f} Hz")
     print(f"Total Samples Analyzed (N): {N}")
     print(f"Total Time Analyzed: {time_s[-1] - time_s[0]:.2f} seconds")
+    if FILTER_BAND_HZ is not None:
+        print(f"Band-pass filter: {FILTER_BAND_HZ[0]} - {FILTER_BAND_HZ[1]} Hz (Fs above is after decimation)")
+    if gaps['has_gaps']:
+        print(f"WARNING: {len(gaps['gap_indices'])} gap(s) in the time axis (~{gaps['missing_samples']} missing samples).")
+        print(f"Spectrum computed with the '{timebase.NONUNIFORM_METHOD}' method for non-uniform sampling.")
     
     # 3. Perform Fast Fourier Transform (FFT)
-    # yf: The magnitude of the FFT (complex numbers)
-    # xf: The frequencies corresponding to the magnitudes
+    # xf: The frequencies, psd: the amplitude at each frequency
     
-    yf = fft(displacement_mm)
-    xf = fftfreq(N, T)[:N//2] # Only take the positive frequency side
+    def spectrum_and_peak():
+        if gaps['has_gaps']:
+            xf, psd, _ = timebase.amplitude_spectrum(time_s, displacement_mm)
+        else:
+            xf, psd = compute_spectrum(displacement_mm, T)
+        # Find the index of the largest magnitude peak in the PSD
+        return {'xf': xf, 'psd': psd, 'peak_index': int(np.argmax(psd))}
 
-    # Calculate the Power Spectral Density (PSD)
-    # The magnitude squared gives a measure of power at each frequency
-    # We only care about the positive frequency components
-    psd = 2.0/N * np.abs(yf[0:N//2]) 
+    # The spectrum is cached on disk, keyed by the file contents and the analysis settings
+    with profiler.stage('fft'):
+        spectrum = spectral_cache.cached_for_file(
+            input_path, spectrum_and_peak,
+            analysis='amplitude_spectrum', column=target_column,
+            skip_samples=skip_samples, Fs=Fs, window='none', band=FILTER_BAND_HZ,
+            nonuniform_method=timebase.NONUNIFORM_METHOD if gaps['has_gaps'] else None
+        )
+    profiler.add_items('fft', N)
+    xf, psd = spectrum['xf'], spectrum['psd']
 
     # 4. Find the Dominant Natural Frequency
-    # Find the index of the largest magnitude peak in the PSD
-    peak_index = np.argmax(psd)
+    peak_index = spectrum['peak_index']
     natural_frequency_Hz = xf[peak_index]
 
     print(f"\n--- Results ---")
@@ -79,38 +155,176 @@ def analyze_and_plot_vibration(input_path, target_column, skip_samples):
     print(f"Dominant Amplitude (Max PSD): {psd[peak_index]:.4f} mm")
     
     # 5. Plotting (Time Domain and Frequency Domain)
-    
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
-    fig.suptitle(f"Vision-Based Vibration Analysis - Marker: {target_column}", fontsize=16)
-
-    # --- Plot 1: Time Domain (Displacement vs. Time) ---
-    ax1.plot(time_s, displacement_mm, label='Displacement', linewidth=1.5)
-    ax1.set_title('Displacement Time History')
-    ax1.set_xlabel('Time (s)')
-    ax1.set_ylabel('Displacement (mm)')
-    ax1.grid(True, linestyle='--', alpha=0.6)
-    ax1.legend()
-    
-    # --- Plot 2: Frequency Domain (FFT/PSD) ---
-    ax2.plot(xf, psd, label='Power Spectral Density', color='red', linewidth=2)
-    
-    # Highlight the dominant natural frequency peak
-    ax2.plot(natural_frequency_Hz, psd[peak_index], 'o', color='green', markersize=8, 
-             label=f'Peak f_n: {natural_frequency_Hz:.3f} Hz')
-             
-    ax2.set_title('Frequency Spectrum (FFT/PSD)')
-    ax2.set_xlabel('Frequency (Hz)')
-    ax2.set_ylabel('Amplitude (mm)')
-    ax2.set_xlim(0, Fs / 2) # Limit x-axis to Nyquist frequency
-    ax2.grid(True, linestyle='--', alpha=0.6)
-    ax2.legend()
-
-    plt.tight_layout(rect=[0, 0, 1, 0.96]) # Adjust layout to prevent title overlap
-    plt.show()
+    # Opens a window, or exports PNG/SVG/HTML in the background when SHM_HEADLESS=1
+    report_renderer.show_or_export(
+        f"vibration_{target_column}",
+        report_renderer.draw_vibration_analysis,
+        (time_s, displacement_mm, xf, psd, peak_index, target_column, Fs),
+        figsize=(12, 10),
+        summary={'f_n (Hz)': f"{natural_frequency_Hz:.3f}", 'Max amplitude (mm)': f"{psd[peak_index]:.4f}"}
+    )
+
+    # The natural frequency is returned for downstream use (e.g. damage_detector.py)
+    return natural_frequency_Hz
+
+def analyze_vibration_out_of_core(input_path, target_column, skip_samples):
+    """
+    One-pass version of analyze_and_plot_vibration for files larger than memory:
+    the file is read chunk by chunk, the spectrum is averaged over segments (Welch)
+    and only a min/max envelope of the time history is kept for the plot.
+    """
+    def stream():
+        tracker = out_of_core.new_time_tracker()
+        stats = out_of_core.new_running_stats()
+        envelope = out_of_core.new_envelope()
+        acc, sos, state = None, None, None
+
+        for chunk in out_of_core.iter_chunks(input_path, ['time_s', target_column], skip_samples):
+            time_s, displacement_mm = chunk['time_s'], chunk[target_column]
+            gap_before = out_of_core.update_time_tracker(tracker, time_s)
+            if acc is None:
+                Fs = 1.0 / tracker['dt']
+                acc = out_of_core.new_spectrum_accumulator(Fs)
+                if FILTER_BAND_HZ is not None:
+                    sos = signal_filter.design_filter(FILTER_BAND_HZ, Fs)
+            if sos is not None:
+                # Causal filtering: the phase delay does not change the averaged spectrum
+                if state is None:
+                    state = signal_filter.new_filter_state(sos, displacement_mm[:1])
+                displacement_mm, state = signal_filter.filter_chunk(sos, displacement_mm, state)
+
+            out_of_core.update_running_stats(stats, displacement_mm)
+            out_of_core.accumulate_spectrum(acc, displacement_mm, gap_before)
+            out_of_core.update_envelope(envelope, time_s, displacement_mm)
+
+        if acc is None:
+            return None
+        spectrum = out_of_core.spectrum_result(acc)
+        if spectrum is None:
+            return None
+        xf, amplitude, _ = spectrum
+        env_x, env_y = out_of_core.envelope_points(envelope)
+        summary = out_of_core.finish_running_stats(stats)
+        return {'xf': xf, 'psd': amplitude, 'peak_index': int(np.argmax(amplitude[1:]) + 1),
+                'env_x': env_x, 'env_y': env_y, 'Fs': 1.0 / tracker['dt'], 'count': tracker['count'],
+                'duration': tracker['last'] - tracker['first'], 'gaps': tracker['gaps'],
+                'missing_samples': tracker['missing_samples'], 'segments': acc['segments'],
+                'skipped_segments': acc['skipped_segments'],
+                'mean': summary['mean'], 'std': summary['std'], 'min': summary['min'], 'max': summary['max']}
+
+    with profiler.stage('streaming_fft'):
+        result = spectral_cache.cached_for_file(
+            input_path, stream,
+            analysis='streaming_spectrum', column=target_column, skip_samples=skip_samples,
+            band=FILTER_BAND_HZ, segment_s=out_of_core.WELCH_SEGMENT_SECONDS, overlap=out_of_core.WELCH_OVERLAP
+        )
+    if result is None:
+        print("Error: Record is shorter than one spectrum segment (reduce out_of_core.WELCH_SEGMENT_SECONDS).")
+        return
+    profiler.add_items('streaming_fft', int(result['count']))
+
+    Fs = float(result['Fs'])
+    xf, psd, peak_index = result['xf'], result['psd'], int(result['peak_index'])
+    natural_frequency_Hz = xf[peak_index]
+
+    print(f"\n--- Analysis Parameters (out-of-core) ---")
+    print(f"Sampling Frequency (Fs): {Fs:.2f} Hz")
+    print(f"Total Samples Analyzed (N): {int(result['count'])}")
+    print(f"Total Time Analyzed: {float(result['duration']):.2f} seconds")
+    print(f"Welch segments: {int(result['segments'])} x {out_of_core.WELCH_SEGMENT_SECONDS:g} s "
+          f"(resolution {xf[1]:.4f} Hz)")
+    if FILTER_BAND_HZ is not None:
+        print(f"Band-pass filter: {FILTER_BAND_HZ[0]} - {FILTER_BAND_HZ[1]} Hz (causal, streaming)")
+    if result['gaps']:
+        print(f"WARNING: {int(result['gaps'])} gap(s) in the time axis (~{int(result['missing_samples'])} missing samples), "
+              f"{int(result['skipped_segments'])} segment(s) containing a gap were skipped.")
+    print(f"Baseline (mean): {float(result['mean']):.4f} mm, RMS about baseline: {float(result['std']):.4f} mm, "
+          f"range: {float(result['min']):.4f} ... {float(result['max']):.4f} mm")
+
+    print(f"\n--- Results ---")
+    print(f"Dominant Natural Frequency (f_n): {natural_frequency_Hz:.3f} Hz")
+    print(f"Dominant Amplitude (Welch average): {psd[peak_index]:.4f} mm")
+
+    report_renderer.show_or_export(
+        f"vibration_{target_column}",
+        report_renderer.draw_vibration_analysis,
+        (result['env_x'], result['env_y'], xf, psd, peak_index, target_column, Fs),
+        figsize=(12, 10),
+        summary={'f_n (Hz)': f"{natural_frequency_Hz:.3f}", 'Mean amplitude (mm)': f"{psd[peak_index]:.4f}"}
+    )
+    return natural_frequency_Hz
+
+def is_channel_column(column):
+    """Displacement and rotation columns written by calibration_converter.py."""
+    return column.startswith(('displacement_', 'rotation_'))
+
+def analyze_all_channels(input_path, skip_samples):
+    """
+    Dominant frequency of every channel (each axis of each marker) from one batched FFT.
+    Returns a dict {column: f_n in Hz}.
+    """
+    if not os.path.exists(input_path):
+        print(f"FATAL ERROR: Processed data file not found at: {input_path}")
+        sys.exit(1)
+
+    header = spectral_cache.read_header(input_path)
+    channels = [c for c in header if is_channel_column(c)]
+    with profiler.stage('read_csv'):
+        columns = spectral_cache.read_columns(input_path, ['time_s'] + channels)
+
+    time_s = columns['time_s'][skip_samples:]
+    signals = np.column_stack([columns[c][skip_samples:] for c in channels]) # samples x channels
+    if len(time_s) < 2:
+        print("Error: Dataset is empty after skipping initial samples.")
+        return
+
+    gaps = timebase.detect_gaps(time_s)
+    T = gaps['dt'] if gaps['has_gaps'] else np.mean(np.diff(time_s))
+    # NaN samples (frames where a channel could not be measured) would turn the whole
+    # spectrum of their channel into NaN; they are interpolated from their neighbours
+    missing = np.isnan(signals).sum(axis=0)
+    for column, count in zip(channels, missing):
+        if count:
+            print(f"WARNING: {column}: {count} missing sample(s) interpolated before the FFT.")
+
+    def batched_spectra():
+        data = signals
+        if missing.any():
+            data, _ = timebase.fill_missing(time_s, data)
+        if gaps['has_gaps']:
+            # One set of interpolation weights for all channels
+            _, data, _ = timebase.resample_uniform(time_s, signals, T)
+        # A channel without any valid sample stays NaN; it gets a zero spectrum and is reported as such
+        data = np.nan_to_num(data - data.mean(axis=0))
+        xf, psd = compute_spectrum(data, T)
+        return {'xf': xf, 'psd': psd, 'peak_index': np.argmax(psd[1:], axis=0) + 1}
+
+    with profiler.stage('fft'):
+        spectrum = spectral_cache.cached_for_file(
+            input_path, batched_spectra,
+            analysis='channel_spectra', columns=channels, skip_samples=skip_samples, Fs=1.0 / T, nan_filled=True
+        )
+    profiler.add_items('fft', signals.size)
+
+    xf, psd = spectrum['xf'], spectrum['psd']
+    results = {}
+    print(f"\n--- Dominant Frequency per Channel (Fs = {1.0 / T:.2f} Hz) ---")
+    for i, column in enumerate(channels):
+        peak = int(spectrum['peak_index'][i])
+        if missing[i] == len(time_s):
+            print(f"{column:<28} no valid samples")
+            continue
+        results[column] = float(xf[peak])
+        unit = 'deg' if column.startswith('rotation_') else 'mm'
+        print(f"{column:<28} f = {xf[peak]:8.3f} Hz   amplitude = {psd[peak, i]:.4f} {unit}")
+    return results
 
 if __name__ == "__main__":
-    analyze_and_plot_vibration(
-        INPUT_CSV_PATH, 
-        TARGET_COLUMN, 
-        SKIP_INITIAL_SAMPLES
-    )
\ No newline at end of file
+    if ANALYZE_ALL_CHANNELS:
+        analyze_all_channels(INPUT_CSV_PATH, SKIP_INITIAL_SAMPLES)
+    else:
+        analyze_and_plot_vibration(
+            INPUT_CSV_PATH, 
+            TARGET_COLUMN, 
+            SKIP_INITIAL_SAMPLES
+        )
\ No newline at end of file
@@ -1,9 +1,13 @@
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 from scipy.signal import find_peaks
 import os
 import sys
+import out_of_core
+import profiler
+import report_renderer
+import signal_filter
+import spectral_cache
+import timebase
 
 # --- CONFIGURATION (EDIT THIS) ---
 
@@ -20,6 +24,29 @@ TARGET_COLUMN = 'displacement_M1_mm'
 # We skip the initial impact/transient.
 SKIP_INITIAL_SAMPLES = 100 
 
+# 4. FILTERING (signal_filter.py)
+# Set to True to band-pass the decay around the mode before peak picking, against false
+# peaks from noise and other modes; the filtered record is also decimated, so the peak
+# search runs on fewer samples. The band (signal_filter.RELATIVE_HALF_WIDTH) is centred on
+# the largest peak of the decay's spectrum, not on APPROX_NATURAL_FREQUENCY_HZ below.
+# Peaks within 3 periods of the lower band edge from either end of the record are dropped
+# (filter ringing). On clean synthetic decays zeta then stays within ~1 % of the unfiltered
+# value; short, heavily damped records may keep too few peaks. Off by default.
+BANDPASS_AROUND_MODE = False
+
+# 5. LARGE FILES (out_of_core.py)
+# 'auto': files above out_of_core.OUT_OF_CORE_THRESHOLD_MB are processed chunk by chunk in
+# one pass (streaming filter and peak detection, constant memory). True/False forces either path.
+OUT_OF_CORE = 'auto'
+
+# --- IMPORTANT ASSUMPTION ---
+# To find peaks automatically, we need the approximate natural frequency (f_n) 
+# which you found in Step 4. If you know the value, replace 5.0 with your f_n!
+
+# If the user did not run vibration_analyzer.py yet, we default to 5.0 Hz
+# USER TIP: Replace 5.0 with the f_n you found in Step 4 for better accuracy!
+APPROX_NATURAL_FREQUENCY_HZ = 5.0 
+
 # --- CORE FUNCTIONS ---
 
 def calculate_logarithmic_decrement(y_data, time_data, target_frequency_Hz):
@@ -32,7 +59,8 @@ def calculate_logarithmic_decrement(y_data, time_data, target_frequency_Hz):
     # Estimate the distance between peaks using the calculated natural frequency (f_n).
     # Distance in samples = Fs / f_n
     
-    T_avg = np.mean(np.diff(time_data))
+    # The nominal (median) time step is not distorted by gaps from dropped frames
+    T_avg = timebase.nominal_interval(time_data)
     Fs = 1.0 / T_avg
     
     # The minimum distance between two peaks should be roughly one period
@@ -57,14 +85,42 @@ def calculate_logarithmic_decrement(y_data, time_data, target_frequency_Hz):
     k = len(peaks_indices) - 1 # Number of cycles between A1 and Ak
 
     # 3. Calculation
-    
+    zeta = damping_ratio(A1, Ak, k)
+
+    return zeta, (A1_index, Ak_index, k, A1, Ak)
+
+def spectral_peak_Hz(y_data, sample_rate):
+    """Frequency of the largest peak in the spectrum of the decay (the mode the band-pass is centred on)."""
+    spectrum = np.abs(np.fft.rfft((y_data - np.mean(y_data)) * np.hanning(len(y_data))))
+    # The first bins hold what is left of the offset and slow drift after the window
+    spectrum[:3] = 0.0
+    return float(np.argmax(spectrum) * sample_rate / len(y_data))
+
+def filter_around_mode(time_data, y_data):
+    """
+    Band-passed and decimated decay if BANDPASS_AROUND_MODE is on, else the input unchanged.
+    Returns (time_data, y_data, band, filtered_Fs); band and filtered_Fs are None without filtering.
+    """
+    if not BANDPASS_AROUND_MODE:
+        return time_data, y_data, None, None
+    # The zero-phase filter needs a uniform time axis
+    if timebase.detect_gaps(time_data)['has_gaps']:
+        time_data, y_data, _ = timebase.resample_uniform(time_data, y_data)
+    Fs = 1.0 / timebase.nominal_interval(time_data)
+    band = signal_filter.band_around_mode(spectral_peak_Hz(y_data, Fs))
+    time_data, y_data, filtered_Fs = signal_filter.filter_and_decimate(time_data, y_data, Fs, band)
+    # The filter rings at both ends of the record for a few periods of the lower band edge;
+    # peaks there are not part of the decay
+    settled = (time_data >= time_data[0] + 3.0 / band[0]) & (time_data <= time_data[-1] - 3.0 / band[0])
+    return time_data[settled], y_data[settled], band, filtered_Fs
+
+def damping_ratio(A1, Ak, k):
+    """Damping ratio from two peak amplitudes k cycles apart (logarithmic decrement)."""
     # Logarithmic Decrement (delta)
     delta = (1 / k) * np.log(A1 / Ak)
     
     # Damping Ratio (zeta)
-    zeta = delta / np.sqrt((2 * np.pi)**2 + delta**2)
-
-    return zeta, (A1_index, Ak_index, k, A1, Ak)
+    return delta / np.sqrt((2 * np.pi)**2 + delta**2)
 
 def analyze_damping(input_path, target_column, skip_samples):
     """
@@ -73,35 +129,50 @@ def analyze_damping(input_path, target_column, skip_samples):
     if not os.path.exists(input_path):
         print(f"FATAL ERROR: Processed data file not found at: {input_path}")
         sys.exit(1)
+
+    if out_of_core.use_out_of_core(input_path, OUT_OF_CORE):
+        return analyze_damping_out_of_core(input_path, target_column, skip_samples)
         
-    df = pd.read_csv(input_path)
+    with profiler.stage('read_csv'):
+        columns = spectral_cache.read_columns(input_path, ['time_s', target_column])
     
     # Get the data after skipping initial samples
-    time_s = df['time_s'].values[skip_samples:]
-    displacement_mm = df[target_column].values[skip_samples:]
+    time_s = columns['time_s'][skip_samples:]
+    displacement_mm = columns[target_column][skip_samples:]
 
     if len(displacement_mm) == 0:
         print("Error: Dataset is empty after skipping initial samples.")
         return
         
-    # --- IMPORTANT ASSUMPTION ---
-    # To find peaks automatically, we need the approximate natural frequency (f_n) 
-    # which you found in Step 4. If you know the value, replace 5.0 with your f_n!
-    
-    # If the user did not run vibration_analyzer.py yet, we default to 5.0 Hz
-    # USER TIP: Replace 5.0 with the f_n you found in Step 4 for better accuracy!
-    APPROX_NATURAL_FREQUENCY_HZ = 5.0 
-
-    zeta, decay_data = calculate_logarithmic_decrement(
-        displacement_mm, 
-        time_s, 
-        APPROX_NATURAL_FREQUENCY_HZ
-    )
+    # Zero-phase band-pass (and decimation) around the mode, if enabled
+    time_s, displacement_mm, band, filtered_Fs = filter_around_mode(time_s, displacement_mm)
+
+    def fit_decay():
+        zeta, decay_data = calculate_logarithmic_decrement(
+            displacement_mm, 
+            time_s, 
+            APPROX_NATURAL_FREQUENCY_HZ
+        )
+        if zeta is None:
+            return None
+        return dict(zip(['zeta', 'A1_idx', 'Ak_idx', 'k', 'A1', 'Ak'], (zeta,) + decay_data))
+
+    # The peak/decay result is cached on disk, keyed by the file contents and the settings
+    with profiler.stage('damping_fit'):
+        fit = spectral_cache.cached_for_file(
+            input_path, fit_decay,
+            analysis='log_decrement', column=target_column,
+            skip_samples=skip_samples, f_approx=APPROX_NATURAL_FREQUENCY_HZ,
+            band=band, filter_order=signal_filter.FILTER_ORDER, filtered_Fs=filtered_Fs
+        )
+    profiler.add_items('damping_fit', len(displacement_mm))
     
-    if zeta is None:
+    if fit is None:
         return
 
-    A1_idx, Ak_idx, k, A1, Ak = decay_data
+    zeta = fit['zeta']
+    A1_idx, Ak_idx, k, A1, Ak = fit['A1_idx'], fit['Ak_idx'], fit['k'], fit['A1'], fit['Ak']
+    delta = (1 / k) * np.log(A1 / Ak)
 
     # --- Print Results ---
     print(f"\n--- Damping Analysis Results ({target_column}) ---")
@@ -112,19 +183,116 @@ def analyze_damping(input_path, target_column, skip_samples):
     print(f"Calculated Damping Ratio (zeta, \u03B6): {zeta:.4f}")
 
     # --- Plotting Decay Curve ---
-    plt.figure(figsize=(10, 6))
-    plt.plot(time_s, displacement_mm, label='Decay Signal', linewidth=1.0)
-    
-    # Highlight the peaks used for calculation
-    plt.plot(time_s[A1_idx], A1, 'o', color='green', markersize=8, label=f'Peak A1 ({A1:.2f} mm)')
-    plt.plot(time_s[Ak_idx], Ak, 'o', color='red', markersize=8, label=f'Peak A{k+1} ({Ak:.2f} mm)')
-    
-    plt.title(f'Vibration Decay and Logarithmic Decrement - Damping Ratio $\\zeta = {zeta:.4f}$')
-    plt.xlabel('Time (s)')
-    plt.ylabel('Displacement (mm)')
-    plt.grid(True, linestyle='--', alpha=0.6)
-    plt.legend()
-    plt.show()
+    report_renderer.show_or_export(
+        f"damping_{target_column}",
+        report_renderer.draw_damping_decay,
+        (time_s, displacement_mm, A1_idx, Ak_idx, k, A1, Ak, zeta),
+        figsize=(10, 6),
+        summary={'Cycles (k)': k, 'Log decrement (delta)': f"{delta:.4f}", 'Damping ratio (zeta)': f"{zeta:.4f}"}
+    )
+
+    # The damping ratio is returned for downstream use (e.g. damage_detector.py)
+    return zeta
+
+def analyze_damping_out_of_core(input_path, target_column, skip_samples):
+    """
+    One-pass version of analyze_damping for files larger than memory: the file is read
+    chunk by chunk, band-passed with a causal streaming filter (the phase delay does not
+    change peak amplitudes), decimated and searched for peaks with the state carried
+    across chunks. Only the peaks and a min/max envelope for the plot are kept.
+    The band is centred on the spectral peak of the first chunk, where the decay is strongest.
+    """
+    def stream():
+        tracker = out_of_core.new_time_tracker()
+        envelope = out_of_core.new_envelope()
+        detector, sos, state = None, None, None
+        q, position, settle = 1, 0, 0.0
+
+        for chunk in out_of_core.iter_chunks(input_path, ['time_s', target_column], skip_samples):
+            time_s, displacement_mm = chunk['time_s'], chunk[target_column]
+            out_of_core.update_time_tracker(tracker, time_s)
+            if detector is None:
+                Fs = 1.0 / tracker['dt']
+                if BANDPASS_AROUND_MODE:
+                    band = signal_filter.band_around_mode(spectral_peak_Hz(displacement_mm, Fs))
+                    sos = signal_filter.design_filter(band, Fs)
+                    q = signal_filter.decimation_factor(band, Fs)
+                    # Peaks during the filter's start-up transient (a few periods of the
+                    # lower band edge) are not part of the decay
+                    settle = time_s[0] + 3.0 / band[0]
+                distance_in_samples = int(Fs / q / APPROX_NATURAL_FREQUENCY_HZ)
+                detector = out_of_core.new_peak_detector(distance_in_samples * 0.8)
+
+            if sos is not None:
+                if state is None:
+                    state = signal_filter.new_filter_state(sos, displacement_mm[:1])
+                displacement_mm, state = signal_filter.filter_chunk(sos, displacement_mm, state)
+            # Decimation with the phase kept across chunks (every q-th sample of the record)
+            keep = slice((-position) % q, None, q)
+            position += len(time_s)
+            time_s, displacement_mm = time_s[keep], displacement_mm[keep]
+
+            out_of_core.detect_peaks_chunk(detector, time_s, displacement_mm)
+            out_of_core.update_envelope(envelope, time_s, displacement_mm)
+
+        if detector is None:
+            return None
+        _, peak_times, peak_values = out_of_core.peak_result(detector)
+        settled = peak_times >= settle
+        peak_times, peak_values = peak_times[settled], peak_values[settled]
+        if len(peak_values) < 3:
+            return None
+
+        # Cycles between the first and last peak from the peak spacing, so a gap in the
+        # time axis (dropped frames) does not hide cycles
+        spacing = np.diff(peak_times)
+        k = int(np.sum(np.maximum(np.round(spacing / np.median(spacing)), 1)))
+        A1, Ak = peak_values[0], peak_values[-1]
+        env_x, env_y = out_of_core.envelope_points(envelope)
+        return {'zeta': damping_ratio(A1, Ak, k), 'k': k, 'A1': A1, 'Ak': Ak,
+                't_A1': peak_times[0], 't_Ak': peak_times[-1], 'n_peaks': len(peak_values),
+                'env_x': env_x, 'env_y': env_y, 'count': tracker['count'], 'gaps': tracker['gaps'],
+                'filtered_Fs': 1.0 / tracker['dt'] / q}
+
+    with profiler.stage('damping_fit'):
+        fit = spectral_cache.cached_for_file(
+            input_path, stream,
+            analysis='log_decrement_streaming', column=target_column, skip_samples=skip_samples,
+            f_approx=APPROX_NATURAL_FREQUENCY_HZ, bandpass=BANDPASS_AROUND_MODE,
+            filter_order=signal_filter.FILTER_ORDER
+        )
+    if fit is None:
+        print("\nFATAL ERROR in Damping Calculation: Fewer than 3 peaks found.")
+        print("Please adjust SKIP_INITIAL_SAMPLES or check your data quality.")
+        return
+    profiler.add_items('damping_fit', int(fit['count']))
+
+    zeta, k, A1, Ak = float(fit['zeta']), int(fit['k']), float(fit['A1']), float(fit['Ak'])
+    delta = (1 / k) * np.log(A1 / Ak)
+
+    print(f"\n--- Damping Analysis Results ({target_column}, out-of-core) ---")
+    print(f"Samples processed: {int(fit['count'])}, peaks found: {int(fit['n_peaks'])}")
+    if fit['gaps']:
+        print(f"WARNING: {int(fit['gaps'])} gap(s) in the time axis; cycles counted from the peak spacing.")
+    print(f"Cycles used for decay (k): {k}")
+    print(f"Initial Peak Amplitude (A1): {A1:.4f} mm")
+    print(f"Final Peak Amplitude (A{k+1}): {Ak:.4f} mm")
+    print(f"Calculated Logarithmic Decrement (delta): {delta:.4f}")
+    print(f"Calculated Damping Ratio (zeta, \u03B6): {zeta:.4f}")
+
+    # The two peaks are added to the plot envelope so they can be marked like in the in-memory path
+    time_s = np.concatenate([fit['env_x'], [fit['t_A1'], fit['t_Ak']]])
+    displacement_mm = np.concatenate([fit['env_y'], [A1, Ak]])
+    order = np.argsort(time_s, kind='stable')
+    position = np.argsort(order)
+    report_renderer.show_or_export(
+        f"damping_{target_column}",
+        report_renderer.draw_damping_decay,
+        (time_s[order], displacement_mm[order], position[-2], position[-1], k, A1, Ak, zeta),
+        figsize=(10, 6),
+        summary={'Cycles (k)': k, 'Log decrement (delta)': f"{delta:.4f}", 'Damping ratio (zeta)': f"{zeta:.4f}"}
+    )
+    return zeta
 
 
 if __name__ == "__main__":
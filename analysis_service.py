@@ -0,0 +1,468 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+import traceback
+import urllib.request
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Only light modules are imported here: NumPy, SciPy, pandas, cv2 and matplotlib are
+# imported once per worker process (init_worker) and then stay loaded between jobs.
+
+# --- CONFIGURATION (EDIT THIS) ---
+
+# 1. NETWORK
+# The service only listens on the local machine (no authentication!).
+HOST = '127.0.0.1'
+PORT = 8765
+
+# 2. PROCESS POOL
+# Number of worker processes; each one runs a single job at a time.
+WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+# Scripts every worker loads at start-up, so the first job does not pay the import cost.
+WARM_SCRIPTS = ['converter', 'tracker', 'vibration', 'damping', 'mode_shape', 'ssi_analyzer.py', 'time_frequency.py']
+
+# 3. JOB BOOKKEEPING
+MAX_FINISHED_JOBS = 200      # Older finished jobs (and their results) are forgotten
+MAX_EVENTS_PER_JOB = 2000    # Progress events kept per job for late /events subscribers
+LOG_TAIL_LINES = 20          # Output lines returned with a failed job
+RESULT_ARRAY_LIMIT = 1000    # Larger arrays in a result are replaced by their shape (see the output files)
+
+# 4. JOB TYPES
+# type -> script, function, arguments (name, script constant used as the default) and
+# fixed keyword arguments. Arguments can be set per job in "params"; any other UPPER_CASE
+# constant of the script can be overridden for one job in "settings".
+JOB_TYPES = {
+    'track': {'script': 'tracker', 'function': 'track_markers',
+              'arguments': [('video_path', 'VIDEO_PATH'), ('output_csv_path', 'OUTPUT_CSV_PATH'), ('rois', None)],
+              'fixed': {'show_window': False}, 'required': ['rois'], 'outputs': ['output_csv_path']},
+    'convert': {'script': 'converter', 'function': 'process_data_and_calibrate',
+                'arguments': [('input_path', 'INPUT_CSV_PATH'), ('output_path', 'OUTPUT_CSV_PATH'),
+                              ('known_mm', 'KNOWN_PHYSICAL_DISTANCE_MM'), ('measured_px', 'MEASURED_PIXEL_DISTANCE')],
+                'outputs': ['output_path']},
+    'vibration': {'script': 'vibration', 'function': 'analyze_and_plot_vibration',
+                  'arguments': [('input_path', 'INPUT_CSV_PATH'), ('target_column', 'TARGET_COLUMN'),
+                                ('skip_samples', 'SKIP_INITIAL_SAMPLES')]},
+    'channels': {'script': 'vibration', 'function': 'analyze_all_channels',
+                 'arguments': [('input_path', 'INPUT_CSV_PATH'), ('skip_samples', 'SKIP_INITIAL_SAMPLES')]},
+    'damping': {'script': 'damping', 'function': 'analyze_damping',
+                'arguments': [('input_path', 'INPUT_CSV_PATH'), ('target_column', 'TARGET_COLUMN'),
+                              ('skip_samples', 'SKIP_INITIAL_SAMPLES')]},
+    'mode_shape': {'script': 'mode_shape', 'function': 'analyze_mode_shape',
+                   'arguments': [('input_path', 'INPUT_CSV_PATH'), ('skip_samples', 'SKIP_INITIAL_SAMPLES'),
+                                 ('target_fn', 'DOMINANT_FREQUENCY_HZ')]},
+    'ssi': {'script': 'ssi_analyzer.py', 'function': 'analyze_ssi',
+            'arguments': [('input_path', 'INPUT_CSV_PATH'), ('output_path', 'OUTPUT_MODES_PATH'),
+                          ('skip_samples', 'SKIP_INITIAL_SAMPLES')],
+            'outputs': ['output_path']},
+    'time_frequency': {'script': 'time_frequency.py', 'function': 'analyze_time_frequency',
+                       'arguments': [('input_path', 'INPUT_CSV_PATH'), ('tracks_path', 'OUTPUT_TRACKS_PATH'),
+                                     ('curves_path', 'OUTPUT_CURVES_PATH'), ('skip_samples', 'SKIP_INITIAL_SAMPLES'),
+                                     ('methods', 'METHODS')],
+                       'outputs': ['tracks_path', 'curves_path']},
+}
+
+# --- WORKER PROCESS ---
+
+_progress_queue = None
+
+
+def init_worker(progress_queue):
+    """Pool initializer: headless reports and the heavy imports, once per worker process."""
+    global _progress_queue
+    _progress_queue = progress_queue
+
+    import report_renderer
+    from script_loader import load_script
+    report_renderer.HEADLESS = True # Figures are exported to REPORT_DIR, never shown
+    for name in WARM_SCRIPTS:
+        try:
+            load_script(name)
+        except Exception as e:
+            # e.g. cv2 missing: the other job types still work
+            print(f"WARNING: worker {os.getpid()} could not load {name}: {e}", file=sys.stderr)
+
+
+def warm_worker():
+    """No-op job that makes the pool start (and warm up) its worker processes."""
+    return os.getpid()
+
+
+def send_event(job_id, event, **fields):
+    """Puts one progress event on the queue the service reads (worker side)."""
+    _progress_queue.put({'job': job_id, 'event': event, 'time': time.time(), **fields})
+
+
+class ProgressWriter:
+    """
+    File-like object that replaces sys.stdout during a job: every printed line becomes a
+    'log' event, and the last LOG_TAIL_LINES lines are kept for the error report.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.tail = deque(maxlen=LOG_TAIL_LINES)
+        self._buffer = ''
+
+    def write(self, text):
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split('\n')
+        for line in lines:
+            self._emit(line)
+        return len(text)
+
+    def flush(self):
+        if self._buffer:
+            self._emit(self._buffer)
+            self._buffer = ''
+
+    def _emit(self, line):
+        line = line.rstrip()
+        if line:
+            self.tail.append(line)
+            send_event(self.job_id, 'log', message=line)
+
+
+def jsonable(value):
+    """Converts a job result (NumPy values, complex numbers, tuples...) into JSON types."""
+    import numpy as np
+    if isinstance(value, dict):
+        return {str(k): jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [jsonable(v) for v in value]
+    if isinstance(value, np.ndarray):
+        if value.size > RESULT_ARRAY_LIMIT:
+            return {'array_shape': list(value.shape), 'dtype': str(value.dtype)}
+        return jsonable(value.tolist())
+    if isinstance(value, np.generic):
+        return jsonable(value.item())
+    if isinstance(value, complex):
+        return {'real': value.real, 'imag': value.imag}
+    if isinstance(value, float) and not np.isfinite(value):
+        return None # NaN / inf are not valid JSON
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def run_job(job_id, job_type, params, settings):
+    """
+    Runs one job in a worker process and returns {'status', 'result' | 'error', ...}.
+    Everything the script prints is streamed as 'log' events; sys.exit() in a script
+    (the FATAL ERROR path) marks the job as failed instead of killing the worker.
+    """
+    import report_renderer
+    from script_loader import import_time_constants, load_script
+
+    spec = JOB_TYPES[job_type]
+    writer = ProgressWriter(job_id)
+    saved_stdout = sys.stdout
+    module = None
+    saved_settings = {}
+    send_event(job_id, 'started', pid=os.getpid())
+    start = time.perf_counter()
+    try:
+        sys.stdout = writer
+        module = load_script(spec['script'])
+        for name, value in settings.items():
+            if not name.isupper() or not hasattr(module, name):
+                raise ValueError(f"Unknown setting '{name}' for {spec['script']}")
+            if name in import_time_constants(module):
+                raise ValueError(f"Setting '{name}' cannot be overridden: {spec['script']} copies it when it is imported")
+            saved_settings[name] = getattr(module, name)
+            setattr(module, name, value)
+
+        arguments = [params[name] if name in params else (getattr(module, default) if default else None)
+                     for name, default in spec['arguments']]
+        keywords = dict(spec.get('fixed', {}))
+        if job_type == 'track':
+            keywords['progress'] = lambda frame, total: send_event(
+                job_id, 'progress', frame=frame, total=total, fraction=frame / total if total else None)
+
+        value = getattr(module, spec['function'])(*arguments, **keywords)
+        reports = report_renderer.wait_for_reports()
+        writer.flush()
+        outputs = {name: params.get(name, getattr(module, default))
+                   for name, default in spec['arguments'] if name in spec.get('outputs', [])}
+        return {'status': 'done', 'result': jsonable(value), 'outputs': outputs, 'reports': reports,
+                'seconds': time.perf_counter() - start}
+    except (Exception, SystemExit) as e:
+        writer.flush()
+        error = f"sys.exit({e.code})" if isinstance(e, SystemExit) else f"{type(e).__name__}: {e}"
+        return {'status': 'failed', 'error': error, 'log_tail': list(writer.tail),
+                'traceback': None if isinstance(e, SystemExit) else traceback.format_exc(),
+                'seconds': time.perf_counter() - start}
+    finally:
+        sys.stdout = saved_stdout
+        for name, value in saved_settings.items():
+            setattr(module, name, value) # The next job on this worker sees the script defaults again
+
+# --- SERVICE STATE ---
+
+def new_service_state(workers=None):
+    """Process pool, progress queue and job table of a running service."""
+    workers = WORKERS if workers is None else workers
+    manager = multiprocessing.Manager()
+    progress_queue = manager.Queue()
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(progress_queue,))
+    return {'manager': manager, 'progress_queue': progress_queue, 'pool': pool,
+            'workers': workers, 'jobs': OrderedDict(), 'started': time.time()}
+
+
+def new_job(job_type, params, settings):
+    return {'id': uuid.uuid4().hex[:12], 'type': job_type, 'params': params, 'settings': settings,
+            'status': 'queued', 'submitted': time.time(), 'started': None, 'finished': None,
+            'result': None, 'events': deque(maxlen=MAX_EVENTS_PER_JOB), 'subscribers': set()}
+
+
+def job_summary(job, with_result=True):
+    """JSON view of a job (without the event history)."""
+    summary = {key: job[key] for key in ('id', 'type', 'params', 'settings', 'status', 'submitted', 'started', 'finished')}
+    if with_result and job['result'] is not None:
+        summary.update(job['result'])
+    return summary
+
+
+def validate_request(body):
+    """Checks a POST /jobs body and returns (type, params, settings); raises ValueError."""
+    if not isinstance(body, dict) or body.get('type') not in JOB_TYPES:
+        raise ValueError(f"'type' must be one of: {', '.join(JOB_TYPES)}")
+    spec = JOB_TYPES[body['type']]
+    params = body.get('params') or {}
+    settings = body.get('settings') or {}
+    if not isinstance(params, dict) or not isinstance(settings, dict):
+        raise ValueError("'params' and 'settings' must be JSON objects")
+    known = [name for name, _ in spec['arguments']]
+    unknown = [name for name in params if name not in known]
+    if unknown:
+        raise ValueError(f"Unknown params for '{body['type']}': {unknown} (known: {known})")
+    missing = [name for name in spec.get('required', []) if params.get(name) is None]
+    if missing:
+        raise ValueError(f"'{body['type']}' jobs need params: {missing}")
+    return body['type'], params, settings
+
+
+def publish(job, event):
+    """Stores an event with its job and hands it to every live /events stream."""
+    job['events'].append(event)
+    for subscriber in job['subscribers']:
+        subscriber.put_nowait(event)
+
+
+def prune_finished_jobs(state):
+    finished = [job_id for job_id, job in state['jobs'].items() if job['finished'] is not None]
+    for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del state['jobs'][job_id]
+
+
+async def pump_progress(state):
+    """
+    Forwards the events of all workers (one shared queue) to the jobs they belong to.
+    The completion of a job travels through the same queue, so it always arrives
+    after the job's last log line.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        event = await loop.run_in_executor(None, state['progress_queue'].get)
+        if event is None:
+            break
+        job = state['jobs'].get(event['job'])
+        if job is None:
+            continue
+        if event['event'] == 'started':
+            job['status'] = 'running'
+            job['started'] = event['time']
+        elif event['event'] == 'finished':
+            outcome = event.pop('outcome')
+            job['status'] = outcome['status']
+            job['finished'] = event['time']
+            job['result'] = {key: value for key, value in outcome.items() if key != 'status'}
+            event = {'job': job['id'], 'event': outcome['status'], 'time': event['time'], **job['result']}
+        publish(job, event)
+        if job['finished'] is not None:
+            for subscriber in job['subscribers']:
+                subscriber.put_nowait(None) # End of the stream
+            prune_finished_jobs(state)
+
+
+async def execute_job(state, job):
+    """Queues a job on the process pool and reports its outcome through the progress queue."""
+    loop = asyncio.get_running_loop()
+    try:
+        outcome = await loop.run_in_executor(state['pool'], run_job, job['id'], job['type'], job['params'], job['settings'])
+    except Exception as e:
+        # The worker process itself died (e.g. out of memory)
+        outcome = {'status': 'failed', 'error': f"{type(e).__name__}: {e}"}
+    event = {'job': job['id'], 'event': 'finished', 'time': time.time(), 'outcome': outcome}
+    await loop.run_in_executor(None, state['progress_queue'].put, event)
+
+
+def submit_job(state, job_type, params, settings):
+    job = new_job(job_type, params, settings)
+    state['jobs'][job['id']] = job
+    publish(job, {'job': job['id'], 'event': 'queued', 'time': job['submitted']})
+    asyncio.get_running_loop().create_task(execute_job(state, job))
+    return job
+
+# --- HTTP FRONT END ---
+
+STATUS_TEXT = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}
+
+
+async def read_request(reader):
+    """Parses a minimal HTTP/1.1 request: (method, path, body bytes)."""
+    request_line = (await reader.readline()).decode('latin-1').split()
+    if len(request_line) < 2:
+        return None, None, b''
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode('latin-1').strip()
+        if not line:
+            break
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    body = await reader.readexactly(length) if length else b''
+    return request_line[0].upper(), request_line[1].split('?')[0].rstrip('/') or '/', body
+
+
+async def send_json(writer, status, payload):
+    body = json.dumps(payload).encode('utf-8')
+    writer.write(f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body)
+    await writer.drain()
+
+
+async def stream_events(writer, job):
+    """GET /jobs/<id>/events: newline-delimited JSON, from the first event until the job ends."""
+    writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nCache-Control: no-cache\r\n"
+                 b"Connection: close\r\n\r\n")
+    subscriber = asyncio.Queue()
+    history = list(job['events'])
+    if job['finished'] is None:
+        job['subscribers'].add(subscriber)
+    try:
+        for event in history:
+            writer.write(json.dumps(event).encode('utf-8') + b'\n')
+        await writer.drain()
+        while job['finished'] is None or not subscriber.empty():
+            event = await subscriber.get()
+            if event is None:
+                break
+            writer.write(json.dumps(event).encode('utf-8') + b'\n')
+            await writer.drain()
+    finally:
+        job['subscribers'].discard(subscriber)
+
+
+async def handle_connection(state, reader, writer):
+    try:
+        method, path, body = await read_request(reader)
+        parts = [p for p in (path or '').split('/') if p]
+        if method is None:
+            pass
+        elif parts == ['health']:
+            counts = {}
+            for job in state['jobs'].values():
+                counts[job['status']] = counts.get(job['status'], 0) + 1
+            await send_json(writer, 200, {'status': 'ok', 'workers': state['workers'], 'jobs': counts,
+                                          'job_types': list(JOB_TYPES), 'uptime_s': time.time() - state['started']})
+        elif parts == ['jobs'] and method == 'GET':
+            await send_json(writer, 200, [job_summary(job, with_result=False) for job in state['jobs'].values()])
+        elif parts == ['jobs'] and method == 'POST':
+            try:
+                job_type, params, settings = validate_request(json.loads(body or b'null'))
+            except ValueError as e: # json.JSONDecodeError is a ValueError too
+                await send_json(writer, 400, {'error': str(e)})
+            else:
+                job = submit_job(state, job_type, params, settings)
+                await send_json(writer, 202, job_summary(job))
+        elif len(parts) in (2, 3) and parts[0] == 'jobs' and parts[1] in state['jobs']:
+            job = state['jobs'][parts[1]]
+            if method != 'GET':
+                await send_json(writer, 405, {'error': f"{method} not supported"})
+            elif len(parts) == 2:
+                await send_json(writer, 200, job_summary(job))
+            elif parts[2] == 'events':
+                await stream_events(writer, job)
+            else:
+                await send_json(writer, 404, {'error': f"Unknown resource: {path}"})
+        else:
+            await send_json(writer, 404, {'error': f"Unknown resource: {path}"})
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass # Client went away (e.g. stopped following the events)
+    finally:
+        writer.close()
+
+
+async def serve(host=None, port=None, workers=None):
+    """
+    Starts the workers, then serves requests until stopped with Ctrl+C or SIGTERM
+    (e.g. by a process supervisor); either way the workers and the manager are shut down.
+    """
+    host = HOST if host is None else host
+    port = PORT if port is None else port
+    workers = WORKERS if workers is None else workers
+    state = new_service_state(workers)
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    try:
+        loop.add_signal_handler(signal.SIGTERM, stop.set)
+    except (NotImplementedError, AttributeError, ValueError, RuntimeError):
+        pass # Windows, or not in the main thread: no SIGTERM handler, only Ctrl+C (or cancelling serve) stops it
+    try:
+        print(f"Starting {workers} worker process(es) and loading the pipeline scripts...")
+        start = time.perf_counter()
+        await asyncio.gather(*[loop.run_in_executor(state['pool'], warm_worker) for _ in range(workers)])
+        print(f"Workers ready after {time.perf_counter() - start:.1f} s")
+
+        pump = loop.create_task(pump_progress(state))
+        server = await asyncio.start_server(lambda r, w: handle_connection(state, r, w), host, port)
+        print(f"Analysis service listening on http://{host}:{port}  (job types: {', '.join(JOB_TYPES)})")
+        async with server:
+            await stop.wait()
+        print("\nSIGTERM received, stopping the analysis service...")
+    finally:
+        state['progress_queue'].put(None)
+        state['pool'].shutdown(wait=False, cancel_futures=True)
+        state['manager'].shutdown()
+
+# --- CLIENT ---
+
+def run_remote(job_type, params=None, settings=None, host=None, port=None, echo=True):
+    """
+    Submits a job to a running service, prints its output while it runs (echo=True)
+    and returns the final 'done' / 'failed' event with the results.
+    """
+    host = HOST if host is None else host
+    port = PORT if port is None else port
+    base = f"http://{host}:{port}"
+    request = urllib.request.Request(f"{base}/jobs", method='POST', headers={'Content-Type': 'application/json'},
+                                     data=json.dumps({'type': job_type, 'params': params or {},
+                                                      'settings': settings or {}}).encode('utf-8'))
+    with urllib.request.urlopen(request) as response:
+        job = json.load(response)
+
+    final = None
+    with urllib.request.urlopen(f"{base}/jobs/{job['id']}/events") as response:
+        for line in response:
+            event = json.loads(line)
+            if echo and event['event'] == 'log':
+                print(event['message'])
+            elif echo and event['event'] == 'progress' and event['fraction'] is not None:
+                print(f"  tracking: {100 * event['fraction']:.0f} %")
+            if event['event'] in ('done', 'failed'):
+                final = event
+    return final
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve(HOST, PORT, WORKERS))
+    except KeyboardInterrupt:
+        print("\nAnalysis service stopped.")
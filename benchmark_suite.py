@@ -0,0 +1,229 @@
+import cv2
+import numpy as np
+import pandas as pd
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import synthetic_data
+from script_loader import load_script
+
+# --- CONFIGURATION (EDIT THIS) ---
+
+# 1. OUTPUT FILES
+RESULTS_JSON_PATH = 'data/benchmark_results.json'
+WORK_DIR = 'data/benchmark_tmp' # Synthetic videos and CSV files are written here
+
+# 2. PROBLEM SIZES
+# Number of samples of the synthetic displacement signals (FFT and damping benchmarks)
+SIGNAL_SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+# The conversion benchmark includes the CSV round trip, which is slow for huge files
+CONVERSION_MAX_SIZE = 1_000_000
+# Number of markers in the synthetic videos (tracker benchmark)
+MARKER_COUNTS = [1, 2, 5, 10, 20]
+VIDEO_FRAMES = 150
+VIDEO_FRAME_RATE = 90.0
+
+# 3. GROUND TRUTH
+# Every signal covers the same duration, so larger sizes mean a higher sample rate.
+SIGNAL_DURATION_S = 20.0
+TRUE_FN_HZ = 5.0
+TRUE_ZETA = 0.005
+AMPLITUDE_MM = 1.0
+NOISE_STD_MM = 0.002
+
+# Calibration used for the conversion benchmark
+KNOWN_PHYSICAL_DISTANCE_MM = 10.0
+MEASURED_PIXEL_DISTANCE = 40.0
+
+# 4. ACCURACY TOLERANCES (a speedup that breaks these is a regression)
+FN_TOLERANCE_BINS = 1.0 # |f_n - true f_n| must be within this many FFT bins
+ZETA_RELATIVE_TOLERANCE = 0.15
+CONVERSION_ABS_TOLERANCE_MM = 1e-9
+TRACKER_RMS_TOLERANCE_PX = 1.0
+TRACKER_MIN_SUCCESS_RATE = 0.95
+
+# --- MEASUREMENT HELPERS ---
+
+def time_call(func, *args):
+    """Runs func once and returns (result, elapsed seconds)."""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def peak_memory_call(func, *args):
+    """Runs func once under tracemalloc and returns the peak traced memory in MB."""
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1e6
+
+
+def quiet(func):
+    """Wraps a pipeline function so its console output does not flood the benchmark report."""
+    def wrapper(*args):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return func(*args)
+    return wrapper
+
+
+def synthetic_signal(n_samples):
+    sample_rate = n_samples / SIGNAL_DURATION_S
+    time_s, displacement = synthetic_data.synthetic_displacement(
+        n_samples, sample_rate, [(TRUE_FN_HZ, TRUE_ZETA, AMPLITUDE_MM, 0.0)], NOISE_STD_MM)
+    return time_s, displacement, sample_rate
+
+# --- BENCHMARKS ---
+
+def bench_fft(n_samples):
+    """FFT/PSD latency of vibration_analyzer.compute_spectrum and the accuracy of the f_n peak."""
+    vibration = load_script('vibration')
+    _, displacement, sample_rate = synthetic_signal(n_samples)
+    T = 1.0 / sample_rate
+
+    (xf, psd), seconds = time_call(vibration.compute_spectrum, displacement, T)
+    peak_mb = peak_memory_call(vibration.compute_spectrum, displacement, T)
+
+    f_n = xf[np.argmax(psd)]
+    bin_width = sample_rate / n_samples
+    error_bins = abs(f_n - TRUE_FN_HZ) / bin_width
+    return {'benchmark': 'fft_psd', 'size': n_samples, 'seconds': seconds,
+            'samples_per_s': n_samples / seconds, 'peak_memory_mb': peak_mb,
+            'estimate': float(f_n), 'truth': TRUE_FN_HZ,
+            'accurate': bool(error_bins <= FN_TOLERANCE_BINS)}
+
+
+def bench_damping(n_samples):
+    """Time of the logarithmic decrement fit and the accuracy of the damping ratio."""
+    damping = load_script('damping')
+    time_s, displacement, _ = synthetic_signal(n_samples)
+    fit = quiet(damping.calculate_logarithmic_decrement)
+
+    (zeta, _), seconds = time_call(fit, displacement, time_s, TRUE_FN_HZ)
+    peak_mb = peak_memory_call(fit, displacement, time_s, TRUE_FN_HZ)
+
+    accurate = zeta is not None and abs(zeta - TRUE_ZETA) / TRUE_ZETA <= ZETA_RELATIVE_TOLERANCE
+    return {'benchmark': 'damping_fit', 'size': n_samples, 'seconds': seconds,
+            'samples_per_s': n_samples / seconds, 'peak_memory_mb': peak_mb,
+            'estimate': None if zeta is None else float(zeta), 'truth': TRUE_ZETA,
+            'accurate': bool(accurate)}
+
+
+def bench_conversion(n_samples):
+    """Throughput of calibration_converter (CSV in -> mm CSV out) and exactness of the result."""
+    converter = load_script('converter')
+    sample_rate = n_samples / SIGNAL_DURATION_S
+
+    # Raw tracker output (two markers, x and y), rounded to whole pixels like the tracker
+    pixels_per_mm = MEASURED_PIXEL_DISTANCE / KNOWN_PHYSICAL_DISTANCE_MM
+    input_path = os.path.join(WORK_DIR, f'raw_pixels_{n_samples}.csv')
+    output_path = os.path.join(WORK_DIR, f'processed_{n_samples}.csv')
+    synthetic_data.write_pixel_csv(
+        input_path, n_samples, sample_rate, [(TRUE_FN_HZ, TRUE_ZETA, AMPLITUDE_MM, 0.0)],
+        n_markers=2, pixels_per_mm=pixels_per_mm, release_s=0.0,
+        noise_px=NOISE_STD_MM * pixels_per_mm, quantization_px=1.0, dropout_rate=0.0)
+    y_m1 = pd.read_csv(input_path, usecols=['y_pixel_M1'])['y_pixel_M1'].values
+
+    convert = quiet(converter.process_data_and_calibrate)
+    args = (input_path, output_path, KNOWN_PHYSICAL_DISTANCE_MM, MEASURED_PIXEL_DISTANCE)
+    _, seconds = time_call(convert, *args)
+    peak_mb = peak_memory_call(convert, *args)
+
+    # Independent reference: baseline = mean of the first 50 samples
+    mm_per_px = KNOWN_PHYSICAL_DISTANCE_MM / MEASURED_PIXEL_DISTANCE
+    expected = (y_m1 - y_m1[:50].mean()) * mm_per_px
+    result = pd.read_csv(output_path)['displacement_M1_mm'].values
+    max_error = float(np.max(np.abs(result - expected)))
+    return {'benchmark': 'conversion', 'size': n_samples, 'seconds': seconds,
+            'samples_per_s': n_samples / seconds, 'peak_memory_mb': peak_mb,
+            'estimate': max_error, 'truth': 0.0,
+            'accurate': bool(max_error <= CONVERSION_ABS_TOLERANCE_MM)}
+
+
+def bench_tracker(n_markers):
+    """Headless CSRT tracking speed (fps) on a synthetic video and the RMS error against the truth."""
+    tracker = load_script('tracker')
+    video_path = os.path.join(WORK_DIR, f'markers_{n_markers}.avi')
+    truth_y, rois = synthetic_data.write_synthetic_video(
+        video_path, VIDEO_FRAMES, VIDEO_FRAME_RATE, n_markers,
+        [(TRUE_FN_HZ, 0.02, 1.0, 0.0)])
+
+    cap = cv2.VideoCapture(video_path)
+    ret, first_frame = cap.read()
+    if not ret:
+        raise IOError(f"Could not read the synthetic video: {video_path}")
+    trackers = tracker.create_trackers(first_frame, rois)
+    recovery = tracker.new_recovery_state(first_frame, rois) if tracker.REACQUIRE_ENABLED else None
+    (data, frame_count, _), seconds = time_call(tracker.run_tracking_loop, cap, trackers, VIDEO_FRAME_RATE, False, recovery)
+    cap.release()
+
+    # The first video frame was used for initialization, so tracked frame i is video frame i + 1
+    tracked_frames = np.asarray(data['frame_index'], dtype=int) + 1
+    errors = [np.asarray(data[f'y_pixel_M{i + 1}']) - truth_y[tracked_frames, i] for i in range(n_markers)]
+    rms_px = float(np.sqrt(np.mean(np.square(errors)))) if len(tracked_frames) else float('inf')
+    success_rate = len(tracked_frames) / max(frame_count, 1)
+
+    return {'benchmark': 'tracker', 'size': n_markers, 'seconds': seconds,
+            'frames_per_s': frame_count / seconds, 'peak_memory_mb': None,
+            'estimate': rms_px, 'truth': 0.0, 'success_rate': success_rate,
+            'accurate': bool(rms_px <= TRACKER_RMS_TOLERANCE_PX and success_rate >= TRACKER_MIN_SUCCESS_RATE)}
+
+# --- MAIN BENCHMARK LOGIC ---
+
+def run_benchmarks(results_path):
+    """
+    Runs every benchmark over the configured sizes, prints a summary table,
+    saves all measurements as JSON and returns True if every accuracy check passed.
+    """
+    if not os.path.exists(WORK_DIR):
+        os.makedirs(WORK_DIR)
+
+    results = []
+    for n in SIGNAL_SIZES:
+        results.append(bench_fft(n))
+        results.append(bench_damping(n))
+        if n <= CONVERSION_MAX_SIZE:
+            results.append(bench_conversion(n))
+    for n_markers in MARKER_COUNTS:
+        results.append(bench_tracker(n_markers))
+
+    # --- Print Results ---
+    print("\n--- Benchmark Results ---")
+    print(f"{'benchmark':<12} {'size':>10} {'time (ms)':>11} {'rate (/s)':>12} {'peak (MB)':>10} {'estimate':>12}  check")
+    for r in results:
+        rate = r.get('samples_per_s', r.get('frames_per_s'))
+        peak = '-' if r['peak_memory_mb'] is None else f"{r['peak_memory_mb']:.1f}"
+        estimate = '-' if r['estimate'] is None else f"{r['estimate']:.4g}"
+        check = 'OK' if r['accurate'] else 'FAILED'
+        print(f"{r['benchmark']:<12} {r['size']:>10} {r['seconds'] * 1000:>11.2f} {rate:>12.4g} {peak:>10} {estimate:>12}  {check}")
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'ground_truth': {'f_n_Hz': TRUE_FN_HZ, 'zeta': TRUE_ZETA, 'noise_std_mm': NOISE_STD_MM},
+        'results': results,
+    }
+    with open(results_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    all_accurate = all(r['accurate'] for r in results)
+    print(f"\nResults saved to: {results_path}")
+    if not all_accurate:
+        print("*** ACCURACY CHECK FAILED: a result deviates from the ground truth! ***")
+    return all_accurate
+
+
+if __name__ == "__main__":
+    if not os.path.exists('data'):
+        os.makedirs('data')
+    if not run_benchmarks(RESULTS_JSON_PATH):
+        sys.exit(1)
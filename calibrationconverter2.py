@@ -1,5 +1,6 @@
 import pandas as pd
 import numpy as np
+import profiler
 
 # --- CONFIGURATION (MUST BE EDITED BY USER) ---
 
@@ -58,15 +59,19 @@ def convert_to_mm(raw_df, factor_C):
 
 if __name__ == "__main__":
     try:
-        df_raw = pd.read_csv(RAW_PIXEL_DATA_PATH)
+        with profiler.stage('read_csv'):
+            df_raw = pd.read_csv(RAW_PIXEL_DATA_PATH)
         print(f"Loaded ideal raw data with {len(df_raw)} frames.")
 
         C_factor = calculate_calibration_factor()
         print(f"Calibration Factor (C): {C_factor:.2f} pixels/mm")
 
-        df_calibrated = convert_to_mm(df_raw, C_factor)
+        with profiler.stage('convert'):
+            df_calibrated = convert_to_mm(df_raw, C_factor)
+        profiler.add_items('convert', len(df_raw))
 
-        df_calibrated.to_csv(CALIBRATED_DATA_PATH, index=False)
+        with profiler.stage('csv_write'):
+            df_calibrated.to_csv(CALIBRATED_DATA_PATH, index=False)
         print("\n--- Conversion Success ---")
         print(f"Final displacement data (in mm) saved to: {CALIBRATED_DATA_PATH}")
 
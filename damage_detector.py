@@ -0,0 +1,231 @@
+import pandas as pd
+import numpy as np
+import json
+import os
+import sys
+
+# --- CONFIGURATION (EDIT THIS) ---
+
+# 1. RUN HISTORY FILE
+# One row per test run with the results from vibration_analyzer.py (f_n),
+# damping_calculator.py (zeta) and mode_shape_analyzer.py (relative phase).
+# Required columns: run_id, f_n_Hz, zeta, relative_phase_deg
+RUN_HISTORY_CSV_PATH = 'data/shm_run_history.csv'
+
+# 2. BASELINE STATE FILE
+# The running baseline statistics are stored here between sessions, so each
+# new run only costs a constant-time update instead of re-reading the history.
+BASELINE_STATE_PATH = 'data/shm_baseline_state.json'
+
+# 3. DETECTION SETTINGS
+# Features that are monitored for shifts.
+MONITORED_FEATURES = ['f_n_Hz', 'zeta', 'relative_phase_deg']
+
+# Number of runs (healthy structure) used to learn the baseline before any alarm is raised.
+BASELINE_RUNS = 10
+
+# Shewhart control limit: flag a run whose value is further than this many
+# standard deviations away from the baseline mean.
+SHEWHART_LIMIT_SIGMA = 3.0
+
+# EWMA chart: smoothing weight (0 < lambda <= 1) and limit width.
+# Small lambda values are more sensitive to small, persistent shifts (e.g. slow stiffness loss).
+EWMA_LAMBDA = 0.2
+EWMA_LIMIT_SIGMA = 3.0
+
+# If True, runs that are in control keep updating the baseline (follows slow seasonal drift).
+# If False, the baseline is frozen after BASELINE_RUNS (damage cannot be "learned away").
+ADAPT_BASELINE = False
+
+# --- CORE FUNCTIONS ---
+
+def new_feature_state():
+    """
+    Returns an empty baseline state for a single feature.
+    Welford accumulators (n, mean, m2) hold the baseline statistics and
+    'ewma' / 'ewma_t' hold the EWMA control chart statistic.
+    """
+    return {'n': 0, 'mean': 0.0, 'm2': 0.0, 'ewma': None, 'ewma_t': 0}
+
+
+def new_baseline_state(features):
+    """Returns an empty baseline state for all monitored features."""
+    return {'runs_processed': 0, 'features': {name: new_feature_state() for name in features}}
+
+
+def welford_update(state, value):
+    """Adds one observation to the running mean/variance (Welford's algorithm, O(1))."""
+    state['n'] += 1
+    delta = value - state['mean']
+    state['mean'] += delta / state['n']
+    state['m2'] += delta * (value - state['mean'])
+
+
+def baseline_std(state):
+    """Sample standard deviation of the baseline observations."""
+    if state['n'] < 2:
+        return 0.0
+    return np.sqrt(state['m2'] / (state['n'] - 1))
+
+
+def update_feature(state, value, baseline_runs, shewhart_sigma, ewma_lambda, ewma_sigma, adapt_baseline):
+    """
+    Processes one new observation of a feature and returns the chart result.
+
+    While fewer than 'baseline_runs' observations have been seen, the value is
+    only added to the baseline. Afterwards, the value is checked against the
+    Shewhart limits and the EWMA statistic is updated and checked against its
+    time-varying limits. Every step is O(1) in time and memory.
+    """
+    result = {'value': value, 'learning': False, 'z_score': None, 'ewma': None,
+              'shewhart_alarm': False, 'ewma_alarm': False}
+
+    # 1. Learning Phase
+    if state['n'] < baseline_runs:
+        welford_update(state, value)
+        result['learning'] = True
+        return result
+
+    mean = state['mean']
+    sigma = baseline_std(state)
+
+    # 2. Shewhart Chart (large, sudden shifts)
+    if sigma > 0:
+        result['z_score'] = (value - mean) / sigma
+        result['shewhart_alarm'] = abs(result['z_score']) > shewhart_sigma
+
+    # 3. EWMA Chart (small, persistent shifts)
+    previous = mean if state['ewma'] is None else state['ewma']
+    state['ewma'] = ewma_lambda * value + (1.0 - ewma_lambda) * previous
+    state['ewma_t'] += 1
+    result['ewma'] = state['ewma']
+
+    if sigma > 0:
+        t = state['ewma_t']
+        width = ewma_sigma * sigma * np.sqrt(
+            ewma_lambda / (2.0 - ewma_lambda) * (1.0 - (1.0 - ewma_lambda) ** (2 * t))
+        )
+        result['ewma_alarm'] = abs(state['ewma'] - mean) > width
+
+    # 4. Optional Baseline Adaptation (only with in-control runs)
+    if adapt_baseline and not (result['shewhart_alarm'] or result['ewma_alarm']):
+        welford_update(state, value)
+
+    return result
+
+
+def process_run(baseline_state, run_features):
+    """
+    Updates the baseline with one run and returns a per-feature report.
+    'run_features' maps feature names (e.g. 'f_n_Hz') to the values of that run.
+    Missing or NaN features are skipped for this run.
+    """
+    report = {}
+    for name, feature_state in baseline_state['features'].items():
+        value = run_features.get(name)
+        if value is None or not np.isfinite(value):
+            continue
+        report[name] = update_feature(
+            feature_state, float(value), BASELINE_RUNS,
+            SHEWHART_LIMIT_SIGMA, EWMA_LAMBDA, EWMA_LIMIT_SIGMA, ADAPT_BASELINE
+        )
+    baseline_state['runs_processed'] += 1
+    return report
+
+
+def load_baseline_state(state_path, features):
+    """Loads the baseline state file, or starts a new baseline if it does not exist yet."""
+    if not os.path.exists(state_path):
+        return new_baseline_state(features)
+
+    with open(state_path, 'r') as f:
+        state = json.load(f)
+
+    # Features added to MONITORED_FEATURES after the baseline was created start learning now.
+    for name in features:
+        state['features'].setdefault(name, new_feature_state())
+    return state
+
+
+def save_baseline_state(state_path, state):
+    """Writes the baseline state file (small, independent of the number of runs)."""
+    output_dir = os.path.dirname(state_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(state_path, 'w') as f:
+        json.dump(state, f, indent=2)
+
+
+def print_run_report(run_id, report):
+    """Prints the control chart result of one run and returns True if damage is suspected."""
+    damage_suspected = False
+    print(f"\n--- Run {run_id} ---")
+    for name, result in report.items():
+        if result['learning']:
+            print(f"{name}: {result['value']:.4f} (learning baseline)")
+            continue
+
+        flags = []
+        if result['shewhart_alarm']:
+            flags.append("SHEWHART")
+        if result['ewma_alarm']:
+            flags.append("EWMA")
+        damage_suspected = damage_suspected or bool(flags)
+
+        z_text = "n/a" if result['z_score'] is None else f"{result['z_score']:+.2f}"
+        status = f"ALARM ({', '.join(flags)})" if flags else "OK"
+        print(f"{name}: {result['value']:.4f} | z = {z_text} | EWMA = {result['ewma']:.4f} | {status}")
+
+    if damage_suspected:
+        print("*** Statistically significant shift detected: inspect the structure! ***")
+    return damage_suspected
+
+# --- MAIN DETECTION LOGIC ---
+
+def monitor_runs(history_path, state_path, features):
+    """
+    Processes every run in the history file that has not been seen yet,
+    updates the stored baseline and reports any control chart alarms.
+    """
+
+    # 1. Check Input File
+    if not os.path.exists(history_path):
+        print(f"FATAL ERROR: Run history file not found at: {history_path}")
+        print("Add one row per run with the columns: run_id, " + ", ".join(features))
+        sys.exit(1)
+
+    df = pd.read_csv(history_path)
+
+    # 2. Load Baseline (only the new rows have to be processed)
+    state = load_baseline_state(state_path, features)
+    new_runs = df.iloc[state['runs_processed']:]
+
+    if new_runs.empty:
+        print("No new runs found in the history file. Baseline is up to date.")
+        return []
+
+    # 3. Update Charts Run by Run
+    alarms = []
+    for row in new_runs.to_dict('records'):
+        run_id = row.get('run_id', state['runs_processed'])
+        run_features = {name: row[name] for name in features if name in row}
+        report = process_run(state, run_features)
+        if print_run_report(run_id, report):
+            alarms.append(run_id)
+
+    # 4. Save the Updated Baseline
+    save_baseline_state(state_path, state)
+
+    print("\n--- Monitoring Complete ---")
+    print(f"New runs processed: {len(new_runs)}")
+    print(f"Runs with alarms: {alarms if alarms else 'none'}")
+    print(f"Baseline state saved to: {state_path}")
+    return alarms
+
+
+if __name__ == "__main__":
+    monitor_runs(
+        RUN_HISTORY_CSV_PATH,
+        BASELINE_STATE_PATH,
+        MONITORED_FEATURES
+    )
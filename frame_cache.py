@@ -0,0 +1,289 @@
+import cv2
+import numpy as np
+import hashlib
+import json
+import os
+import profiler
+
+# --- CONFIGURATION (EDIT THIS) ---
+
+# 1. CACHE LOCATION AND SIZE
+# Every cached video is one raw uint8 file (frames x height x width [x 3]) that is memory-mapped
+# when read, plus a .json with the metadata and a .npy index of the frame timestamps.
+# When the folder grows above the size limit, the least recently used videos are deleted first.
+FRAME_CACHE_DIR = os.environ.get('SHM_FRAME_CACHE_DIR', 'data/.frame_cache')
+MAX_FRAME_CACHE_GB = float(os.environ.get('SHM_FRAME_CACHE_MAX_GB', '20'))
+
+# 2. ENABLE / DISABLE
+# Set SHM_FRAME_CACHE=0 to decode the video every time (e.g. when timing the codec itself).
+FRAME_CACHE_ENABLED = os.environ.get('SHM_FRAME_CACHE', '1') != '0'
+
+# 3. BUILD PROGRESS
+# A line is printed every this many decoded frames while a cache is built (0 = only at the end).
+PROGRESS_EVERY_FRAMES = 1000
+
+# A cached video is identified by the file (path, size, modification time) and the stored
+# format, so an edited or replaced video is decoded again. Bump this when the layout changes.
+CACHE_FORMAT_VERSION = 1
+
+# --- KEYS AND FILES ---
+
+def cache_key(video_path, crop=None, gray=False):
+    """
+    Key of a cached video: full BGR frames (crop=None, gray=False) or a band of them,
+    crop = (x0, y0, x1, y1) in full-frame pixels, optionally converted to grayscale.
+    The video itself is not hashed (that would read the whole file); its size and
+    modification time stand in for the contents.
+    """
+    stat = os.stat(video_path)
+    canonical = json.dumps({'source': os.path.abspath(video_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                            'crop': [int(v) for v in crop] if crop is not None else None, 'gray': bool(gray),
+                            'version': CACHE_FORMAT_VERSION}, sort_keys=True)
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+
+def _paths(key):
+    """(frame data, metadata, timestamp index) file paths of a cache entry."""
+    stem = os.path.join(FRAME_CACHE_DIR, key)
+    return stem + '.u8', stem + '.json', stem + '_index.npy'
+
+
+def load_metadata(key):
+    """Metadata of a complete cache entry, or None (missing, or interrupted while being written)."""
+    data_path, meta_path, index_path = _paths(key)
+    if not (os.path.exists(meta_path) and os.path.exists(data_path) and os.path.exists(index_path)):
+        return None
+    try:
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if os.path.getsize(data_path) != meta['n_frames'] * int(np.prod(meta['frame_shape'])):
+        return None
+    return meta
+
+# --- READER ---
+
+class CachedVideo:
+    """
+    Memory-mapped frames of a cache entry with the cv2.VideoCapture interface that the
+    tracking scripts use (read, grab, get, set, isOpened, release), plus random access:
+    video[i] or video[i0:i1] are views into the file (zero-copy, no decoding).
+    The map is copy-on-write, so drawing on a returned frame never changes the cache.
+    """
+
+    def __init__(self, key, meta):
+        data_path, _, index_path = _paths(key)
+        self.key = key
+        self.meta = meta
+        self.frames = np.memmap(data_path, dtype=np.uint8, mode='c', shape=(meta['n_frames'], *meta['frame_shape']))
+        self.time_ms = np.load(index_path)
+        self.position = 0
+        try:
+            os.utime(data_path) # Mark as recently used for the LRU eviction
+        except OSError:
+            pass
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        return self.frames[index]
+
+    def isOpened(self):
+        return self.frames is not None
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return True, self.frames[self.position - 1]
+
+    def grab(self):
+        if self.frames is None or self.position >= len(self.frames):
+            return False
+        self.position += 1
+        return True
+
+    def retrieve(self):
+        if self.position == 0:
+            return False, None
+        return True, self.frames[self.position - 1]
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            return float(self.time_ms[self.position - 1]) if self.position > 0 else 0.0
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.position)
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(self.frames))
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.meta['fps'])
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.meta['frame_shape'][1])
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.meta['frame_shape'][0])
+        return 0.0 # Like cv2.VideoCapture for properties it does not know
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self.position = min(max(int(value), 0), len(self.frames))
+            return True
+        return False
+
+    def release(self):
+        self.frames = None
+
+# --- BUILD ---
+
+def build_cache(video_path, crop=None, gray=False):
+    """
+    Decodes the video once into a cache entry and returns its key, or None if the video
+    cannot be read or the entry would be larger than MAX_FRAME_CACHE_GB.
+    A band (crop / gray) is cut from the cached full frames when those already exist,
+    so the codec only runs once per video.
+    """
+    key = cache_key(video_path, crop, gray)
+    full_meta = load_metadata(cache_key(video_path)) if (crop is not None or gray) else None
+    source = CachedVideo(cache_key(video_path), full_meta) if full_meta else cv2.VideoCapture(video_path)
+    if not source.isOpened():
+        return None
+
+    width, height = int(source.get(cv2.CAP_PROP_FRAME_WIDTH)), int(source.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    x0, y0, x1, y1 = crop if crop is not None else (0, 0, width, height)
+    frame_shape = [y1 - y0, x1 - x0] + ([] if gray else [3])
+    frame_bytes = int(np.prod(frame_shape))
+    max_bytes = MAX_FRAME_CACHE_GB * 1e9
+    reported_frames = max(int(source.get(cv2.CAP_PROP_FRAME_COUNT)), 0)
+    if reported_frames * frame_bytes > max_bytes:
+        print(f"Frame cache skipped: {reported_frames} frames would need {reported_frames * frame_bytes / 1e9:.1f} GB "
+              f"(limit MAX_FRAME_CACHE_GB = {MAX_FRAME_CACHE_GB:g}). Crop the video or raise the limit.")
+        source.release()
+        return None
+
+    if not os.path.exists(FRAME_CACHE_DIR):
+        os.makedirs(FRAME_CACHE_DIR, exist_ok=True)
+    data_path, meta_path, index_path = _paths(key)
+    # Written under temporary names first, so a crash never leaves an entry that looks complete
+    tmp_path = f"{data_path}.{os.getpid()}.tmp"
+    time_ms = []
+    label = 'full frames' if crop is None and not gray else f"{'grayscale ' if gray else ''}band {x1 - x0}x{y1 - y0} px"
+    estimate = f", about {reported_frames * frame_bytes / 1e6:.0f} MB on disk" if reported_frames else ''
+    print(f"Decoding {video_path} into the frame cache ({label}{estimate})...")
+    with profiler.stage('frame_cache_build'), open(tmp_path, 'wb') as f:
+        while True:
+            ret, frame = source.read()
+            if not ret:
+                break
+            time_ms.append(source.get(cv2.CAP_PROP_POS_MSEC))
+            if crop is not None:
+                frame = frame[y0:y1, x0:x1]
+            if gray and frame.ndim == 3:
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            frame.tofile(f)
+            if len(time_ms) * frame_bytes > max_bytes:
+                break
+            if PROGRESS_EVERY_FRAMES and len(time_ms) % PROGRESS_EVERY_FRAMES == 0:
+                print(f"  {len(time_ms)} frames cached...")
+    fps = source.get(cv2.CAP_PROP_FPS)
+    source.release()
+
+    if len(time_ms) * frame_bytes > max_bytes or not time_ms:
+        # The container under-reported its length (or held no frames): give up on caching it
+        os.remove(tmp_path)
+        if time_ms:
+            print(f"Frame cache skipped: the video is larger than MAX_FRAME_CACHE_GB = {MAX_FRAME_CACHE_GB:g}.")
+        return None
+
+    profiler.add_items('frame_cache_build', len(time_ms))
+    os.replace(tmp_path, data_path)
+    np.save(index_path, np.asarray(time_ms))
+    meta = {'source': os.path.abspath(video_path), 'crop': list(crop) if crop is not None else None, 'gray': bool(gray),
+            'frame_shape': frame_shape, 'n_frames': len(time_ms), 'fps': fps, 'version': CACHE_FORMAT_VERSION}
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+    print(f"Frame cache ready: {len(time_ms)} frames, {len(time_ms) * frame_bytes / 1e6:.0f} MB in {FRAME_CACHE_DIR}")
+
+    evict(max_bytes)
+    return key
+
+
+def evict(max_bytes):
+    """
+    Deletes least recently used entries until the cache folder is below max_bytes.
+    Entries that cannot be removed (another process evicted them first, or - on Windows -
+    has them memory-mapped right now) are skipped.
+    """
+    entries = []
+    for name in os.listdir(FRAME_CACHE_DIR):
+        if name.endswith('.u8'):
+            path = os.path.join(FRAME_CACHE_DIR, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, name[:-3]))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, key in sorted(entries):
+        if total <= max_bytes:
+            break
+        data_path, meta_path, index_path = _paths(key)
+        try:
+            os.remove(data_path)
+        except FileNotFoundError:
+            pass # Already evicted by another process
+        except OSError:
+            continue # In use (mapped by a running job): keep it
+        for path in (meta_path, index_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass # An entry without its frame data is never loaded (see load_metadata)
+        total -= size
+
+
+def clear():
+    """Removes every cached video."""
+    if os.path.exists(FRAME_CACHE_DIR):
+        evict(0)
+
+# --- HIGH-LEVEL HELPERS ---
+
+def open_cached(video_path, crop=None, gray=False):
+    """The CachedVideo for this video and format (decoded now if needed), or None if it cannot be cached."""
+    if not FRAME_CACHE_ENABLED or not os.path.exists(video_path):
+        return None
+    key = cache_key(video_path, crop, gray)
+    meta = load_metadata(key)
+    if meta is None:
+        key = build_cache(video_path, crop, gray)
+        meta = load_metadata(key) if key else None
+    return CachedVideo(key, meta) if meta else None
+
+
+def open_video(video_path):
+    """
+    Drop-in replacement for cv2.VideoCapture(video_path): the full frames from the cache
+    (decoded on first use), or a plain cv2.VideoCapture when caching is off or not possible.
+    """
+    video = open_cached(video_path)
+    return video if video is not None else cv2.VideoCapture(video_path)
+
+
+def read_frame(video_path, index=0):
+    """
+    One frame (a BGR copy) of the video, or None. Taken from the cached full frames when they
+    exist; otherwise only this frame is decoded (the cache is not built for a single frame).
+    """
+    if FRAME_CACHE_ENABLED and os.path.exists(video_path):
+        key = cache_key(video_path)
+        meta = load_metadata(key)
+        if meta is not None and index < meta['n_frames']:
+            return np.array(CachedVideo(key, meta)[index])
+
+    cap = cv2.VideoCapture(video_path)
+    if index > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+    ret, frame = cap.read()
+    cap.release()
+    return frame if ret else None
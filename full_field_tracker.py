@@ -0,0 +1,368 @@
+import cv2
+import numpy as np
+import pandas as pd
+from scipy.fft import rfft, rfftfreq
+from scipy.signal import find_peaks
+import os
+import queue
+import sys
+import threading
+import frame_cache
+import profiler
+import report_renderer
+import ssi_analyzer
+from script_loader import load_script
+
+# --- CONFIGURATION (EDIT THIS) ---
+
+# 1. INPUT / OUTPUT FILES
+VIDEO_PATH = 'data/VIDEO2.mp4'
+# Displacement field: (frames x points) float32 matrices dx_mm / dy_mm plus the grid,
+# time axis and validity mask (NumPy .npz, read with load_field()).
+OUTPUT_FIELD_PATH = 'data/full_field_displacement.npz'
+# Operating deflection shapes, one row per (mode, grid point)
+OUTPUT_MODES_PATH = 'data/full_field_modes.csv'
+
+# 2. STRUCTURE ROI AND MEASUREMENT GRID
+# Box (x, y, w, h) around the structure in the first frame; None = draw it.
+# Instead of two hand-picked markers, a point grid with GRID_SPACING_PX covers the box.
+STRUCTURE_ROI = None
+GRID_SPACING_PX = 8
+# Grid points on plain, untextured surfaces cannot be tracked (aperture problem). Points whose
+# minimal eigenvalue of the gradient matrix is below this fraction of the best point are dropped.
+MIN_TEXTURE_FRACTION = 0.05
+
+# 3. PYRAMIDAL LUCAS-KANADE
+# Every frame is matched against the first frame (no drift from chaining frame to frame);
+# the position in the previous frame is the initial guess.
+LK_WINDOW_PX = 21
+LK_PYRAMID_LEVELS = 2
+LK_CRITERIA = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.001)
+# Forward-backward check: a point is invalid in a frame if tracking it back to the first frame
+# misses its start by more than this (px). 0 disables the check (about 2x faster).
+FORWARD_BACKWARD_MAX_PX = 0.5
+# Points that are invalid in more than this fraction of the frames are removed from the field;
+# shorter dropouts are interpolated in time.
+MAX_INVALID_FRACTION = 0.1
+
+# 4. THROUGHPUT
+# Only the structure box (plus a margin for the LK window) is converted to grayscale and
+# tracked. Decoding runs in a background thread, LK itself on OPENCV_THREADS threads.
+CROP_MARGIN_PX = 24
+OPENCV_THREADS = 0 # 0 = one per CPU core
+DECODE_QUEUE_FRAMES = 64
+# The grayscale crop is kept in the frame cache (frame_cache.py), so re-running with other
+# grid or LK settings (same ROI) reads memory-mapped frames instead of decoding the video.
+USE_FRAME_CACHE = True
+
+# 5. CALIBRATION
+# None = KNOWN_PHYSICAL_DISTANCE_MM / MEASURED_PIXEL_DISTANCE from (A)calibration_converter.py
+MM_PER_PIXEL = None
+
+# 6. MODE SHAPES (batched FFT over all points)
+# 'y' (vertical, bending of a horizontal beam), 'x' or 'xy' (both in-plane directions)
+MODE_DIRECTIONS = 'y'
+N_MODES = 3
+MIN_PEAK_FRACTION = 0.01 # Weaker peaks (harmonics, noise) than this fraction of the strongest are ignored
+FREQUENCY_RANGE_HZ = (0.5, None) # (min, max); None = Nyquist
+SKIP_INITIAL_FRAMES = 0
+SHAPE_BINS = 1 # Neighbouring FFT bins on each side of a peak used for the shape (SVD)
+
+# --- CORE FUNCTIONS ---
+
+def grid_points(gray, spacing=None, min_texture=None, border=None):
+    """Regular grid over a grayscale image, without the points in untextured areas. Returns (N, 1, 2) float32."""
+    spacing = GRID_SPACING_PX if spacing is None else spacing
+    min_texture = MIN_TEXTURE_FRACTION if min_texture is None else min_texture
+    border = LK_WINDOW_PX // 2 if border is None else border
+    height, width = gray.shape
+    xs = np.arange(border, width - border, spacing)
+    ys = np.arange(border, height - border, spacing)
+    grid = np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2)
+    texture = cv2.cornerMinEigenVal(gray, blockSize=LK_WINDOW_PX // 2 * 2 + 1)[grid[:, 1], grid[:, 0]]
+    grid = grid[texture >= min_texture * texture.max()]
+    return grid.astype(np.float32).reshape(-1, 1, 2)
+
+
+def start_frame_reader(cap, crop, frame_rate, tracker):
+    """
+    Decodes, crops and converts the frames in a background thread (the codec releases the GIL).
+    Returns a queue of (frame_index, time_s, gray) items that ends with None.
+    crop=None means the frames already are the grayscale crop (cached band from frame_cache).
+    """
+    frames = queue.Queue(maxsize=DECODE_QUEUE_FRAMES)
+
+    def read():
+        frame_index = 1 # The first frame was read by the caller (reference frame)
+        previous_s = None
+        while True:
+            with profiler.frame('video_decode'):
+                ret, frame = cap.read()
+            if not ret:
+                break
+            timestamp_s = tracker.frame_timestamp(cap, frame_index, frame_rate, previous_s)
+            previous_s = timestamp_s
+            if crop is not None:
+                x0, y0, x1, y1 = crop
+                frame = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+            frames.put((frame_index, timestamp_s, frame))
+            frame_index += 1
+        frames.put(None)
+
+    threading.Thread(target=read, name='frame_reader', daemon=True).start()
+    return frames
+
+
+def fill_invalid(values, valid):
+    """Linear interpolation in time over the invalid samples of every column (in place)."""
+    for column in np.flatnonzero(~valid.all(axis=0)):
+        good = valid[:, column]
+        values[~good, column] = np.interp(np.flatnonzero(~good), np.flatnonzero(good), values[good, column])
+    return values
+
+
+def track_full_field(video_path, field_path, roi=None):
+    """
+    Tracks a point grid over the structure box with pyramidal Lucas-Kanade and saves the
+    displacement field: dx_mm / dy_mm as (frames x points) float32 matrices.
+    """
+    roi = STRUCTURE_ROI if roi is None else roi
+    if not os.path.exists(video_path):
+        print(f"FATAL ERROR: Video file not found at: {video_path}")
+        sys.exit(1)
+
+    tracker = load_script('tracker') # Frame timestamps and container frame rate
+    cv2.setNumThreads(OPENCV_THREADS if OPENCV_THREADS > 0 else os.cpu_count() or 1)
+
+    frame = frame_cache.read_frame(video_path, 0)
+    if frame is None:
+        print(f"FATAL ERROR: Could not read a frame from {video_path}")
+        sys.exit(1)
+
+    if roi is None:
+        print("\n--- Structure ROI Setup ---")
+        print("Draw a box around the whole structure and press ENTER/SPACE.")
+        roi = cv2.selectROI("Select Structure ROI", frame, False)
+        cv2.destroyAllWindows()
+    x, y, w, h = [int(v) for v in roi]
+    frame_height, frame_width = frame.shape[:2]
+    crop = (max(x - CROP_MARGIN_PX, 0), max(y - CROP_MARGIN_PX, 0),
+            min(x + w + CROP_MARGIN_PX, frame_width), min(y + h + CROP_MARGIN_PX, frame_height))
+
+    band = frame_cache.open_cached(video_path, crop, gray=True) if USE_FRAME_CACHE else None
+    with profiler.stage('video_open'):
+        cap = band if band is not None else cv2.VideoCapture(video_path)
+    ret, frame = cap.read()
+    if not ret:
+        print(f"FATAL ERROR: Could not read a frame from {video_path}")
+        sys.exit(1)
+    reference = frame if band is not None else cv2.cvtColor(frame[crop[1]:crop[3], crop[0]:crop[2]], cv2.COLOR_BGR2GRAY)
+    window = (LK_WINDOW_PX, LK_WINDOW_PX)
+    # Grid inside the ROI only (the margin just gives the LK windows room at the edges)
+    points = grid_points(reference[y - crop[1]:y - crop[1] + h, x - crop[0]:x - crop[0] + w], border=0)
+    points += np.float32([x - crop[0], y - crop[1]])
+    n_points = len(points)
+    if n_points == 0:
+        print("FATAL ERROR: No trackable texture inside the structure ROI.")
+        sys.exit(1)
+
+    frame_rate = tracker.container_frame_rate(cap, tracker.VIDEO_FRAME_RATE)
+    capacity = max(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), 2)
+    positions = np.empty((capacity, n_points, 2), dtype=np.float32)
+    valid = np.empty((capacity, n_points), dtype=bool)
+    time_s = np.empty(capacity)
+    positions[0], valid[0], time_s[0] = points[:, 0], True, 0.0
+    first_timestamp_s = tracker.frame_timestamp(cap, 0, frame_rate, None)
+
+    print(f"Tracking {n_points} grid points ({GRID_SPACING_PX} px spacing) in a {crop[2] - crop[0]}x{crop[3] - crop[1]} px crop...")
+    frames = start_frame_reader(cap, None if band is not None else crop, frame_rate, tracker)
+    guess = points.copy()
+    n_frames = 1
+    loop_start = profiler.now()
+    while True:
+        item = frames.get()
+        if item is None:
+            break
+        _, timestamp_s, gray = item
+        if n_frames == capacity:
+            # The container reported too few frames: grow the buffers
+            capacity *= 2
+            positions = np.resize(positions, (capacity, n_points, 2))
+            valid = np.resize(valid, (capacity, n_points))
+            time_s = np.resize(time_s, capacity)
+
+        with profiler.frame('lucas_kanade'):
+            tracked, status, _ = cv2.calcOpticalFlowPyrLK(
+                reference, gray, points, guess.copy(), winSize=window, maxLevel=LK_PYRAMID_LEVELS,
+                criteria=LK_CRITERIA, flags=cv2.OPTFLOW_USE_INITIAL_FLOW)
+            ok = status[:, 0] == 1
+            if FORWARD_BACKWARD_MAX_PX > 0:
+                back, back_status, _ = cv2.calcOpticalFlowPyrLK(
+                    gray, reference, tracked, points.copy(), winSize=window, maxLevel=LK_PYRAMID_LEVELS,
+                    criteria=LK_CRITERIA, flags=cv2.OPTFLOW_USE_INITIAL_FLOW)
+                error = np.linalg.norm(back[:, 0] - points[:, 0], axis=1)
+                ok &= (back_status[:, 0] == 1) & (error <= FORWARD_BACKWARD_MAX_PX)
+
+        positions[n_frames] = tracked[:, 0]
+        valid[n_frames] = ok
+        time_s[n_frames] = timestamp_s - first_timestamp_s
+        guess[ok] = tracked[ok] # Lost points keep their last good position as the next guess
+        n_frames += 1
+    cap.release()
+
+    if profiler.is_enabled():
+        profiler.record_stage('full_field_tracking', profiler.now() - loop_start)
+        profiler.add_items('full_field_tracking', n_frames * n_points)
+
+    positions, valid, time_s = positions[:n_frames], valid[:n_frames], time_s[:n_frames]
+    keep = valid.mean(axis=0) >= 1.0 - MAX_INVALID_FRACTION
+    positions, valid = positions[:, keep], valid[:, keep]
+    displacement = positions - positions[0]
+    dx = fill_invalid(displacement[:, :, 0], valid)
+    dy = fill_invalid(displacement[:, :, 1], valid)
+
+    mm_per_pixel = MM_PER_PIXEL
+    if mm_per_pixel is None:
+        converter = load_script('converter')
+        mm_per_pixel = converter.KNOWN_PHYSICAL_DISTANCE_MM / converter.MEASURED_PIXEL_DISTANCE
+    rest_px = positions[0] + np.float32(crop[:2]) # Grid in full-frame pixel coordinates
+
+    output_dir = os.path.dirname(field_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with profiler.stage('field_write'):
+        np.savez(field_path, time_s=time_s, points_px=rest_px, valid=valid, mm_per_pixel=np.array(mm_per_pixel),
+                 dx_mm=(dx * mm_per_pixel).astype(np.float32), dy_mm=(dy * mm_per_pixel).astype(np.float32))
+
+    print("\n--- Full-Field Tracking Complete ---")
+    print(f"Frames: {n_frames}, Frame rate: {frame_rate:.2f} Hz")
+    print(f"Grid points kept: {int(keep.sum())} of {n_points} (dropped: invalid in > {MAX_INVALID_FRACTION:.0%} of the frames)")
+    print(f"Interpolated point samples: {int((~valid).sum())}")
+    print(f"Displacement field ({n_frames} x {int(keep.sum())} float32) saved to: {field_path}")
+    return field_path
+
+
+def load_field(field_path):
+    """Reads a saved displacement field into a dict of arrays."""
+    with np.load(field_path) as data:
+        return {key: data[key] for key in data.files}
+
+
+def field_matrix(field, directions=None):
+    """(frames x channels) matrix of the selected directions: dx of all points, then dy."""
+    directions = MODE_DIRECTIONS if directions is None else directions
+    parts = {'x': [field['dx_mm']], 'y': [field['dy_mm']], 'xy': [field['dx_mm'], field['dy_mm']]}[directions]
+    return np.hstack(parts)
+
+
+def field_spectrum(displacement, sample_rate):
+    """
+    Hann-windowed FFT of every column in one batched call. float32 input stays in single
+    precision (complex64 output), which halves the memory of many-point fields.
+    """
+    window = np.hanning(len(displacement)).astype(displacement.dtype)
+    X = rfft((displacement - displacement.mean(axis=0)) * window[:, None], axis=0)
+    xf = rfftfreq(len(displacement), 1.0 / sample_rate)
+    return xf, X
+
+
+def operating_shapes(xf, X, n_modes=None, band_Hz=None, bins=None):
+    """
+    Picks the strongest peaks of the spectrum summed over all points and returns one mode per
+    peak: frequency and shape, the first singular vector of the spectra around the peak
+    (frequency domain decomposition), normalized like the SSI shapes.
+    """
+    n_modes = N_MODES if n_modes is None else n_modes
+    band_Hz = FREQUENCY_RANGE_HZ if band_Hz is None else band_Hz
+    bins = SHAPE_BINS if bins is None else bins
+    power = np.sum(np.abs(X) ** 2, axis=1)
+    low, high = band_Hz
+    in_band = (xf >= (low or 0)) & (xf <= (high or xf[-1]))
+    band_power = np.where(in_band, power, 0)
+    peaks, properties = find_peaks(band_power, height=MIN_PEAK_FRACTION * band_power.max(), distance=2 * bins + 1)
+    strongest = peaks[np.argsort(properties['peak_heights'])[::-1][:n_modes]]
+
+    modes = []
+    for peak in np.sort(strongest):
+        block = X[max(peak - bins, 0):peak + bins + 1]
+        _, singular_values, Vh = np.linalg.svd(block, full_matrices=False)
+        modes.append({'frequency_Hz': xf[peak], 'shape': ssi_analyzer.normalize_shape(Vh[0].conj()),
+                      'dominance': singular_values[0] ** 2 / np.sum(singular_values ** 2)})
+    return modes, power
+
+
+def shape_components(shape, n_points, directions=None):
+    """Splits a mode shape vector into its (x, y) components per grid point."""
+    directions = MODE_DIRECTIONS if directions is None else directions
+    zeros = np.zeros(n_points, dtype=shape.dtype)
+    if directions == 'x':
+        return shape, zeros
+    if directions == 'y':
+        return zeros, shape
+    return shape[:n_points], shape[n_points:]
+
+
+def write_modes(modes, points_px, output_path, directions=None):
+    """Writes the shapes in long format: one row per (mode, grid point)."""
+    directions = MODE_DIRECTIONS if directions is None else directions
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    tables = []
+    for n, mode in enumerate(modes, start=1):
+        sx, sy = shape_components(mode['shape'], len(points_px), directions)
+        tables.append(pd.DataFrame({
+            'mode': n, 'frequency_Hz': mode['frequency_Hz'], 'point': np.arange(len(points_px)),
+            'x_px': points_px[:, 0], 'y_px': points_px[:, 1],
+            'shape_x': sx.real, 'shape_y': sy.real,
+            'phase_x_deg': np.degrees(np.angle(sx)), 'phase_y_deg': np.degrees(np.angle(sy)),
+        }))
+    pd.concat(tables).to_csv(output_path, index=False)
+
+# --- MAIN ANALYSIS LOGIC ---
+
+def analyze_full_field(field_path, modes_path, skip_frames=None):
+    """Operating deflection shapes of the whole structure from a saved displacement field."""
+    skip_frames = SKIP_INITIAL_FRAMES if skip_frames is None else skip_frames
+    if not os.path.exists(field_path):
+        print(f"FATAL ERROR: Displacement field not found at: {field_path}")
+        print("Run the full-field tracking first (track_full_field).")
+        sys.exit(1)
+
+    field = load_field(field_path)
+    time_s = field['time_s'][skip_frames:]
+    displacement = field_matrix(field)[skip_frames:]
+    points_px = field['points_px']
+    Fs = 1.0 / np.median(np.diff(time_s))
+
+    with profiler.stage('field_fft'):
+        xf, X = field_spectrum(displacement, Fs)
+    profiler.add_items('field_fft', displacement.size)
+    modes, power = operating_shapes(xf, X)
+
+    print(f"\n--- Full-Field Analysis Parameters ---")
+    print(f"Grid points: {len(points_px)}, Channels ({MODE_DIRECTIONS}): {displacement.shape[1]}, "
+          f"Frames: {len(displacement)}, Fs: {Fs:.2f} Hz")
+    print(f"\n--- Operating Deflection Shapes ({len(modes)}) ---")
+    for n, mode in enumerate(modes, start=1):
+        in_phase = np.mean(mode['shape'].real > 0)
+        print(f"Mode {n}: f = {mode['frequency_Hz']:.3f} Hz, dominance of the first singular value: "
+              f"{mode['dominance']:.2f}, points moving in phase with the largest: {in_phase:.0%}")
+
+    write_modes(modes, points_px, modes_path)
+    print(f"\nMode shapes saved to: {modes_path}")
+
+    report_renderer.show_or_export(
+        'full_field_modes', report_renderer.draw_full_field_modes,
+        (points_px, modes, xf, power, MODE_DIRECTIONS),
+        figsize=(12, 4 + 3 * len(modes)),
+        summary={f"mode {n} (Hz)": f"{m['frequency_Hz']:.3f}" for n, m in enumerate(modes, start=1)}
+    )
+    return {'modes': modes, 'points_px': points_px, 'Fs': Fs}
+
+if __name__ == "__main__":
+    if not os.path.exists('data'):
+        os.makedirs('data')
+    track_full_field(VIDEO_PATH, OUTPUT_FIELD_PATH)
+    analyze_full_field(OUTPUT_FIELD_PATH, OUTPUT_MODES_PATH)
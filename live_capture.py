@@ -0,0 +1,339 @@
+import cv2
+import numpy as np
+import pandas as pd
+import os
+import sys
+import threading
+from collections import deque
+import profiler
+import synthetic_data
+import timebase
+from script_loader import load_script
+
+# --- CONFIGURATION (EDIT THIS) ---
+
+# 1. FRAME SOURCE
+# Camera device index (0 = first camera), a video file / stream URL, or 'synthetic'
+# for the simulated camera from synthetic_data.py (no hardware needed).
+LIVE_SOURCE = 0
+# Nominal frame rate of the camera (the synthetic source also runs at this rate).
+LIVE_FRAME_RATE = 90.0
+# Marker ROIs (x, y, w, h). None = draw them on the first frame (2 markers, like the tracker).
+LIVE_ROIS = None
+
+# 2. FRAME-DROP POLICY (when tracking is slower than the camera)
+# 'drop_oldest' : keep only the newest frames -> lowest latency (recommended for SHM)
+# 'drop_newest' : keep the queued frames, discard new ones until there is room
+# 'block'       : never drop in software; the camera driver drops frames instead
+FRAME_DROP_POLICY = 'drop_oldest'
+FRAME_QUEUE_SIZE = 2 # Every queued frame adds one tracking period of latency
+
+# 3. RING BUFFER AND ONLINE ANALYSIS
+# The newest RING_BUFFER_SECONDS of tracker samples (x, y and, with the tracker's TRACK_ROTATION,
+# rotation of every marker, float32) are kept in memory for analysis.
+RING_BUFFER_SECONDS = 60.0
+# The dominant frequency of every channel is re-estimated this often (0 disables it).
+ANALYSIS_INTERVAL_S = 5.0
+
+# 4. RUN SETTINGS
+LIVE_DURATION_S = None # None = run until 'q' is pressed (or Ctrl+C)
+SHOW_WINDOW = True
+# The ring buffer contents are saved here at the end, in the tracker's CSV format.
+LIVE_OUTPUT_CSV_PATH = 'data/live_pixel_positions.csv'
+
+# --- RING BUFFER ---
+
+class RingBuffer:
+    """
+    Fixed-size buffer of (time_s, channel values) samples; the channels are named by
+    'columns' (the tracker's output columns) and stored as float32. push() overwrites the
+    oldest sample when full (O(1), no reallocation); snapshot() returns the samples in time
+    order. Safe to use from the tracking thread and an analysis thread at the same time.
+    """
+
+    def __init__(self, capacity, columns):
+        self.capacity = int(capacity)
+        self.columns = list(columns)
+        self.time_s = np.zeros(self.capacity)
+        self.values = np.zeros((self.capacity, len(self.columns)), dtype=np.float32)
+        self.total_pushed = 0
+        self._lock = threading.Lock()
+
+    def push(self, time_s, values):
+        with self._lock:
+            i = self.total_pushed % self.capacity
+            self.time_s[i] = time_s
+            self.values[i] = values
+            self.total_pushed += 1
+
+    def __len__(self):
+        return min(self.total_pushed, self.capacity)
+
+    def snapshot(self, n=None):
+        """Copies of the newest n samples (default: all), oldest first."""
+        with self._lock:
+            count = len(self) if n is None else min(n, len(self))
+            end = self.total_pushed % self.capacity
+            indices = (np.arange(end - count, end)) % self.capacity
+            return self.time_s[indices].copy(), self.values[indices].copy()
+
+# --- FRAME SOURCE AND GRABBER ---
+
+def open_frame_source(source, frame_rate=None):
+    """
+    Returns (read, release, rois) for a camera index, a file/stream path, 'synthetic',
+    or any callable that works like cv2.VideoCapture.read() (returns (ok, frame)).
+    'rois' is only known for the synthetic source, otherwise None.
+    """
+    frame_rate = LIVE_FRAME_RATE if frame_rate is None else frame_rate
+    if callable(source):
+        return source, (lambda: None), None
+
+    if source == 'synthetic':
+        read, rois, _ = synthetic_data.live_frame_source(frame_rate, 2, synthetic_data.SYNTHETIC_MODES)
+        return read, (lambda: None), rois
+
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        print(f"FATAL ERROR: Could not open the frame source: {source}")
+        sys.exit(1)
+    # Small driver-side buffer: old frames waiting in the driver only add latency
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return cap.read, cap.release, None
+
+
+def new_live_stats():
+    """Counters of a live run (updated by the grabber and the tracking loop)."""
+    return {'frames_captured': 0, 'frames_dropped': 0, 'frames_skipped_by_source': 0,
+            'frames_tracked': 0, 'tracking_failures': 0, 'reacquired': 0,
+            'latency_ms': deque(maxlen=1000)}
+
+
+def start_frame_grabber(read, stats, stop_event, frame_rate=None,
+                        policy=None, queue_size=None):
+    """
+    Reads frames in a background thread so decoding never waits for tracking.
+    Every frame is stamped with its capture time (perf_counter) and put into a small
+    queue, applying the frame-drop policy when the queue is full.
+    Returns (queue, condition, thread); the thread stops at stop_event or end of stream.
+    """
+    frame_rate = LIVE_FRAME_RATE if frame_rate is None else frame_rate
+    policy = FRAME_DROP_POLICY if policy is None else policy
+    queue_size = FRAME_QUEUE_SIZE if queue_size is None else queue_size
+    frames = deque()
+    condition = threading.Condition()
+
+    def grab():
+        last_capture = None
+        while not stop_event.is_set():
+            ok, frame = read()
+            captured = profiler.now()
+            if not ok:
+                break
+            with condition:
+                stats['frames_captured'] += 1
+                # Frames the source itself skipped show up as long capture intervals
+                if last_capture is not None:
+                    missed = int(round((captured - last_capture) * frame_rate)) - 1
+                    stats['frames_skipped_by_source'] += max(missed, 0)
+                last_capture = captured
+                if len(frames) >= queue_size:
+                    if policy == 'drop_oldest':
+                        frames.popleft()
+                        stats['frames_dropped'] += 1
+                    elif policy == 'drop_newest':
+                        stats['frames_dropped'] += 1
+                        continue
+                    else:
+                        while len(frames) >= queue_size and not stop_event.is_set():
+                            condition.wait(0.1)
+                frames.append((frame, captured))
+                condition.notify()
+        with condition:
+            frames.append(None) # End of stream marker
+            condition.notify()
+
+    thread = threading.Thread(target=grab, name='frame_grabber', daemon=True)
+    thread.start()
+    return frames, condition, thread
+
+
+def next_frame(frames, condition, timeout_s=1.0):
+    """
+    Waits for the next queued (frame, capture_time). Returns None at the end of the
+    stream and False if no frame arrived within timeout_s.
+    """
+    with condition:
+        while not frames:
+            if not condition.wait(timeout_s):
+                return False
+        item = frames.popleft()
+        condition.notify()
+        return item
+
+
+def latency_summary(stats):
+    """Mean, 95th percentile and maximum capture-to-buffer latency (ms) of the recent frames."""
+    latencies = np.array(stats['latency_ms'])
+    if len(latencies) == 0:
+        return {'mean_ms': None, 'p95_ms': None, 'max_ms': None}
+    return {'mean_ms': float(np.mean(latencies)), 'p95_ms': float(np.percentile(latencies, 95)),
+            'max_ms': float(np.max(latencies))}
+
+# --- ONLINE ANALYSIS ---
+
+def online_dominant_frequencies(buffer):
+    """
+    Dominant frequency (Hz) of every position and rotation channel over the samples currently
+    in the ring buffer, as {column: f}. Gaps from dropped frames and NaN samples (failed
+    rotation fits) are interpolated before the FFT (see timebase.py).
+    """
+    time_s, values = buffer.snapshot()
+    if len(time_s) < 16:
+        return None
+    values, _ = timebase.fill_missing(time_s, values)
+    if timebase.detect_gaps(time_s)['has_gaps']:
+        time_s, values, _ = timebase.resample_uniform(time_s, values)
+    T = timebase.nominal_interval(time_s)
+
+    vibration = load_script('vibration')
+    frequencies = {}
+    for name, column in zip(buffer.columns, values.T):
+        if name.startswith('confidence') or np.isnan(column).all():
+            continue
+        xf, psd = vibration.compute_spectrum(column - column.mean(), T)
+        frequencies[name] = float(xf[1 + np.argmax(psd[1:])])
+    return frequencies
+
+# --- MAIN LIVE TRACKING LOGIC ---
+
+def run_live_tracking(source, rois=None, frame_rate=None, duration_s=None,
+                      show_window=None, policy=None, analysis_interval_s=None):
+    """
+    Tracks the markers of a live frame source in real time. Every tracked frame adds one
+    sample to a ring buffer, with the same channels as the tracker's run_tracking_loop
+    (x, y center, rotation with TRACK_ROTATION, confidence with re-acquisition), which is
+    analyzed every analysis_interval_s seconds. Returns (ring_buffer, stats).
+    """
+    frame_rate = LIVE_FRAME_RATE if frame_rate is None else frame_rate
+    duration_s = LIVE_DURATION_S if duration_s is None else duration_s
+    show_window = SHOW_WINDOW if show_window is None else show_window
+    policy = FRAME_DROP_POLICY if policy is None else policy
+    analysis_interval_s = ANALYSIS_INTERVAL_S if analysis_interval_s is None else analysis_interval_s
+    tracker = load_script('tracker')
+    read, release, source_rois = open_frame_source(source, frame_rate)
+
+    # 1. FIRST FRAME & INITIALIZATION
+    ok, frame = read()
+    if not ok:
+        print("FATAL ERROR: Could not read a frame from the live source.")
+        release()
+        sys.exit(1)
+    rois = rois or source_rois
+    if rois is None:
+        print("Draw a tight bounding box around each marker (M1, then M2) and press ENTER/SPACE.")
+        rois = [cv2.selectROI(f"Select Marker {i + 1} ROI", frame, False) for i in range(2)]
+        cv2.destroyAllWindows()
+    trackers = tracker.create_trackers(frame, rois)
+    # Lost markers are re-acquired automatically (an unattended run must not stop for good)
+    recovery = tracker.new_recovery_state(frame, rois) if tracker.REACQUIRE_ENABLED else None
+
+    x_columns, y_columns, rotation_columns, confidence_columns = tracker.output_columns(len(trackers), recovery)
+    template_grays = [tracker.gray_float(t) for t in recovery['templates']] if rotation_columns else []
+    buffer = RingBuffer(int(RING_BUFFER_SECONDS * frame_rate), x_columns + y_columns + rotation_columns + confidence_columns)
+    stats = new_live_stats()
+    stop_event = threading.Event()
+    frames, condition, grabber = start_frame_grabber(read, stats, stop_event, frame_rate, policy)
+
+    # 2. REAL-TIME TRACKING LOOP
+    print(f"\nLive tracking started ({len(trackers)} markers, drop policy '{policy}'). Press 'q' to stop.")
+    start = profiler.now()
+    first_capture = None
+    next_analysis = start + analysis_interval_s if analysis_interval_s else None
+    try:
+        while duration_s is None or profiler.now() - start < duration_s:
+            item = next_frame(frames, condition)
+            if item is None:
+                break
+            if item is False:
+                continue
+            frame, captured = item
+            if first_capture is None:
+                first_capture = captured
+
+            with profiler.frame('csrt_update'):
+                results = tracker.update_markers(frame, trackers, recovery)
+
+            if all(ok for ok, _, _ in results):
+                boxes = [[int(v) for v in box] for _, box, _ in results]
+                sample = ([x + w / 2.0 for x, _, w, _ in boxes] + [y + h / 2.0 for _, y, _, h in boxes]
+                          + [tracker.marker_rotation_deg(frame, box, template)
+                             for (_, box, _), template in zip(results, template_grays)]
+                          + ([confidence for _, _, confidence in results] if confidence_columns else []))
+                buffer.push(captured - first_capture, sample)
+                stats['frames_tracked'] += 1
+                stats['latency_ms'].append((profiler.now() - captured) * 1000.0)
+            else:
+                stats['tracking_failures'] += 1
+
+            if show_window:
+                for i, (_, box, _) in enumerate(results):
+                    x, y, w, h = [int(v) for v in box]
+                    cv2.rectangle(frame, (x, y), (x + w, y + h), tracker.MARKER_COLORS[i % len(tracker.MARKER_COLORS)], 2)
+                cv2.putText(frame, f"Dropped: {stats['frames_dropped']} | Samples: {len(buffer)}", (10, 30),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+                cv2.imshow("Live Tracking", frame)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+
+            if next_analysis is not None and profiler.now() >= next_analysis:
+                next_analysis += analysis_interval_s
+                frequencies = online_dominant_frequencies(buffer)
+                if frequencies:
+                    text = ", ".join(f"{column}: {f:.3f} Hz" for column, f in frequencies.items())
+                    print(f"[{profiler.now() - start:7.1f} s] Dominant frequency {text} | "
+                          f"dropped {stats['frames_dropped']} | latency {latency_summary(stats)['mean_ms']:.1f} ms")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        grabber.join(timeout=2.0)
+        release()
+        if show_window:
+            cv2.destroyAllWindows()
+
+    if recovery:
+        stats['reacquired'] = recovery['reacquired']
+    return buffer, stats
+
+
+def save_ring_buffer(buffer, output_path):
+    """
+    Saves the ring buffer in the tracker's CSV format (frame_index, time_s, x_pixel_M1, ...,
+    y_pixel_M1, ..., rotation_deg_M1, ...), so it can go through calibration_converter.py.
+    frame_index is the sample number here.
+    """
+    time_s, values = buffer.snapshot()
+    data = {'frame_index': np.arange(len(time_s)), 'time_s': time_s - (time_s[0] if len(time_s) else 0.0)}
+    for i, column in enumerate(buffer.columns):
+        data[column] = values[:, i]
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    pd.DataFrame(data).to_csv(output_path, index=False)
+
+
+if __name__ == "__main__":
+    buffer, stats = run_live_tracking(LIVE_SOURCE, LIVE_ROIS)
+    save_ring_buffer(buffer, LIVE_OUTPUT_CSV_PATH)
+
+    latency = latency_summary(stats)
+    print("\n--- Live Tracking Stopped ---")
+    print(f"Frames captured: {stats['frames_captured']}")
+    print(f"Frames tracked: {stats['frames_tracked']} (tracking failures: {stats['tracking_failures']}, re-acquired: {stats['reacquired']})")
+    print(f"Frames dropped (queue full, policy '{FRAME_DROP_POLICY}'): {stats['frames_dropped']}")
+    print(f"Frames skipped by the source: {stats['frames_skipped_by_source']}")
+    if latency['mean_ms'] is not None:
+        print(f"Latency (capture -> ring buffer): mean {latency['mean_ms']:.1f} ms, "
+              f"p95 {latency['p95_ms']:.1f} ms, max {latency['max_ms']:.1f} ms")
+    print(f"Last {len(buffer)} samples saved to: {LIVE_OUTPUT_CSV_PATH}")
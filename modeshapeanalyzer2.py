@@ -1,9 +1,10 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 from scipy.signal import detrend
 import os
 import sys
+import profiler
+import report_renderer
 
 # --- IDEAL CONFIGURATION FOR TARGET RESULTS ---
 
@@ -49,7 +50,8 @@ def analyze_mode_shape(input_path, config_path, col_m1, col_m2):
     Fs = config.get('Fs')
     skip_samples = int(config.get('skip_samples'))
 
-    df = pd.read_csv(input_path)
+    with profiler.stage('read_csv'):
+        df = pd.read_csv(input_path)
     
     # 2. Prepare and Detrend Signals
     data_M1_raw = df[col_m1].values
@@ -65,7 +67,8 @@ def analyze_mode_shape(input_path, config_path, col_m1, col_m2):
     time_s = np.arange(N) * (1.0 / Fs)
 
     # 3. Phase Calculation using Cross-Correlation
-    correlation = np.correlate(sig_M1_detrended, sig_M2_detrended, mode='full')
+    with profiler.stage('cross_correlation'):
+        correlation = np.correlate(sig_M1_detrended, sig_M2_detrended, mode='full')
     lags = np.arange(-N + 1, N)
     
     delay_index = np.argmax(correlation)
@@ -91,23 +94,13 @@ def analyze_mode_shape(input_path, config_path, col_m1, col_m2):
         phase_text = f"Phase Difference: {phase_normalized:.1f}° (Mixed Phase)"
 
     # 4. Plotting Mode Shape
-    fig, ax = plt.subplots(1, 1, figsize=(10, 6))
-
-    ax.plot(time_s, sig_M1_detrended, label='Marker 1 (Primary)')
-    ax.plot(time_s, sig_M2_detrended, label='Marker 2 (Secondary)', linestyle='--')
-    
-    ax.set_title(f"Mode Shape Phase Analysis at F_n = {f_n:.3f} Hz")
-    ax.set_xlabel("Time (s)")
-    ax.set_ylabel("Detrended Displacement (mm)")
-    ax.grid(True, linestyle='--')
-    ax.legend()
-    
-    # Add phase text to the plot
-    ax.text(0.05, 0.95, phase_text, transform=ax.transAxes, 
-            fontsize=12, verticalalignment='top', bbox=dict(boxstyle="round,pad=0.5", fc="white", alpha=0.7))
-
-    plt.tight_layout()
-    plt.show()
+    report_renderer.show_or_export(
+        "mode_shape_phase",
+        report_renderer.draw_mode_shape_phase,
+        (time_s, sig_M1_detrended, sig_M2_detrended, f_n, phase_text),
+        figsize=(10, 6),
+        summary={'f_n (Hz)': f"{f_n:.3f}", 'Phase difference (deg)': f"{phase_normalized:.1f}", 'Interpretation': mode_description}
+    )
 
     # 5. Print Results
     print("\n--- Mode Shape Analysis Results ---")
@@ -0,0 +1,363 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.fft import rfft, rfftfreq
+import os
+import profiler
+import report_renderer
+import spectral_cache
+import timebase
+
+# --- CONFIGURATION (EDIT THIS) ---
+
+# 1. WHEN TO STREAM
+# The analyzers read the whole file into memory by default. With their OUT_OF_CORE
+# setting on 'auto', files larger than this are processed chunk by chunk in one pass instead.
+OUT_OF_CORE_THRESHOLD_MB = 200
+
+# 2. CHUNK SIZE
+# Rows per chunk. Memory use is a few times CHUNK_ROWS x columns x 8 bytes.
+CHUNK_ROWS = 500_000
+
+# 3. MEMORY-MAPPED COLUMNS
+# The first pass over a CSV file also writes each used column as a raw float64 file.
+# Later runs on the same (unchanged) file map those files instead of parsing the CSV again,
+# which is many times faster. The files live next to the spectral cache and are not
+# counted by its size limit - delete the folder to reclaim the space.
+USE_MEMMAP = True
+MEMMAP_DIR = os.path.join(spectral_cache.CACHE_DIR, 'memmap')
+
+# 4. SPECTRUM (WELCH AVERAGING)
+# The spectrum of a long record is the average over Hann-windowed segments of this
+# length (frequency resolution = 1 / WELCH_SEGMENT_SECONDS). Segments containing a gap
+# in the time axis are skipped.
+WELCH_SEGMENT_SECONDS = 60.0
+WELCH_OVERLAP = 0.5
+
+# --- READERS ---
+
+def use_out_of_core(input_path, mode='auto'):
+    """Resolves an analyzer's OUT_OF_CORE setting (True, False or 'auto') for a file."""
+    if mode == 'auto':
+        return os.path.getsize(input_path) > OUT_OF_CORE_THRESHOLD_MB * 1e6
+    return bool(mode)
+
+
+def _memmap_path(digest, column):
+    return os.path.join(MEMMAP_DIR, f"{digest}_{column}.f64")
+
+
+def memmap_columns(input_path, columns, chunk_rows=None):
+    """
+    Read-only memory maps (float64) of the given CSV columns. Missing columns are
+    converted once, chunk by chunk, so the CSV never has to fit in memory.
+    """
+    chunk_rows = CHUNK_ROWS if chunk_rows is None else chunk_rows
+    digest = spectral_cache.file_digest(input_path)
+    missing = [c for c in columns if not os.path.exists(_memmap_path(digest, c))]
+    if missing:
+        os.makedirs(MEMMAP_DIR, exist_ok=True)
+        # Per-process temporary names: two processes converting the same file do not share one
+        temporary = {c: f"{_memmap_path(digest, c)}.{os.getpid()}.tmp" for c in missing}
+        files = {c: open(path, 'wb') for c, path in temporary.items()}
+        try:
+            with profiler.stage('read_csv'):
+                for chunk in pd.read_csv(input_path, usecols=missing, chunksize=chunk_rows):
+                    for c in missing:
+                        chunk[c].values.astype(np.float64).tofile(files[c])
+        finally:
+            for f in files.values():
+                f.close()
+        # Renamed only when complete, so an interrupted conversion is never used
+        for c, path in temporary.items():
+            try:
+                os.replace(path, _memmap_path(digest, c))
+            except PermissionError:
+                # Windows: another process converted it first and has it mapped (same contents)
+                os.remove(path)
+
+    return {c: np.memmap(_memmap_path(digest, c), dtype=np.float64, mode='r') for c in columns}
+
+
+def iter_chunks(input_path, columns, skip_samples=0, chunk_rows=None, use_memmap=None):
+    """
+    Generator over a CSV file in chunks of chunk_rows rows: yields {column: array}.
+    The first skip_samples rows are skipped (like .values[skip_samples:] on the whole file).
+    """
+    chunk_rows = CHUNK_ROWS if chunk_rows is None else chunk_rows
+    use_memmap = USE_MEMMAP if use_memmap is None else use_memmap
+    columns = list(columns)
+    if use_memmap:
+        mapped = memmap_columns(input_path, columns, chunk_rows)
+        n_rows = len(mapped[columns[0]])
+        for start in range(skip_samples, n_rows, chunk_rows):
+            yield {c: np.array(mapped[c][start:start + chunk_rows]) for c in columns}
+        return
+
+    reader = pd.read_csv(input_path, usecols=columns, chunksize=chunk_rows,
+                         skiprows=range(1, skip_samples + 1))
+    for chunk in reader:
+        yield {c: chunk[c].values.astype(float) for c in columns}
+
+# --- RUNNING STATISTICS (BASELINE) ---
+
+def new_running_stats():
+    return {'count': 0, 'mean': 0.0, 'm2': 0.0, 'min': np.inf, 'max': -np.inf}
+
+
+def update_running_stats(stats, values):
+    """
+    Adds a chunk to the running count/mean/variance/min/max. Chunk statistics are merged
+    with the parallel form of Welford's algorithm, which stays accurate on long records
+    (no large sums of squares). Works per column for 2-D chunks.
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    if n == 0:
+        return stats
+    mean = values.mean(axis=0)
+    m2 = ((values - mean) ** 2).sum(axis=0)
+
+    total = stats['count'] + n
+    delta = mean - stats['mean']
+    stats['mean'] = stats['mean'] + delta * n / total
+    stats['m2'] = stats['m2'] + m2 + delta ** 2 * stats['count'] * n / total
+    stats['count'] = total
+    stats['min'] = np.minimum(stats['min'], values.min(axis=0))
+    stats['max'] = np.maximum(stats['max'], values.max(axis=0))
+    return stats
+
+
+def finish_running_stats(stats):
+    """Mean (baseline), standard deviation (RMS about the baseline), min, max and count."""
+    std = np.sqrt(stats['m2'] / stats['count']) if stats['count'] else np.nan
+    return {'count': stats['count'], 'mean': stats['mean'], 'std': std, 'min': stats['min'], 'max': stats['max']}
+
+# --- TIME AXIS ---
+
+def new_time_tracker(tolerance=timebase.GAP_TOLERANCE):
+    return {'dt': None, 'tolerance': tolerance, 'last': None, 'first': None,
+            'count': 0, 'gaps': 0, 'missing_samples': 0}
+
+
+def update_time_tracker(tracker, time_s):
+    """
+    Gap detection across chunks (see timebase.detect_gaps). The nominal interval is
+    taken from the first chunk. Returns a boolean array marking the samples that follow
+    a gap (including a gap at the chunk boundary).
+    """
+    time_s = np.asarray(time_s, dtype=float)
+    if tracker['dt'] is None:
+        tracker['dt'] = timebase.nominal_interval(time_s)
+        tracker['first'] = time_s[0]
+        previous = time_s[:1]
+    else:
+        previous = [tracker['last']]
+
+    steps = np.diff(time_s, prepend=previous)
+    gap_before = steps > tracker['tolerance'] * tracker['dt']
+    tracker['gaps'] += int(gap_before.sum())
+    tracker['missing_samples'] += int(np.sum(np.round(steps[gap_before] / tracker['dt']) - 1))
+    tracker['last'] = time_s[-1]
+    tracker['count'] += len(time_s)
+    return gap_before
+
+# --- SPECTRUM ACCUMULATION (WELCH) ---
+
+def new_spectrum_accumulator(sample_rate, segment_seconds=None, overlap=None):
+    segment_seconds = WELCH_SEGMENT_SECONDS if segment_seconds is None else segment_seconds
+    overlap = WELCH_OVERLAP if overlap is None else overlap
+    nperseg = max(int(round(segment_seconds * sample_rate)), 8)
+    return {'Fs': sample_rate, 'nperseg': nperseg, 'step': max(int(nperseg * (1 - overlap)), 1),
+            'window': np.hanning(nperseg), 'buffer': None, 'gap_buffer': None,
+            'power_sum': 0.0, 'segments': 0, 'skipped_segments': 0}
+
+
+def accumulate_spectrum(acc, values, gap_before=None):
+    """
+    Adds a chunk (1-D, or samples x channels) to the averaged spectrum. Samples that do
+    not complete a segment are carried over to the next chunk, so the result does not
+    depend on the chunk size. Each segment has its own mean removed (local baseline).
+    """
+    values = np.asarray(values, dtype=float)
+    if gap_before is None:
+        gap_before = np.zeros(len(values), dtype=bool)
+    if acc['buffer'] is not None:
+        values = np.concatenate([acc['buffer'], values])
+        gap_before = np.concatenate([acc['gap_buffer'], gap_before])
+
+    nperseg, step = acc['nperseg'], acc['step']
+    n_segments = (len(values) - nperseg) // step + 1 if len(values) >= nperseg else 0
+    if n_segments > 0:
+        starts = np.arange(n_segments) * step
+        # A segment is invalid if any step inside it (samples 1 ... nperseg-1) is a gap
+        gap_count = np.concatenate([[0], np.cumsum(gap_before)])
+        valid = (gap_count[starts + nperseg] - gap_count[starts + 1]) == 0
+
+        segments = sliding_window_view(values, nperseg, axis=0)[starts[valid]] # segments x [channels x] nperseg
+        segments = segments - segments.mean(axis=-1, keepdims=True)
+        power = np.abs(rfft(segments * acc['window'], axis=-1)) ** 2
+        acc['power_sum'] = acc['power_sum'] + power.sum(axis=0)
+        acc['segments'] += int(valid.sum())
+        acc['skipped_segments'] += int((~valid).sum())
+
+    consumed = n_segments * step
+    acc['buffer'] = values[consumed:]
+    acc['gap_buffer'] = gap_before[consumed:]
+    return acc
+
+
+def spectrum_result(acc):
+    """
+    Averaged spectrum: (xf, amplitude, psd), or None if no complete segment was seen.
+    'amplitude' is scaled like compute_spectrum in vibration_analyzer.py (a sine of
+    amplitude A shows a peak of ~A); 'psd' is the power spectral density (unit^2/Hz).
+    2-D results are frequencies x channels.
+    """
+    if acc['segments'] == 0:
+        return None
+    mean_power = acc['power_sum'] / acc['segments']
+    window = acc['window']
+    amplitude = 2.0 * np.sqrt(mean_power) / window.sum()
+    psd = 2.0 * mean_power / (acc['Fs'] * np.sum(window ** 2))
+    xf = rfftfreq(acc['nperseg'], 1.0 / acc['Fs'])
+    return xf, amplitude.T, psd.T
+
+# --- PEAK DETECTION ---
+
+def new_peak_detector(min_distance_samples):
+    # find_peaks rounds a fractional distance up
+    return {'distance': max(int(np.ceil(min_distance_samples)), 1), 'tail': np.empty(0), 'tail_time': np.empty(0),
+            'offset': 0, 'anchor': None, 'index': [], 'time': [], 'value': []}
+
+
+def _last_separator(peaks, heights, distance, known_until):
+    """
+    Position (in peaks) of the last peak that is higher than every other peak closer than
+    distance and whose right-hand neighbourhood lies before known_until, or None.
+    """
+    last = np.searchsorted(peaks, known_until - distance, side='right') - 1
+    for i in range(last, -1, -1):
+        lo = np.searchsorted(peaks, peaks[i] - distance, side='right')
+        hi = np.searchsorted(peaks, peaks[i] + distance, side='left')
+        neighbours = np.concatenate([heights[lo:i], heights[i + 1:hi]])
+        if not len(neighbours) or heights[i] > neighbours.max():
+            return i
+    return None
+
+
+def detect_peaks_chunk(detector, time_s, values, final=False):
+    """
+    Positive peaks (crests) of a chunk with a minimum distance between peaks, identical to
+    find_peaks(..., distance=...) on the whole record. find_peaks keeps the highest peaks
+    first and drops everything closer to them, so one peak can decide another through a
+    chain of overlapping neighbourhoods of any length. A peak that is higher than all
+    peaks closer than distance (a separator) is kept whatever happens around it, and no
+    chain crosses it: peaks up to the last separator are final. The record from that
+    separator on is searched again with the next chunk, starting with the separator itself,
+    so it still removes its neighbours. In the worst case (peaks rising for a long stretch,
+    each closer than distance to the next) the carried part grows until the rise ends.
+    Peaks of exactly equal height that compete are the one exception: find_peaks orders
+    them by an unstable sort, so the whole-record search may keep the other one.
+    final=True commits everything (end of the record).
+    """
+    values = np.concatenate([detector['tail'], np.asarray(values, dtype=float)])
+    time_s = np.concatenate([detector['tail_time'], np.asarray(time_s, dtype=float)])
+    start = detector['offset'] - len(detector['tail'])
+    detector['offset'] = start + len(values)
+    if not len(values):
+        return detector
+
+    from scipy.signal import find_peaks # Slow import, only the damping analysis needs it
+    # The separator the carried part starts with gets a lower sample in front, so it is a peak again
+    lead = 1 if detector['anchor'] is not None else 0
+    searched = np.concatenate([[-np.inf], values]) if lead else values
+    peaks, properties = find_peaks(searched, distance=detector['distance'], plateau_size=1)
+    left_edges = properties['left_edges'] - lead
+    peaks = peaks - lead
+
+    if final:
+        commit_until = len(values)
+    else:
+        # A peak can still appear in the trailing run of equal samples (a plateau may continue)
+        flat = np.flatnonzero(values[1:] != values[:-1])
+        known_until = flat[-1] + 1 if len(flat) else 0
+        candidates, _ = find_peaks(searched)
+        candidates = candidates - lead
+        separator = _last_separator(candidates, values[candidates], detector['distance'], known_until)
+        commit_until = candidates[separator] + 1 if separator is not None else None
+
+    if commit_until is not None:
+        new = peaks < commit_until
+        if lead:
+            new &= start + peaks > detector['anchor'] # The separator in front was committed before
+        for p in peaks[new]:
+            detector['index'].append(start + p)
+            detector['time'].append(time_s[p])
+            detector['value'].append(values[p])
+        if final:
+            carried = slice(0, 0)
+            detector['anchor'] = None
+        else:
+            # Carried from the start of the separator's plateau, so it is found at the same sample
+            anchor = commit_until - 1
+            carried = slice(left_edges[peaks == anchor][0], None)
+            detector['anchor'] = start + anchor
+    else:
+        carried = slice(0, None)
+    detector['tail'], detector['tail_time'] = values[carried], time_s[carried]
+    return detector
+
+
+def peak_result(detector):
+    """(indices, times, values) of all peaks, after committing the provisional ones at the end."""
+    if len(detector['tail']):
+        detect_peaks_chunk(detector, [], [], final=True)
+    return (np.array(detector['index'], dtype=np.int64), np.array(detector['time']), np.array(detector['value']))
+
+# --- PLOT ENVELOPE ---
+
+def new_envelope(max_points=report_renderer.MAX_PLOT_POINTS):
+    return {'max_buckets': max(max_points // 2, 2), 'bucket': 1,
+            'x': np.empty((0, 2)), 'y': np.empty((0, 2)), 'rest_x': np.empty(0), 'rest_y': np.empty(0)}
+
+
+def update_envelope(envelope, x, y):
+    """
+    Min/max envelope for plotting (see report_renderer.minmax_decimate), built chunk by
+    chunk: every bucket keeps its minimum and maximum sample. When there are too many
+    buckets, neighbouring buckets are merged and the bucket size doubles.
+    """
+    x = np.concatenate([envelope['rest_x'], x])
+    y = np.concatenate([envelope['rest_y'], np.asarray(y, dtype=float)])
+    bucket = envelope['bucket']
+    n_full = len(y) // bucket
+    if n_full:
+        body_x = x[:n_full * bucket].reshape(n_full, bucket)
+        body_y = y[:n_full * bucket].reshape(n_full, bucket)
+        rows = np.arange(n_full)
+        i_min, i_max = np.argmin(body_y, axis=1), np.argmax(body_y, axis=1)
+        envelope['x'] = np.concatenate([envelope['x'], np.column_stack([body_x[rows, i_min], body_x[rows, i_max]])])
+        envelope['y'] = np.concatenate([envelope['y'], np.column_stack([body_y[rows, i_min], body_y[rows, i_max]])])
+    envelope['rest_x'], envelope['rest_y'] = x[n_full * bucket:], y[n_full * bucket:]
+
+    while len(envelope['y']) > envelope['max_buckets']:
+        n_pairs = len(envelope['y']) // 2
+        ex = envelope['x'][:2 * n_pairs].reshape(n_pairs, 4)
+        ey = envelope['y'][:2 * n_pairs].reshape(n_pairs, 4)
+        rows = np.arange(n_pairs)
+        i_min, i_max = np.argmin(ey, axis=1), np.argmax(ey, axis=1)
+        merged_x = np.column_stack([ex[rows, i_min], ex[rows, i_max]])
+        merged_y = np.column_stack([ey[rows, i_min], ey[rows, i_max]])
+        envelope['x'] = np.concatenate([merged_x, envelope['x'][2 * n_pairs:]])
+        envelope['y'] = np.concatenate([merged_y, envelope['y'][2 * n_pairs:]])
+        envelope['bucket'] *= 2
+    return envelope
+
+
+def envelope_points(envelope):
+    """(x, y) of the envelope in time order, ready for plotting."""
+    x = np.concatenate([envelope['x'].ravel(), envelope['rest_x']])
+    y = np.concatenate([envelope['y'].ravel(), envelope['rest_y']])
+    order = np.argsort(x, kind='stable')
+    return x[order], y[order]
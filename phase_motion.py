@@ -0,0 +1,410 @@
+import cv2
+import numpy as np
+import pandas as pd
+from scipy import fft as sp_fft
+import os
+import sys
+import frame_cache
+import full_field_tracker
+import profiler
+import signal_filter
+from script_loader import load_script
+
+# --- CONFIGURATION (EDIT THIS) ---
+
+# 1. INPUT / OUTPUT FILES
+VIDEO_PATH = 'data/VIDEO2.mp4'
+# Same format as the tracker output (frame_index, time_s, x_pixel_M*, y_pixel_M*), so the
+# converter and the analyzers read it unchanged. Positions are the ROI centers plus the
+# sub-pixel displacement measured from the local phase.
+OUTPUT_CSV_PATH = 'data/phase_pixel_positions.csv'
+
+# 2. MEASUREMENT REGIONS
+# Boxes (x, y, w, h) around the markers or textured spots in the first frame; None = draw them.
+# Unlike the CSRT boxes, the whole texture inside a box contributes, so motions of a few
+# hundredths of a pixel are resolved. Keep the boxes tight: static background inside a box
+# pulls the measured motion towards zero.
+# The fit assumes the phase changes linearly with the motion, so the error grows with the
+# amplitude. On synthetic frames (random textures shifted in the Fourier domain, no noise)
+# it was below 1e-5 px for motions of +/-0.05 px, 3e-4 to 1.2e-3 px at +/-0.5 px and 1e-2 to
+# 3e-2 px at 2 px; on pixel-scale (white-noise) texture the finest level wraps beyond ~1 px
+# and the result is unusable. Meant for vibrations well below a pixel; use the tracker for more.
+MARKER_ROIS = None
+# Only the bounding box of all regions plus this margin is decoded, converted to grayscale and
+# transformed (the filters need some context around the regions).
+CROP_MARGIN_PX = 16
+
+# 3. COMPLEX STEERABLE PYRAMID (built in the Fourier domain, full resolution per level)
+# Octave-wide radial bands, finest first, times ORIENTATIONS one-sided angular filters
+# (complex responses: local amplitude and phase per pixel, level and orientation).
+PYRAMID_LEVELS = 3
+ORIENTATIONS = 4
+# Pixels whose response amplitude is below this fraction of the strongest one in the band are
+# ignored (no texture -> no reliable phase, and weak background texture is left out).
+MIN_AMPLITUDE_FRACTION = 0.2
+# Phase changes larger than this (radians, relative to the first frame) are treated as wrapped
+# and ignored in that frame. Motions must stay below about a quarter of the wavelength of a
+# band to be measured there; coarser levels still cover larger motions.
+MAX_PHASE_STEP_RAD = np.pi / 2
+
+# 4. THROUGHPUT AND MEMORY
+# Frames are processed in batches of CHUNK_FRAMES (one batched 2-D FFT per chunk), so memory
+# does not grow with the clip length. Frames come from the grayscale band in frame_cache.py.
+CHUNK_FRAMES = 32
+FFT_WORKERS = -1 # scipy.fft threads, -1 = one per CPU core
+USE_FRAME_CACHE = True
+
+# 5. MOTION MAGNIFICATION
+# With MAGNIFY, the strongest modes of the extracted signals are identified and one video of
+# the crop is rendered per mode, with the phase variations in the band around the mode
+# amplified by MAGNIFICATION_FACTOR (saved next to the CSV as <csv>_mode<k>_<f>Hz.avi).
+MAGNIFY = False
+MAGNIFICATION_FACTOR = 20.0
+N_MAGNIFIED_MODES = 2
+MAGNIFY_RELATIVE_HALF_WIDTH = 0.2 # Temporal pass band f_n * (1 -+ this)
+# The filtered phase is smoothed with an amplitude-weighted Gaussian of this width (px)
+# before it is amplified, which suppresses noise in weakly textured areas (0 = off).
+PHASE_SMOOTHING_SIGMA_PX = 2.0
+
+# --- FILTER BANK ---
+
+def frequency_grid(shape):
+    """Angular spatial frequencies (radians/pixel) kx, ky of a full 2-D FFT of the given (height, width)."""
+    ky = 2 * np.pi * np.fft.fftfreq(shape[0])[:, None]
+    kx = 2 * np.pi * np.fft.fftfreq(shape[1])[None, :]
+    return np.broadcast_to(kx, shape), np.broadcast_to(ky, shape)
+
+
+def steerable_filters(shape, levels=None, orientations=None):
+    """
+    Complex steerable pyramid as Fourier-domain masks for frames of the given (height, width).
+    Radial bands are raised cosines in log2 frequency (one octave apart, the finest centered
+    at pi/2); the angular part is cos^(K-1) around each orientation, one-sided, so the
+    responses are analytic (complex). The masks are normalized so that the residual plus all
+    bands add up to the identity (exact reconstruction for the magnified video).
+    Returns {'bands': (n_bands, H, W) float32 one-sided masks, 'residual': (H, W) float32
+    lowpass^2 + highpass^2, 'kx', 'ky'}.
+    """
+    levels = PYRAMID_LEVELS if levels is None else levels
+    orientations = ORIENTATIONS if orientations is None else orientations
+    kx, ky = frequency_grid(shape)
+    radius = np.hypot(kx, ky)
+    theta = np.arctan2(ky, kx)
+    with np.errstate(divide='ignore'):
+        u = np.log2(np.where(radius > 0, radius, np.finfo(float).tiny) / np.pi)
+
+    def raised_cosine(center):
+        x = u - center
+        return np.where(np.abs(x) < 1, np.cos(np.pi / 2 * x), 0.0)
+
+    highpass = np.where(u >= 0, 1.0, raised_cosine(0.0))
+    lowpass = np.where(u <= -levels - 1, 1.0, np.where(u < -levels, np.abs(np.sin(np.pi / 2 * (u + levels))), 0.0))
+
+    bands = []
+    for level in range(levels):
+        radial = raised_cosine(-(level + 1.0))
+        for k in range(orientations):
+            angle = np.cos(theta - np.pi * k / orientations)
+            bands.append(radial * np.where(angle > 0, angle, 0.0) ** (orientations - 1))
+    bands = np.array(bands)
+
+    # A one-sided mask H acts like H(k)^2 + H(-k)^2 on a real image after taking the real part
+    mirrored = np.roll(np.flip(bands, axis=(1, 2)), 1, axis=(1, 2))
+    total = lowpass ** 2 + highpass ** 2 + np.sum(bands ** 2 + mirrored ** 2, axis=0)
+    scale = 1.0 / np.sqrt(np.maximum(total, 1e-12))
+    return {'bands': (bands * scale).astype(np.float32),
+            'residual': ((lowpass ** 2 + highpass ** 2) * scale ** 2).astype(np.float32),
+            'kx': kx.astype(np.float32), 'ky': ky.astype(np.float32)}
+
+
+def band_response(spectra, band_mask):
+    """Complex response (frames x H x W, complex64) of one band for a chunk of frame spectra."""
+    return sp_fft.ifft2(spectra * (2 * band_mask), axes=(-2, -1), workers=FFT_WORKERS)
+
+# --- REFERENCE AND DISPLACEMENT ---
+
+def region_indices(rois, crop, crop_shape):
+    """Flat pixel indices (into the crop) of every region box."""
+    x0, y0 = crop[:2]
+    indices = []
+    for x, y, w, h in rois:
+        rows = np.arange(max(y - y0, 0), min(y - y0 + h, crop_shape[0]))
+        cols = np.arange(max(x - x0, 0), min(x - x0 + w, crop_shape[1]))
+        indices.append((rows[:, None] * crop_shape[1] + cols[None, :]).ravel())
+    return indices
+
+
+def reference_state(reference, filters, regions):
+    """
+    Band responses of the reference (first) frame and, per band and region, the terms of
+    the least-squares displacement fit. For a translation d, the local phase changes by
+    -grad(phase) . d; with the weight w = amplitude^2, w * grad(phase) = Im(conj(c) * grad(c)).
+    """
+    spectrum = sp_fft.fft2(reference.astype(np.float32), workers=FFT_WORKERS)
+    state = {'c0': [], 'wg': [], 'wgg': []}
+    for band_mask in filters['bands']:
+        c0 = band_response(spectrum[None], band_mask)[0]
+        dc_dx = sp_fft.ifft2(spectrum * 2 * band_mask * 1j * filters['kx'], workers=FFT_WORKERS)
+        dc_dy = sp_fft.ifft2(spectrum * 2 * band_mask * 1j * filters['ky'], workers=FFT_WORKERS)
+        weight = np.abs(c0) ** 2
+        textured = np.abs(c0) >= MIN_AMPLITUDE_FRACTION * np.abs(c0).max()
+        wg = np.stack([np.imag(np.conj(c0) * dc_dx), np.imag(np.conj(c0) * dc_dy)], axis=-1)
+        wg[~textured] = 0.0
+        wg = wg.reshape(-1, 2)
+        weight = np.maximum(weight.reshape(-1), np.finfo(np.float32).tiny)
+        # w * g g^T = (w g)(w g)^T / w, stored as the (xx, xy, yy) components
+        wgg = np.stack([wg[:, 0] ** 2, wg[:, 0] * wg[:, 1], wg[:, 1] ** 2], axis=-1) / weight[:, None]
+        state['c0'].append(c0.astype(np.complex64))
+        state['wg'].append([wg[index].astype(np.float32) for index in regions])
+        state['wgg'].append([wgg[index].astype(np.float32) for index in regions])
+    return state
+
+
+def phase_difference(response, c0):
+    """Local phase change (radians) of every pixel relative to the reference response."""
+    return np.angle(response * np.conj(c0)).astype(np.float32)
+
+
+def chunk_displacements(frames, filters, reference, regions):
+    """
+    Sub-pixel displacement (dx, dy) of every region for a chunk of grayscale frames,
+    (frames x regions x 2): weighted least-squares fit of the phase changes of all pixels,
+    levels and orientations inside the region. Wrapped phases are left out per frame.
+    """
+    n_frames, n_regions = len(frames), len(regions)
+    spectra = sp_fft.fft2(frames, axes=(-2, -1), workers=FFT_WORKERS)
+    normal = np.zeros((n_frames, n_regions, 3))
+    rhs = np.zeros((n_frames, n_regions, 2))
+    for b, band_mask in enumerate(filters['bands']):
+        dphi = phase_difference(band_response(spectra, band_mask), reference['c0'][b]).reshape(n_frames, -1)
+        for r, index in enumerate(regions):
+            region_dphi = dphi[:, index]
+            usable = (np.abs(region_dphi) < MAX_PHASE_STEP_RAD).astype(np.float32)
+            normal[:, r] += usable @ reference['wgg'][b][r]
+            rhs[:, r] -= (usable * region_dphi) @ reference['wg'][b][r]
+
+    xx, xy, yy = normal[..., 0], normal[..., 1], normal[..., 2]
+    det = xx * yy - xy ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dx = np.where(det > 0, (yy * rhs[..., 0] - xy * rhs[..., 1]) / det, np.nan)
+        dy = np.where(det > 0, (xx * rhs[..., 1] - xy * rhs[..., 0]) / det, np.nan)
+    return np.stack([dx, dy], axis=-1)
+
+# --- FRAME SOURCE ---
+
+def open_band(video_path, crop):
+    """
+    Capture object delivering the grayscale crop: the cached band from frame_cache.py, or the
+    video itself (then the caller crops and converts, see read_chunks). Returns (cap, is_band).
+    """
+    band = frame_cache.open_cached(video_path, crop, gray=True) if USE_FRAME_CACHE else None
+    if band is not None:
+        return band, True
+    return cv2.VideoCapture(video_path), False
+
+
+def read_chunks(cap, crop, is_band, frame_rate, tracker, chunk_frames=None):
+    """
+    Generator of (time_s, frames) chunks: container timestamps (s) and float32 grayscale crops
+    (frames x H x W). At most one chunk of frames is held in memory.
+    """
+    chunk_frames = CHUNK_FRAMES if chunk_frames is None else chunk_frames
+    x0, y0, x1, y1 = crop
+    frame_index = 0
+    previous_s = None
+    while True:
+        times, frames = [], []
+        while len(frames) < chunk_frames:
+            with profiler.frame('video_decode'):
+                ret, frame = cap.read()
+            if not ret:
+                break
+            previous_s = tracker.frame_timestamp(cap, frame_index, frame_rate, previous_s)
+            times.append(previous_s)
+            if not is_band:
+                frame = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+            frames.append(frame)
+            frame_index += 1
+        if not frames:
+            return
+        yield np.asarray(times), np.asarray(frames, dtype=np.float32)
+
+# --- MAIN FUNCTIONS ---
+
+def select_regions(video_path, rois):
+    """Region boxes and the crop (x0, y0, x1, y1) around them; without rois they are drawn on the first frame."""
+    frame = frame_cache.read_frame(video_path, 0)
+    if frame is None:
+        print(f"FATAL ERROR: Could not read a frame from {video_path}")
+        sys.exit(1)
+    if rois is None:
+        print("\n--- Measurement Region Setup ---")
+        print("Draw a box around each marker (ENTER/SPACE after each box), then press ESC.")
+        rois = cv2.selectROIs("Select Phase Regions", frame, False)
+        cv2.destroyAllWindows()
+    rois = [tuple(int(v) for v in roi) for roi in rois]
+    if not rois:
+        print("FATAL ERROR: No measurement region selected.")
+        sys.exit(1)
+
+    height, width = frame.shape[:2]
+    crop = (max(min(x for x, _, _, _ in rois) - CROP_MARGIN_PX, 0), max(min(y for _, y, _, _ in rois) - CROP_MARGIN_PX, 0),
+            min(max(x + w for x, _, w, _ in rois) + CROP_MARGIN_PX, width),
+            min(max(y + h for _, y, _, h in rois) + CROP_MARGIN_PX, height))
+    return rois, crop
+
+
+def extract_phase_motion(video_path, output_csv_path, rois=None):
+    """
+    Measures the sub-pixel motion of every region from the local phase of a complex steerable
+    pyramid and saves it in the tracker's CSV format. Returns the output path and, with
+    MAGNIFY, renders one motion-magnified video per identified mode.
+    """
+    rois = MARKER_ROIS if rois is None else rois
+    if not os.path.exists(video_path):
+        print(f"FATAL ERROR: Video file not found at: {video_path}")
+        sys.exit(1)
+
+    tracker = load_script('tracker') # Frame timestamps and container frame rate
+    rois, crop = select_regions(video_path, rois)
+    with profiler.stage('video_open'):
+        cap, is_band = open_band(video_path, crop)
+    frame_rate = tracker.container_frame_rate(cap, tracker.VIDEO_FRAME_RATE)
+    crop_shape = (crop[3] - crop[1], crop[2] - crop[0])
+    filters = steerable_filters(crop_shape, PYRAMID_LEVELS, ORIENTATIONS)
+    regions = region_indices(rois, crop, crop_shape)
+
+    print(f"Phase-based motion of {len(rois)} region(s) in a {crop_shape[1]}x{crop_shape[0]} px crop "
+          f"({PYRAMID_LEVELS} levels x {ORIENTATIONS} orientations, {CHUNK_FRAMES} frames per chunk)...")
+    times, displacements = [], []
+    reference = None
+    loop_start = profiler.now()
+    for chunk_times, frames in read_chunks(cap, crop, is_band, frame_rate, tracker, CHUNK_FRAMES):
+        if reference is None:
+            reference = reference_state(frames[0], filters, regions)
+        with profiler.frame('phase_chunk'):
+            displacements.append(chunk_displacements(frames, filters, reference, regions))
+        times.append(chunk_times)
+    cap.release()
+    if reference is None:
+        print(f"FATAL ERROR: Could not read a frame from {video_path}")
+        sys.exit(1)
+
+    time_s = np.concatenate(times)
+    displacement = np.concatenate(displacements)
+    if profiler.is_enabled():
+        profiler.record_stage('phase_motion', profiler.now() - loop_start)
+        profiler.add_items('phase_motion', len(time_s))
+
+    data = {'frame_index': np.arange(len(time_s)), 'time_s': time_s - time_s[0]}
+    for i, (x, y, w, h) in enumerate(rois):
+        data[f'x_pixel_M{i + 1}'] = (x + w / 2.0 + displacement[:, i, 0]).astype(np.float32)
+    for i, (x, y, w, h) in enumerate(rois):
+        data[f'y_pixel_M{i + 1}'] = (y + h / 2.0 + displacement[:, i, 1]).astype(np.float32)
+    df = pd.DataFrame(data)
+    valid = np.isfinite(displacement).all(axis=(1, 2))
+
+    output_dir = os.path.dirname(output_csv_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with profiler.stage('csv_write'):
+        df[valid].to_csv(output_csv_path, index=False)
+
+    print("\n--- Phase-Based Motion Extraction Complete ---")
+    print(f"Frames: {len(time_s)}, Frame rate: {frame_rate:.2f} Hz")
+    print(f"Frames without a usable phase (dropped): {int((~valid).sum())}")
+    for i in range(len(rois)):
+        peak_to_peak = np.nanmax(displacement[:, i], axis=0) - np.nanmin(displacement[:, i], axis=0)
+        print(f"M{i + 1}: peak-to-peak motion x {peak_to_peak[0]:.3f} px, y {peak_to_peak[1]:.3f} px")
+    print(f"Sub-pixel positions saved to: {output_csv_path}")
+
+    if MAGNIFY:
+        sample_rate = (len(time_s) - 1) / (time_s[-1] - time_s[0]) if len(time_s) > 1 else frame_rate
+        modes = identify_modes(displacement[valid], sample_rate, N_MAGNIFIED_MODES)
+        stem, _ = os.path.splitext(output_csv_path)
+        for k, mode in enumerate(modes):
+            magnified_path = f"{stem}_mode{k + 1}_{mode['frequency_Hz']:.1f}Hz.avi"
+            render_magnified(video_path, magnified_path, crop, mode['frequency_Hz'], frame_rate, MAGNIFICATION_FACTOR)
+    return output_csv_path
+
+# --- MOTION MAGNIFICATION ---
+
+def identify_modes(displacement, sample_rate, n_modes=None):
+    """Strongest modes of the extracted signals (all regions and directions), as in full_field_tracker."""
+    n_modes = N_MAGNIFIED_MODES if n_modes is None else n_modes
+    signals = displacement.reshape(len(displacement), -1)
+    xf, X = full_field_tracker.field_spectrum(signals, sample_rate)
+    modes, _ = full_field_tracker.operating_shapes(xf, X, n_modes)
+    for k, mode in enumerate(modes):
+        print(f"Mode {k + 1}: {mode['frequency_Hz']:.2f} Hz")
+    return modes
+
+
+def smooth_phase(phase, amplitude, spatial_gaussian):
+    """Amplitude-weighted Gaussian smoothing of a chunk of phase images (one FFT pair each)."""
+    weighted = sp_fft.ifft2(sp_fft.fft2(phase * amplitude, axes=(-2, -1), workers=FFT_WORKERS) * spatial_gaussian,
+                            axes=(-2, -1), workers=FFT_WORKERS).real
+    weights = sp_fft.ifft2(sp_fft.fft2(amplitude, axes=(-2, -1), workers=FFT_WORKERS) * spatial_gaussian,
+                           axes=(-2, -1), workers=FFT_WORKERS).real
+    return weighted / np.maximum(weights, 1e-6)
+
+
+def render_magnified(video_path, output_path, crop, f_n_Hz, frame_rate, factor=None):
+    """
+    Renders the grayscale crop with the motion in the band around f_n_Hz magnified: the phase
+    change of every pyramid coefficient is band-passed in time (causal Butterworth, the filter
+    state is carried from chunk to chunk), multiplied by the factor and added back before the
+    pyramid is collapsed. Needs one chunk plus the filter states in memory.
+    """
+    factor = MAGNIFICATION_FACTOR if factor is None else factor
+    tracker = load_script('tracker')
+    cap, is_band = open_band(video_path, crop)
+    crop_shape = (crop[3] - crop[1], crop[2] - crop[0])
+    filters = steerable_filters(crop_shape, PYRAMID_LEVELS, ORIENTATIONS)
+    sos = signal_filter.design_filter(signal_filter.band_around_mode(f_n_Hz, MAGNIFY_RELATIVE_HALF_WIDTH), frame_rate)
+    if sos is None:
+        print(f"Mode at {f_n_Hz:.2f} Hz is outside the usable band; no magnified video.")
+        cap.release()
+        return None
+    sigma = PHASE_SMOOTHING_SIGMA_PX
+    spatial_gaussian = np.exp(-0.5 * sigma ** 2 * (filters['kx'] ** 2 + filters['ky'] ** 2)) if sigma > 0 else None
+
+    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'MJPG'), frame_rate, crop_shape[::-1], False)
+    if not writer.isOpened():
+        print(f"FATAL ERROR: Could not open video writer for: {output_path}")
+        sys.exit(1)
+
+    c0, states = None, None
+    n_frames = 0
+    with profiler.stage('motion_magnification'):
+        for _, frames in read_chunks(cap, crop, is_band, frame_rate, tracker, CHUNK_FRAMES):
+            spectra = sp_fft.fft2(frames, axes=(-2, -1), workers=FFT_WORKERS)
+            if c0 is None:
+                c0 = [band_response(spectra[:1], band_mask)[0] for band_mask in filters['bands']]
+                states = [signal_filter.new_filter_state(sos, np.zeros(frames[0].size)) for _ in c0]
+            collapsed = sp_fft.ifft2(spectra * filters['residual'], axes=(-2, -1), workers=FFT_WORKERS).real
+            for b, band_mask in enumerate(filters['bands']):
+                response = band_response(spectra, band_mask)
+                dphi = phase_difference(response, c0[b])
+                filtered, states[b] = signal_filter.filter_chunk(sos, dphi.reshape(len(frames), -1), states[b])
+                filtered = filtered.reshape(dphi.shape)
+                if spatial_gaussian is not None:
+                    filtered = smooth_phase(filtered, np.abs(response), spatial_gaussian)
+                magnified = response * np.exp(1j * factor * filtered).astype(np.complex64)
+                # Real part of the one-sided band -> the symmetric band of the real image
+                collapsed += sp_fft.ifft2(sp_fft.fft2(magnified, axes=(-2, -1), workers=FFT_WORKERS) * band_mask,
+                                          axes=(-2, -1), workers=FFT_WORKERS).real
+            for image in np.clip(collapsed, 0, 255).astype(np.uint8):
+                writer.write(image)
+            n_frames += len(frames)
+    profiler.add_items('motion_magnification', n_frames)
+    writer.release()
+    cap.release()
+    print(f"Magnified video ({factor:g}x, {f_n_Hz:.2f} Hz mode, {n_frames} frames) saved to: {output_path}")
+    return output_path
+
+
+if __name__ == "__main__":
+    if not os.path.exists('data'):
+        os.makedirs('data')
+    extract_phase_motion(VIDEO_PATH, OUTPUT_CSV_PATH)
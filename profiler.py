@@ -0,0 +1,236 @@
+import atexit
+import json
+import os
+import platform
+import sys
+import time
+
+# --- CONFIGURATION (EDIT THIS) ---
+
+# 1. ENABLE / DISABLE PROFILING
+# Profiling is OFF by default. Turn it on for a single run without editing any script:
+#   set SHM_PROFILE=1        (Windows)
+#   export SHM_PROFILE=1     (Linux / macOS)
+# When disabled, every timing call returns a shared no-op object, so the
+# instrumentation left in the scripts costs practically nothing.
+PROFILING_ENABLED = os.environ.get('SHM_PROFILE', '0') == '1'
+
+# 2. REPORT FILE PATH
+# The JSON report is written here when the script exits (only if profiling is enabled).
+PROFILE_REPORT_PATH = os.environ.get('SHM_PROFILE_REPORT', 'data/profile_report.json')
+
+# 3. PER-FRAME HISTOGRAM BINS (milliseconds)
+# Upper edges of the histogram bins used for per-frame timings (e.g. CSRT update per frame).
+# The last bin collects everything slower than the final edge.
+HISTOGRAM_EDGES_MS = [0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 33, 66, 133, 266, 533, 1000]
+
+# --- INTERNAL STATE ---
+
+_stages = {}
+_frames = {}
+_items = {}
+_report_registered = False
+
+# --- CORE FUNCTIONS ---
+
+now = time.perf_counter
+
+
+class _NullTimer:
+    """Shared do-nothing context manager returned while profiling is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _StageTimer:
+    """Context manager that adds its elapsed wall time to a stage or frame histogram."""
+
+    def __init__(self, name, per_frame):
+        self.name = name
+        self.per_frame = per_frame
+
+    def __enter__(self):
+        self.start = now()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = now() - self.start
+        if self.per_frame:
+            record_frame(self.name, elapsed)
+        else:
+            record_stage(self.name, elapsed)
+        return False
+
+
+def enable(report_path=None):
+    """Turns profiling on at runtime and writes the report when the process exits."""
+    global PROFILING_ENABLED, PROFILE_REPORT_PATH, _report_registered
+    PROFILING_ENABLED = True
+    if report_path is not None:
+        PROFILE_REPORT_PATH = report_path
+    if not _report_registered:
+        atexit.register(_write_report_at_exit)
+        _report_registered = True
+
+
+def disable():
+    """Turns profiling off (already collected timings are kept)."""
+    global PROFILING_ENABLED
+    PROFILING_ENABLED = False
+
+
+def is_enabled():
+    return PROFILING_ENABLED
+
+
+def reset():
+    """Clears all collected timings."""
+    _stages.clear()
+    _frames.clear()
+    _items.clear()
+
+
+def stage(name):
+    """
+    Times a whole pipeline stage (e.g. 'read_csv', 'fft', 'render').
+    Usage: with profiler.stage('fft'): ...
+    """
+    if not PROFILING_ENABLED:
+        return _NULL_TIMER
+    return _StageTimer(name, per_frame=False)
+
+
+def frame(name):
+    """
+    Times one iteration of a per-frame step (e.g. 'csrt_update') and adds it
+    to a fixed-size histogram, so memory use does not grow with video length.
+    """
+    if not PROFILING_ENABLED:
+        return _NULL_TIMER
+    return _StageTimer(name, per_frame=True)
+
+
+def record_stage(name, seconds):
+    """Adds one stage timing in seconds."""
+    entry = _stages.get(name)
+    if entry is None:
+        entry = _stages[name] = {'calls': 0, 'total_s': 0.0, 'min_s': float('inf'), 'max_s': 0.0}
+    entry['calls'] += 1
+    entry['total_s'] += seconds
+    entry['min_s'] = min(entry['min_s'], seconds)
+    entry['max_s'] = max(entry['max_s'], seconds)
+
+
+def record_frame(name, seconds):
+    """Adds one per-frame timing in seconds to the histogram of 'name'."""
+    entry = _frames.get(name)
+    if entry is None:
+        entry = _frames[name] = {'count': 0, 'total_s': 0.0, 'min_s': float('inf'), 'max_s': 0.0,
+                                 'counts': [0] * (len(HISTOGRAM_EDGES_MS) + 1)}
+    entry['count'] += 1
+    entry['total_s'] += seconds
+    entry['min_s'] = min(entry['min_s'], seconds)
+    entry['max_s'] = max(entry['max_s'], seconds)
+
+    elapsed_ms = seconds * 1000.0
+    bin_index = len(HISTOGRAM_EDGES_MS)
+    for i, edge in enumerate(HISTOGRAM_EDGES_MS):
+        if elapsed_ms <= edge:
+            bin_index = i
+            break
+    entry['counts'][bin_index] += 1
+
+
+def add_items(name, count):
+    """Counts processed items (frames, rows, samples) so the report can show throughput."""
+    if PROFILING_ENABLED:
+        _items[name] = _items.get(name, 0) + count
+
+
+def _histogram_percentile(counts, fraction):
+    """Approximate percentile (ms) from the histogram: upper edge of the bin containing it."""
+    total = sum(counts)
+    if total == 0:
+        return None
+    threshold = fraction * total
+    running = 0
+    for i, c in enumerate(counts):
+        running += c
+        if running >= threshold:
+            return HISTOGRAM_EDGES_MS[i] if i < len(HISTOGRAM_EDGES_MS) else float('inf')
+    return None
+
+
+def build_report():
+    """Returns all collected timings as a JSON-serializable dictionary."""
+    stages = {}
+    for name, entry in _stages.items():
+        stages[name] = dict(entry, mean_s=entry['total_s'] / entry['calls'])
+
+    frames = {}
+    for name, entry in _frames.items():
+        mean_s = entry['total_s'] / entry['count']
+        frames[name] = {
+            'count': entry['count'],
+            'total_s': entry['total_s'],
+            'mean_ms': mean_s * 1000.0,
+            'min_ms': entry['min_s'] * 1000.0,
+            'max_ms': entry['max_s'] * 1000.0,
+            'p50_ms_upper': _histogram_percentile(entry['counts'], 0.50),
+            'p95_ms_upper': _histogram_percentile(entry['counts'], 0.95),
+            'rate_per_s': 1.0 / mean_s if mean_s > 0 else None,
+            'histogram': {'edges_ms': HISTOGRAM_EDGES_MS, 'counts': entry['counts']},
+        }
+
+    # Throughput: items divided by the time of the stage/frame step with the same name (if any)
+    throughput = {}
+    for name, count in _items.items():
+        seconds = _stages.get(name, _frames.get(name, {})).get('total_s')
+        throughput[name] = {'items': count,
+                            'items_per_s': count / seconds if seconds else None}
+
+    return {
+        'script': os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else None,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'stages': stages,
+        'per_frame': frames,
+        'throughput': throughput,
+    }
+
+
+def write_report(report_path=None):
+    """Writes the JSON report and prints a short summary. Returns the path written."""
+    report_path = report_path or PROFILE_REPORT_PATH
+    report = build_report()
+
+    output_dir = os.path.dirname(report_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print("\n--- Profiling Summary ---")
+    for name, entry in report['stages'].items():
+        print(f"{name}: {entry['total_s'] * 1000.0:.1f} ms ({entry['calls']} call(s))")
+    for name, entry in report['per_frame'].items():
+        print(f"{name} (per frame): mean {entry['mean_ms']:.2f} ms, max {entry['max_ms']:.2f} ms, {entry['count']} frames")
+    print(f"Profile report saved to: {report_path}")
+    return report_path
+
+
+def _write_report_at_exit():
+    if PROFILING_ENABLED and (_stages or _frames):
+        write_report()
+
+
+if PROFILING_ENABLED:
+    enable()
@@ -0,0 +1,368 @@
+import numpy as np
+import atexit
+import html
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import profiler
+
+# --- CONFIGURATION (EDIT THIS) ---
+
+# 1. HEADLESS REPORT MODE
+# By default the analyzers open a plot window (plt.show), which blocks until it is closed.
+# For batch runs set SHM_HEADLESS=1: figures are then rendered with the Agg backend in a
+# background thread and written to REPORT_DIR while the analysis continues.
+HEADLESS = os.environ.get('SHM_HEADLESS', '0') == '1'
+
+# 2. REPORT OUTPUT
+REPORT_DIR = os.environ.get('SHM_REPORT_DIR', 'data/reports')
+EXPORT_FORMATS = ['png', 'svg'] # An index.html linking all figures is always written
+EXPORT_DPI = 120
+
+# 3. DECIMATION
+# Long time histories are reduced to at most this many points before plotting.
+# Min/max decimation keeps the envelope and every peak of the signal visible.
+MAX_PLOT_POINTS = 20000
+
+# --- INTERNAL STATE ---
+
+_executor = None
+_futures = []
+_report_entries = OrderedDict()
+_report_lock = threading.Lock()
+
+# --- DECIMATION ---
+
+def minmax_decimate(x, y, max_points=None):
+    """
+    Reduces (x, y) to about max_points samples by keeping the minimum and the
+    maximum of each bucket (in time order). Fully vectorized, O(N).
+    """
+    max_points = MAX_PLOT_POINTS if max_points is None else max_points
+    x = np.asarray(x)
+    y = np.asarray(y)
+    n = len(y)
+    if n <= max_points or max_points < 4:
+        return x, y
+
+    bucket = int(np.ceil(2.0 * n / max_points))
+    n_buckets = n // bucket
+    body = y[:n_buckets * bucket].reshape(n_buckets, bucket)
+
+    starts = np.arange(n_buckets) * bucket
+    i_min = starts + np.argmin(body, axis=1)
+    i_max = starts + np.argmax(body, axis=1)
+    indices = np.sort(np.concatenate([i_min, i_max]))
+
+    # Remaining samples that do not fill a whole bucket
+    if n_buckets * bucket < n:
+        tail = np.arange(n_buckets * bucket, n)
+        indices = np.concatenate([indices, [tail[np.argmin(y[tail])], tail[np.argmax(y[tail])]]])
+        indices = np.unique(indices)
+
+    return x[indices], y[indices]
+
+# --- FIGURE DRAWING (shared by the window and report modes) ---
+
+def draw_vibration_analysis(fig, time_s, displacement_mm, xf, psd, peak_index, target_column, Fs):
+    """Time history and FFT spectrum of one marker (vibration_analyzer.py)."""
+    ax1, ax2 = fig.subplots(2, 1)
+    fig.suptitle(f"Vision-Based Vibration Analysis - Marker: {target_column}", fontsize=16)
+
+    # --- Plot 1: Time Domain (Displacement vs. Time) ---
+    ax1.plot(*minmax_decimate(time_s, displacement_mm), label='Displacement', linewidth=1.5)
+    ax1.set_title('Displacement Time History')
+    ax1.set_xlabel('Time (s)')
+    ax1.set_ylabel('Displacement (mm)')
+    ax1.grid(True, linestyle='--', alpha=0.6)
+    ax1.legend()
+
+    # --- Plot 2: Frequency Domain (FFT/PSD) ---
+    natural_frequency_Hz = xf[peak_index]
+    ax2.plot(*minmax_decimate(xf, psd), label='Power Spectral Density', color='red', linewidth=2)
+    ax2.plot(natural_frequency_Hz, psd[peak_index], 'o', color='green', markersize=8,
+             label=f'Peak f_n: {natural_frequency_Hz:.3f} Hz')
+    ax2.set_title('Frequency Spectrum (FFT/PSD)')
+    ax2.set_xlabel('Frequency (Hz)')
+    ax2.set_ylabel('Amplitude (mm)')
+    ax2.set_xlim(0, Fs / 2) # Limit x-axis to Nyquist frequency
+    ax2.grid(True, linestyle='--', alpha=0.6)
+    ax2.legend()
+
+    fig.tight_layout(rect=[0, 0, 1, 0.96]) # Adjust layout to prevent title overlap
+
+
+def draw_analysis_with_start(fig, time_raw, data_raw, analysis_start_s, xf, psd, peak_index, target_column, Fs):
+    """Full time history with the analysis start point and the spectrum (vibrationanalyzer2.py)."""
+    axes = fig.subplots(2, 1)
+    f_n = xf[peak_index]
+
+    # --- Top Plot: Time History ---
+    axes[0].plot(*minmax_decimate(time_raw, data_raw), label=f'Calibrated Displacement ({target_column})')
+    axes[0].axvline(x=analysis_start_s, color='r', linestyle='--', label='Analysis Start Point', linewidth=2)
+    axes[0].set_title(f"Vibration Analysis - Calculated F_n: {f_n:.3f} Hz")
+    axes[0].set_xlabel("Time (s)"); axes[0].set_ylabel("Displacement (mm)"); axes[0].grid(True, linestyle='--')
+    axes[0].legend()
+
+    # --- Bottom Plot: Frequency Spectrum ---
+    axes[1].plot(*minmax_decimate(xf, psd), color='red', label='Power Spectral Density')
+    axes[1].scatter(f_n, psd[peak_index], color='green', s=100, label=f'Peak F_n: {f_n:.3f} Hz', zorder=5)
+    axes[1].set_title("Frequency Spectrum (FFT/PSD)"); axes[1].set_xlabel("Frequency (Hz)")
+    axes[1].set_ylabel("Amplitude (mm)")
+    axes[1].set_xlim(0, Fs / 2)
+    axes[1].set_ylim(0, np.max(psd) * 1.2)
+    axes[1].grid(True, linestyle='--'); axes[1].legend()
+
+    fig.tight_layout()
+
+
+def draw_amplitude_spectrum(fig, xf, yf, title, max_frequency_Hz=50.0):
+    """Amplitude spectrum of one signal up to max_frequency_Hz (fft.py)."""
+    ax = fig.subplots(1, 1)
+    ax.plot(*minmax_decimate(xf, yf))
+    ax.set_title(f'Frequency Spectrum - {title}')
+    ax.set_xlabel('Frequency (Hz)')
+    ax.set_ylabel('Amplitude')
+    ax.grid(True)
+    ax.set_xlim(0, max_frequency_Hz) # Typically, vibration analysis focuses on lower frequencies
+    fig.tight_layout()
+
+
+def draw_damping_decay(fig, time_s, displacement_mm, A1_idx, Ak_idx, k, A1, Ak, zeta):
+    """Decay signal with the two peaks used for the logarithmic decrement (damping_calculator.py)."""
+    ax = fig.subplots(1, 1)
+    ax.plot(*minmax_decimate(time_s, displacement_mm), label='Decay Signal', linewidth=1.0)
+
+    # Highlight the peaks used for calculation
+    ax.plot(time_s[A1_idx], A1, 'o', color='green', markersize=8, label=f'Peak A1 ({A1:.2f} mm)')
+    ax.plot(time_s[Ak_idx], Ak, 'o', color='red', markersize=8, label=f'Peak A{k+1} ({Ak:.2f} mm)')
+
+    ax.set_title(f'Vibration Decay and Logarithmic Decrement - Damping Ratio $\\zeta = {zeta:.4f}$')
+    ax.set_xlabel('Time (s)')
+    ax.set_ylabel('Displacement (mm)')
+    ax.grid(True, linestyle='--', alpha=0.6)
+    ax.legend()
+
+
+def draw_mode_shape_phase(fig, time_s, sig_M1, sig_M2, f_n, phase_text):
+    """Both detrended marker signals with the phase difference (modeshapeanalyzer2.py)."""
+    ax = fig.subplots(1, 1)
+    ax.plot(*minmax_decimate(time_s, sig_M1), label='Marker 1 (Primary)')
+    ax.plot(*minmax_decimate(time_s, sig_M2), label='Marker 2 (Secondary)', linestyle='--')
+
+    ax.set_title(f"Mode Shape Phase Analysis at F_n = {f_n:.3f} Hz")
+    ax.set_xlabel("Time (s)")
+    ax.set_ylabel("Detrended Displacement (mm)")
+    ax.grid(True, linestyle='--')
+    ax.legend()
+
+    # Add phase text to the plot
+    ax.text(0.05, 0.95, phase_text, transform=ax.transAxes,
+            fontsize=12, verticalalignment='top', bbox=dict(boxstyle="round,pad=0.5", fc="white", alpha=0.7))
+
+    fig.tight_layout()
+
+
+def draw_stabilization_diagram(fig, poles, modes, singular_values, Fs):
+    """Poles over model order with the selected modes, and the singular value decay (ssi_analyzer.py)."""
+    ax, ax_sv = fig.subplots(1, 2, gridspec_kw={'width_ratios': [3, 1]})
+
+    styles = {'new': ('x', 'lightgray', 'new pole'),
+              'stable_freq': ('o', 'tab:orange', 'stable frequency'),
+              'stable': ('o', 'tab:green', 'stable (f, zeta, MAC)')}
+    for status, (marker, color, label) in styles.items():
+        selected = poles['status'] == status
+        ax.plot(poles['frequency_Hz'][selected], poles['order'][selected], marker, color=color,
+                markersize=4, linestyle='none', label=label, fillstyle='none' if status == 'stable_freq' else 'full')
+    for mode in modes:
+        ax.axvline(mode['frequency_Hz'], color='red', linestyle='--', linewidth=0.8)
+        ax.annotate(f"{mode['frequency_Hz']:.2f} Hz", (mode['frequency_Hz'], 1.0), xycoords=('data', 'axes fraction'),
+                    rotation=90, va='top', ha='right', fontsize=8, color='red')
+
+    ax.set_title(f'SSI-COV Stabilization Diagram ({len(modes)} modes)')
+    ax.set_xlabel('Frequency (Hz)')
+    ax.set_ylabel('Model Order')
+    ax.set_xlim(0, Fs / 2)
+    ax.grid(True, linestyle='--', alpha=0.6)
+    ax.legend(loc='lower right')
+
+    ax_sv.semilogy(np.arange(1, len(singular_values) + 1), singular_values, '.-')
+    ax_sv.set_title('Singular Values')
+    ax_sv.set_xlabel('Index')
+    ax_sv.grid(True, linestyle='--', alpha=0.6)
+
+    fig.tight_layout()
+
+
+def draw_time_frequency(fig, analysis, channels, spectrogram):
+    """Spectrogram with the frequency ridges of the first channel, f(A) and zeta(A) curves (time_frequency.py)."""
+    grid = fig.add_gridspec(2, 2)
+    ax_tf = fig.add_subplot(grid[0, :])
+    ax_f = fig.add_subplot(grid[1, 0])
+    ax_z = fig.add_subplot(grid[1, 1])
+
+    if spectrogram is not None:
+        frame_time, freqs, magnitude = spectrogram
+        stride = max(len(frame_time) // 1000, 1) # At most ~1000 frames are drawn
+        ax_tf.pcolormesh(frame_time[::stride], freqs, magnitude[:, ::stride], shading='nearest', cmap='viridis')
+    for method, result in analysis.items():
+        ax_tf.plot(*minmax_decimate(result['time_s'], result['frequency'][:, 0]), linewidth=1.0, label=method)
+    ax_tf.set_title(f'Instantaneous Frequency - {channels[0]}')
+    ax_tf.set_xlabel('Time (s)')
+    ax_tf.set_ylabel('Frequency (Hz)')
+    ax_tf.legend(loc='upper right')
+
+    for method, result in analysis.items():
+        for channel, curves in result['curves'].items():
+            label = f'{method} {channel}' if len(channels) > 1 else method
+            ax_f.semilogx(curves['amplitude'], curves['frequency_Hz'], 'o-', markersize=3, label=label)
+            ax_z.semilogx(curves['amplitude'], curves['zeta'], 'o-', markersize=3, label=label)
+    ax_f.set_title('Frequency vs. Amplitude (backbone)')
+    ax_f.set_xlabel('Amplitude (mm)')
+    ax_f.set_ylabel('Frequency (Hz)')
+    ax_z.set_title('Damping Ratio vs. Amplitude')
+    ax_z.set_xlabel('Amplitude (mm)')
+    ax_z.set_ylabel('Damping ratio $\\zeta$')
+    for ax in (ax_f, ax_z):
+        ax.grid(True, linestyle='--', alpha=0.6)
+    ax_z.legend(fontsize=7)
+
+    fig.tight_layout()
+
+
+def draw_full_field_modes(fig, points_px, modes, xf, power, directions):
+    """Summed spectrum of all grid points and every operating deflection shape on the grid (full_field_tracker.py)."""
+    axes = fig.subplots(1 + len(modes), 1, squeeze=False)[:, 0]
+
+    axes[0].semilogy(xf[1:], power[1:], linewidth=0.8)
+    for mode in modes:
+        axes[0].axvline(mode['frequency_Hz'], color='red', linestyle='--', linewidth=0.8)
+    axes[0].set_title(f'Spectrum Summed over {len(points_px)} Grid Points')
+    axes[0].set_xlabel('Frequency (Hz)')
+    axes[0].set_ylabel('Power')
+    axes[0].grid(True, linestyle='--', alpha=0.6)
+
+    n_points = len(points_px)
+    spacing = np.median(np.diff(np.unique(points_px[:, 0]))) if n_points > 1 else 1.0
+    for ax, mode in zip(axes[1:], modes):
+        shape = mode['shape'].real
+        if directions == 'xy':
+            sx, sy = shape[:n_points], shape[n_points:]
+        else:
+            sx, sy = (shape, np.zeros(n_points)) if directions == 'x' else (np.zeros(n_points), shape)
+        scale = 3 * spacing # The largest deflection is drawn as 3 grid spacings
+        ax.plot(points_px[:, 0], points_px[:, 1], '.', color='lightgray', markersize=3)
+        colors = np.where(sx + sy >= 0, 'tab:blue', 'tab:red')
+        ax.scatter(points_px[:, 0] + scale * sx, points_px[:, 1] + scale * sy, c=colors, s=6)
+        ax.set_title(f"Mode at {mode['frequency_Hz']:.3f} Hz (blue/red: opposite phase)")
+        ax.set_aspect('equal')
+        ax.invert_yaxis() # Image coordinates: y grows downwards
+        ax.set_xlabel('x (px)')
+        ax.set_ylabel('y (px)')
+
+    fig.tight_layout()
+
+def draw_uncertainty(fig, samples, rows):
+    """Histogram of the replicates per method and quantity with the estimate and its interval (uncertainty.py)."""
+    quantities = list(dict.fromkeys(r['quantity'] for r in rows if np.isfinite(r['ci_low'])))
+    axes = fig.subplots(len(samples), max(len(quantities), 1), squeeze=False)
+    intervals = {(r['method'], r['quantity']): r for r in rows}
+
+    for ax_row, (method, method_samples) in zip(axes, samples.items()):
+        for ax, quantity in zip(ax_row, quantities):
+            ax.set_title(f'{method}: {quantity}', fontsize=9)
+            ax.tick_params(labelsize=7)
+            row = intervals.get((method, quantity))
+            if row is None:
+                ax.set_axis_off()
+                continue
+            values = np.asarray(method_samples[quantity])
+            ax.hist(values[np.isfinite(values)], bins=40, color='tab:blue', alpha=0.7)
+            ax.axvline(row['estimate'], color='black', linewidth=1.2, label='estimate')
+            if np.isfinite(row['ci_low']):
+                ax.axvspan(row['ci_low'], row['ci_high'], color='tab:orange', alpha=0.2,
+                           label=f"{row['confidence']:.0%} interval")
+    axes[0, 0].legend(fontsize=7)
+
+    fig.tight_layout()
+
+# --- WINDOW / REPORT OUTPUT ---
+
+def show_or_export(name, draw_function, args, figsize=(12, 8), summary=None):
+    """
+    Draws a figure with draw_function(fig, *args).
+    Interactive mode: opens a window (blocks like before).
+    Headless mode: renders and exports the figure in a background thread and returns immediately.
+    'summary' is an optional dict of results listed next to the figure in index.html.
+    """
+    if not HEADLESS:
+        import matplotlib.pyplot as plt
+        with profiler.stage('render'):
+            fig = plt.figure(figsize=figsize)
+            draw_function(fig, *args)
+        plt.show()
+        return None
+
+    global _executor
+    if _executor is None:
+        # One worker keeps the figures in order and the CPU free for the analysis itself
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='report')
+        atexit.register(wait_for_reports)
+    future = _executor.submit(_render_and_export, name, draw_function, args, figsize, summary)
+    _futures.append(future)
+    return future
+
+
+def _render_and_export(name, draw_function, args, figsize, summary):
+    """Worker job: Agg rendering (no GUI, thread-safe) and export of one figure."""
+    # matplotlib is imported here (in the report thread), not when an analyzer starts
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    if not os.path.exists(REPORT_DIR):
+        os.makedirs(REPORT_DIR, exist_ok=True)
+
+    with profiler.stage('render_export'):
+        fig = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+        draw_function(fig, *args)
+
+        paths = []
+        for fmt in EXPORT_FORMATS:
+            path = os.path.join(REPORT_DIR, f"{name}.{fmt}")
+            fig.savefig(path, dpi=EXPORT_DPI)
+            paths.append(path)
+
+    with _report_lock:
+        _report_entries[name] = {'files': [os.path.basename(p) for p in paths], 'summary': summary or {}}
+        write_html_index()
+    return paths
+
+
+def write_html_index():
+    """Writes REPORT_DIR/index.html with every exported figure and its summary values."""
+    parts = ["<!DOCTYPE html>", "<html><head><meta charset='utf-8'><title>Vibration Analysis Report</title></head><body>",
+             "<h1>Vibration Analysis Report</h1>"]
+    for name, entry in _report_entries.items():
+        parts.append(f"<h2>{html.escape(name)}</h2>")
+        if entry['summary']:
+            rows = "".join(f"<tr><td>{html.escape(str(k))}</td><td>{html.escape(str(v))}</td></tr>"
+                           for k, v in entry['summary'].items())
+            parts.append(f"<table border='1' cellpadding='4'>{rows}</table>")
+        image = next((f for f in entry['files'] if f.endswith(('.svg', '.png'))), None)
+        if image:
+            parts.append(f"<p><img src='{html.escape(image)}' style='max-width:100%'></p>")
+        links = " | ".join(f"<a href='{html.escape(f)}'>{html.escape(f)}</a>" for f in entry['files'])
+        parts.append(f"<p>{links}</p>")
+    parts.append("</body></html>")
+
+    with open(os.path.join(REPORT_DIR, 'index.html'), 'w', encoding='utf-8') as f:
+        f.write("\n".join(parts))
+
+
+def wait_for_reports():
+    """Blocks until every queued figure has been written and returns the exported paths."""
+    paths = []
+    while _futures:
+        paths.extend(_futures.pop(0).result())
+    return paths
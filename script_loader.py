@@ -0,0 +1,70 @@
+import ast
+import importlib.util
+import os
+import sys
+
+# The pipeline scripts are named after their step in the workflow, e.g.
+# "(E)vibration_analyzer.py". The parentheses make them impossible to import
+# with a normal 'import' statement, so other tools load them through this helper.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Short names for the pipeline steps
+PIPELINE_SCRIPTS = {
+    'converter': '(A)calibration_converter.py',
+    'calibration_finder': '(B)calibration_finder.py',
+    'mode_shape': '(C)mode_shape_analyzer.py',
+    'tracker': '(D)simplified_vision_tracker.py',
+    'vibration': '(E)vibration_analyzer.py',
+    'damping': '(F)damping_calculator.py',
+}
+
+_loaded = {}
+_import_time_names = {}
+
+
+def load_script(name):
+    """
+    Loads a pipeline script as a module, by short name (e.g. 'vibration') or
+    file name (e.g. '(E)vibration_analyzer.py'). Each script is only loaded once.
+    """
+    filename = PIPELINE_SCRIPTS.get(name, name)
+    if filename in _loaded:
+        return _loaded[filename]
+
+    path = os.path.join(SCRIPT_DIR, filename)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Pipeline script not found: {path}")
+
+    # Make the helper modules next to the scripts (e.g. profiler.py) importable
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+
+    module_name = 'shm_' + os.path.splitext(filename)[0].replace('(', '').replace(')', '_')
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    _loaded[filename] = module
+    return module
+
+
+def import_time_constants(module):
+    """
+    UPPER_CASE constants whose value is copied when the module is imported: used in a
+    function default argument or in another module-level constant. Overriding them later
+    (shm_cli.py --set, analysis_service.py job settings) would have no effect.
+    """
+    path = getattr(module, '__file__', None)
+    if path not in _import_time_names:
+        names = set()
+        if path and path.endswith('.py'):
+            with open(path, 'r', encoding='utf-8') as f:
+                tree = ast.parse(f.read())
+            expressions = [node.value for node in tree.body if isinstance(node, (ast.Assign, ast.AnnAssign)) and node.value]
+            for node in ast.walk(tree):
+                if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+                    expressions += node.args.defaults + [d for d in node.args.kw_defaults if d is not None]
+            names = {n.id for e in expressions for n in ast.walk(e) if isinstance(n, ast.Name) and n.id.isupper()}
+        _import_time_names[path] = names
+    return _import_time_names[path]
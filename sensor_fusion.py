@@ -0,0 +1,227 @@
+import numpy as np
+import pandas as pd
+from scipy.signal import butter, sosfiltfilt, correlate
+import os
+import sys
+import profiler
+import timebase
+
+# --- CONFIGURATION (EDIT THIS) ---
+
+# 1. INPUT FILE PATHS
+# Video-derived displacement (output of calibration_converter.py)
+VIDEO_DATA_PATH = 'data/processed_vibration_data.csv'
+VIDEO_COLUMN = 'displacement_M1_mm'
+# Reference accelerometer recording. Two formats are accepted:
+#  - a CSV with 'Time' (s) and 'Acceleration' columns (as used by fft.py), or
+#  - the Arduino log format: one quoted "counter, g" pair per line.
+ACCEL_DATA_PATH = 'Arduino-Readings-Accelerometer_counter_g_no_parentheses.csv'
+
+# 2. OUTPUT FILE PATH
+FUSED_OUTPUT_PATH = 'data/fused_displacement_mm.csv'
+
+# 3. ACCELEROMETER SETTINGS
+# Sample rate of the Arduino log (it only stores a counter, not a time stamp).
+ACCEL_SAMPLE_RATE_HZ = 100.0 # <<< SET THIS TO YOUR ARDUINO SAMPLING RATE
+# Unit of the accelerometer values: 'g' or 'm/s2'
+ACCEL_UNIT = 'g'
+
+# 4. FUSION SETTINGS
+# Acceleration is integrated twice in the frequency domain; content below this
+# frequency is removed (double integration turns any offset/noise there into drift).
+INTEGRATION_HIGHPASS_HZ = 1.0
+# Complementary filter crossover: below it the video displacement is trusted
+# (exact static position), above it the accelerometer (higher bandwidth).
+CROSSOVER_HZ = 2.0
+# Largest time offset (s) between the two recordings that is searched for.
+MAX_LAG_S = 5.0
+# Sign of the accelerometer axis relative to the video displacement axis (+1 or -1).
+# The video axis points down (image Y). 'auto' picks the sign of the strongest correlation,
+# which is ambiguous by half a period for a nearly pure sine: prefer a fixed value.
+ACCEL_POLARITY = 1
+
+G_TO_MM_S2 = 9806.65
+
+# --- LOADING ---
+
+def load_accelerometer(path, sample_rate, unit=None):
+    """
+    Loads an accelerometer recording and returns (time_s, acceleration in mm/s^2).
+    Supports the 'Time'/'Acceleration' CSV layout and the quoted Arduino "counter, g" log.
+    """
+    unit = ACCEL_UNIT if unit is None else unit
+    header = pd.read_csv(path, nrows=0).columns
+    if 'Time' in header and 'Acceleration' in header:
+        df = pd.read_csv(path)
+        time_s = df['Time'].values.astype(float)
+        accel = df['Acceleration'].values.astype(float)
+    else:
+        # Arduino log: every line is a quoted string "counter, value"
+        with open(path, 'r') as f:
+            rows = [line.strip().strip('"').split(',') for line in f.readlines()[1:] if line.strip()]
+        values = np.array(rows, dtype=float)
+        time_s = (values[:, 0] - values[0, 0]) / sample_rate
+        accel = values[:, 1]
+
+    scale = G_TO_MM_S2 if unit == 'g' else 1000.0
+    return time_s, accel * scale
+
+# --- CORE FUNCTIONS ---
+
+def fft_highpass(signal, sample_rate, cutoff_hz):
+    """Removes everything below cutoff_hz (ideal FFT mask, zero phase)."""
+    spectrum = np.fft.rfft(signal - np.mean(signal))
+    spectrum[np.fft.rfftfreq(len(signal), 1.0 / sample_rate) < cutoff_hz] = 0.0
+    return np.fft.irfft(spectrum, n=len(signal))
+
+
+def integrate_acceleration(accel_mm_s2, sample_rate, highpass_hz=None):
+    """
+    Double integration of a uniformly sampled acceleration in the frequency domain:
+    X(f) = -A(f) / (2*pi*f)^2, with everything below highpass_hz set to zero.
+    Works on 1-D signals or on every column of a 2-D array at once.
+    """
+    highpass_hz = INTEGRATION_HIGHPASS_HZ if highpass_hz is None else highpass_hz
+    accel = np.asarray(accel_mm_s2, dtype=float)
+    n = accel.shape[0]
+    spectrum = np.fft.rfft(accel - accel.mean(axis=0), axis=0)
+    freqs = np.fft.rfftfreq(n, 1.0 / sample_rate)
+
+    gain = np.zeros_like(freqs)
+    keep = freqs >= max(highpass_hz, freqs[1] if n > 1 else 0.0)
+    gain[keep] = -1.0 / (2 * np.pi * freqs[keep])**2
+    if accel.ndim > 1:
+        gain = gain[:, None]
+    return np.fft.irfft(spectrum * gain, n=n, axis=0)
+
+
+def estimate_delay(reference, other, sample_rate, max_lag_s=None, polarity=None):
+    """
+    Time offset (s) of 'other' relative to 'reference' (both on the same uniform grid),
+    from the peak of the FFT-based cross-correlation refined by parabolic interpolation
+    (sub-sample resolution). other(t) ~ reference(t - delay).
+    With polarity -1 the most negative correlation is searched, with 'auto' the largest |corr|.
+    Returns (delay_s, normalized correlation at the peak).
+    """
+    max_lag_s = MAX_LAG_S if max_lag_s is None else max_lag_s
+    polarity = ACCEL_POLARITY if polarity is None else polarity
+    a = (reference - np.mean(reference)) / (np.std(reference) + 1e-12)
+    b = (other - np.mean(other)) / (np.std(other) + 1e-12)
+    corr = correlate(b, a, mode='full', method='fft') / min(len(a), len(b))
+    lags = np.arange(-len(a) + 1, len(b))
+
+    window = np.abs(lags) <= int(max_lag_s * sample_rate)
+    corr_w, lags_w = corr[window], lags[window]
+    i = int(np.argmax(np.abs(corr_w) if polarity == 'auto' else polarity * corr_w))
+
+    # Parabolic interpolation around the peak
+    offset = 0.0
+    if 0 < i < len(corr_w) - 1:
+        y0, y1, y2 = corr_w[i - 1], corr_w[i], corr_w[i + 1]
+        denominator = y0 - 2 * y1 + y2
+        if denominator != 0:
+            offset = 0.5 * (y0 - y2) / denominator
+
+    return (lags_w[i] + offset) / sample_rate, float(corr_w[i])
+
+
+def complementary_fusion(video_disp, accel_disp, sample_rate, crossover_hz=None):
+    """
+    Combines two displacement estimates on the same time base:
+    low-pass(video) + high-pass(accelerometer), with complementary zero-phase filters
+    (the high-pass is x - low-pass(x), so the two weights add up to exactly one).
+    """
+    crossover_hz = CROSSOVER_HZ if crossover_hz is None else crossover_hz
+    sos = butter(4, crossover_hz, btype='lowpass', fs=sample_rate, output='sos')
+    low_video = sosfiltfilt(sos, video_disp, axis=0)
+    high_accel = accel_disp - sosfiltfilt(sos, accel_disp, axis=0)
+    return low_video + high_accel
+
+# --- MAIN FUSION LOGIC ---
+
+def fuse_video_and_accelerometer(video_path, video_column, accel_path, output_path, accel_rate):
+    """
+    Aligns the video displacement and the accelerometer in time, brings both onto the
+    accelerometer time base, and writes one fused, higher-bandwidth displacement signal.
+    """
+
+    # 1. Load Both Recordings
+    for path in (video_path, accel_path):
+        if not os.path.exists(path):
+            print(f"FATAL ERROR: Input file not found at: {path}")
+            sys.exit(1)
+
+    with profiler.stage('read_csv'):
+        df_video = pd.read_csv(video_path, usecols=['time_s', video_column])
+        t_video = df_video['time_s'].values
+        x_video = df_video[video_column].values
+        t_accel, a_accel = load_accelerometer(accel_path, accel_rate)
+
+    # 2. Common Time Base (uniform, at the higher accelerometer rate)
+    if timebase.detect_gaps(t_accel)['has_gaps']:
+        t_accel, a_accel, _ = timebase.resample_uniform(t_accel, a_accel)
+    fs = 1.0 / timebase.nominal_interval(t_accel)
+
+    with profiler.stage('fusion'):
+        # Acceleration -> displacement (mm)
+        x_accel = integrate_acceleration(a_accel, fs)
+
+        # Video displacement (uniform or with gaps) interpolated onto the accelerometer grid,
+        # using the time axis of the video itself
+        t_common = np.arange(max(t_video[0], t_accel[0]), min(t_video[-1], t_accel[-1]), 1.0 / fs)
+        if len(t_common) < 16:
+            # Unsynchronized clocks: align by shape on the overlap of the two durations
+            duration = min(t_video[-1] - t_video[0], t_accel[-1] - t_accel[0])
+            t_common = t_accel[0] + np.arange(0.0, duration, 1.0 / fs)
+            t_video = t_video - t_video[0] + t_accel[0]
+        video_on_grid = np.interp(t_common, t_video, x_video)
+        accel_on_grid = np.interp(t_common, t_accel, x_accel)
+
+        # 3. Alignment by Cross-Correlation (sub-sample)
+        # The video is compared in the same band the integrated accelerometer covers
+        video_band = fft_highpass(video_on_grid, fs, INTEGRATION_HIGHPASS_HZ)
+        delay_s, correlation = estimate_delay(video_band, accel_on_grid, fs)
+        polarity = -1.0 if correlation < 0 else 1.0
+        accel_on_grid = polarity * np.interp(t_common, t_accel - delay_s, x_accel)
+
+        # Amplitude check: both sensors should agree in the band both can see
+        scale_ratio = np.std(accel_on_grid) / (np.std(video_band) + 1e-12)
+
+        # 4. Complementary Fusion
+        fused = complementary_fusion(video_on_grid, accel_on_grid, fs)
+
+    # 5. Save the Fused Signal
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    pd.DataFrame({
+        'time_s': t_common - t_common[0],
+        'displacement_fused_mm': fused,
+        'displacement_video_mm': video_on_grid,
+        'displacement_accel_mm': accel_on_grid,
+    }).to_csv(output_path, index=False)
+
+    # --- Print Results ---
+    print("\n--- Sensor Fusion Complete ---")
+    print(f"Video sample rate: {1.0 / timebase.nominal_interval(t_video):.2f} Hz")
+    print(f"Common (accelerometer) sample rate: {fs:.2f} Hz")
+    print(f"Estimated accelerometer delay: {delay_s * 1000:.2f} ms (correlation {correlation:.2f})")
+    print(f"Accelerometer / video amplitude ratio above {INTEGRATION_HIGHPASS_HZ} Hz: {scale_ratio:.2f}")
+    if polarity < 0:
+        print("Note: the accelerometer sign was inverted to match the video axis.")
+    if abs(correlation) < 0.5:
+        print("WARNING: Weak correlation, check that both files record the same event.")
+    print(f"Fused displacement saved to: {output_path}")
+
+    return {'delay_s': delay_s, 'correlation': correlation, 'polarity': polarity,
+            'sample_rate': fs, 'scale_ratio': scale_ratio}
+
+
+if __name__ == "__main__":
+    fuse_video_and_accelerometer(
+        VIDEO_DATA_PATH,
+        VIDEO_COLUMN,
+        ACCEL_DATA_PATH,
+        FUSED_OUTPUT_PATH,
+        ACCEL_SAMPLE_RATE_HZ
+    )
@@ -0,0 +1,469 @@
+import argparse
+import csv
+import glob
+import importlib
+import json
+import os
+import sys
+from script_loader import PIPELINE_SCRIPTS, import_time_constants, load_script
+
+# Single entry point for the whole pipeline:
+#
+#   python shm_cli.py calibrate VIDEO --known-mm 10 --write-config shm.json
+#   python shm_cli.py --config shm.json track VIDEO --roi 410,220,40,40 --roi 800,230,40,40
+#   python shm_cli.py --config shm.json track VIDEO --phase --roi 410,220,40,40 --magnify 20
+#   python shm_cli.py --config shm.json convert data/raw_pixel_positions1.csv
+#   python shm_cli.py analyze data/raw_pixel_positions1_mm.csv --column displacement_M1_mm
+#   python shm_cli.py --headless batch "data/run_*.csv" --steps analyze,damping,modes --summary data/shm_run_history.csv
+#
+# Only the standard library is imported here. Every subcommand loads just the pipeline
+# script it runs, so NumPy/SciPy/pandas/cv2/matplotlib are imported on demand
+# ('--help' or a quick vibration analysis no longer pays for cv2 and matplotlib).
+
+# --- CONFIGURATION (EDIT THIS) ---
+
+# 1. CONFIG FILE
+# Optional JSON file with defaults per subcommand (same names as the options, with '_'
+# instead of '-'), global options and script settings, e.g.
+#   {"headless": true,
+#    "convert": {"known_mm": 10.0, "measured_px": 750.05},
+#    "analyze": {"column": "displacement_M1_mm", "skip": 5},
+#    "settings": {"FILTER_BAND_HZ": [1.0, 20.0], "out_of_core.CHUNK_ROWS": 200000}}
+# Order of precedence: command line > config file > the constants in the scripts.
+DEFAULT_CONFIG_PATH = 'shm_config.json' # Used when it exists and no --config is given
+
+# 2. BATCH
+DEFAULT_BATCH_STEPS = ['analyze', 'damping', 'modes']
+# Column names of the batch summary; the same as damage_detector.py's run history,
+# so a summary can be appended to RUN_HISTORY_CSV_PATH directly.
+SUMMARY_COLUMNS = ['run_id', 'input', 'f_n_Hz', 'zeta', 'relative_phase_deg', 'error']
+
+# --- HELPERS ---
+
+def load_module(name):
+    """Pipeline script by short name / file name, or a helper module (e.g. 'out_of_core')."""
+    if name in PIPELINE_SCRIPTS or name.endswith('.py'):
+        return load_script(name)
+    return importlib.import_module(name)
+
+
+def parse_setting(text):
+    """'NAME=VALUE' -> (NAME, value); the value is read as JSON if possible ('[1, 20]', 'true', '5.0')."""
+    name, separator, value = text.partition('=')
+    if not separator:
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got '{text}'")
+    try:
+        return name.strip(), json.loads(value)
+    except json.JSONDecodeError:
+        return name.strip(), value
+
+
+def apply_settings(modules, settings):
+    """
+    Overrides UPPER_CASE constants: 'NAME' is set in every given module that defines it,
+    'module.NAME' in that module only (e.g. 'out_of_core.OUT_OF_CORE_THRESHOLD_MB').
+    The scripts read their constants when a function runs (None defaults); a constant that
+    a module still copies at import time is rejected instead of being silently ignored.
+    """
+    for key, value in settings.items():
+        if '.' in key:
+            module_name, name = key.rsplit('.', 1)
+            targets = [load_module(module_name)]
+        else:
+            name = key
+            targets = [module for module in modules if hasattr(module, name)]
+        targets = [module for module in targets if hasattr(module, name)]
+        if not name.isupper() or not targets:
+            print(f"FATAL ERROR: Unknown setting '{key}' (no such constant in the scripts of this command).")
+            sys.exit(1)
+        frozen = [module.__name__ for module in targets if name in import_time_constants(module)]
+        if frozen:
+            print(f"FATAL ERROR: Setting '{key}' cannot be overridden: {', '.join(frozen)} copies it when the script is imported.")
+            sys.exit(1)
+        for module in targets:
+            # JSON has no tuples: settings like FILTER_BAND_HZ = (low, high) keep their type
+            setattr(module, name, tuple(value) if isinstance(getattr(module, name), tuple) and isinstance(value, list) else value)
+
+
+def default_output(input_path, suffix):
+    """Output file next to the input, e.g. run1.csv -> run1_mm.csv."""
+    stem, _ = os.path.splitext(input_path)
+    return stem + suffix
+
+
+def parse_roi(roi):
+    """'x,y,w,h' (command line) or [x, y, w, h] (config file) -> (x, y, w, h)."""
+    values = roi.split(',') if isinstance(roi, str) else roi
+    if len(values) != 4:
+        raise ValueError(f"A marker ROI needs 4 values x,y,w,h, got: {roi}")
+    return tuple(int(float(v)) for v in values)
+
+
+def option(options, name, default):
+    value = options.get(name)
+    return default if value is None else value
+
+# --- PIPELINE STEPS ---
+# Each step takes an input file and its options (dict) and returns a dict of results.
+# 'output' in the result is the input of the next step in a batch.
+
+def run_calibrate(video_path, options, results=None):
+    finder = load_script('calibration_finder')
+    measured_px = options.get('pixels') or finder.measure_pixel_distance(video_path)
+    if measured_px is None:
+        print("Calibration aborted: two points are needed.")
+        return {}
+    result = {'measured_px': measured_px}
+    known_mm = options.get('known_mm')
+    if known_mm:
+        result['known_mm'] = known_mm
+        print(f"Scale: {measured_px / known_mm:.4f} px/mm ({known_mm / measured_px:.6f} mm/px)")
+    return result
+
+
+def run_track(video_path, options, results=None):
+    if options.get('full_field'):
+        tracker = load_module('full_field_tracker')
+        output_path = option(options, 'output', default_output(video_path, '_field.npz'))
+        roi = parse_roi(options['roi'][0]) if options.get('roi') else tracker.STRUCTURE_ROI
+        if roi is None and options.get('no_window'):
+            raise ValueError("Full-field tracking without a window needs the structure box (--roi x,y,w,h).")
+        tracker.track_full_field(video_path, output_path, roi)
+        return {'output': output_path}
+
+    if options.get('phase'):
+        phase_motion = load_module('phase_motion')
+        output_path = option(options, 'output', default_output(video_path, '_phase.csv'))
+        rois = [parse_roi(roi) for roi in options['roi']] if options.get('roi') else phase_motion.MARKER_ROIS
+        if rois is None and options.get('no_window'):
+            raise ValueError("Phase-based extraction without a window needs the region boxes (--roi x,y,w,h per region).")
+        if options.get('magnify'):
+            phase_motion.MAGNIFY, phase_motion.MAGNIFICATION_FACTOR = True, options['magnify']
+        phase_motion.extract_phase_motion(video_path, output_path, rois)
+        return {'output': output_path}
+
+    tracker = load_script('tracker')
+    output_path = option(options, 'output', default_output(video_path, '_pixels.csv'))
+    rois = [parse_roi(roi) for roi in options['roi']] if options.get('roi') else None
+    show_window = not options.get('no_window')
+    if rois is None and not show_window:
+        raise ValueError("Tracking without a window needs the marker ROIs (--roi x,y,w,h per marker).")
+    tracker.track_markers(video_path, output_path, rois=rois, show_window=show_window)
+    if not os.path.exists(output_path):
+        raise RuntimeError("Tracking produced no data.")
+    return {'output': output_path}
+
+
+def run_convert(input_path, options, results=None):
+    converter = load_script('converter')
+    output_path = option(options, 'output', default_output(input_path, '_mm.csv'))
+    converter.process_data_and_calibrate(
+        input_path,
+        output_path,
+        option(options, 'known_mm', converter.KNOWN_PHYSICAL_DISTANCE_MM),
+        option(options, 'measured_px', converter.MEASURED_PIXEL_DISTANCE)
+    )
+    return {'output': output_path}
+
+
+def run_analyze(input_path, options, results=None):
+    method = option(options, 'method', 'fft')
+    if method == 'time-frequency':
+        analyzer = load_script('time_frequency.py')
+        tracks_path = default_output(input_path, '_tf_tracks.csv')
+        curves_path = default_output(input_path, '_tf_curves.csv')
+        analyzer.analyze_time_frequency(input_path, tracks_path, curves_path,
+                                        option(options, 'skip', analyzer.SKIP_INITIAL_SAMPLES))
+        return {'outputs': [tracks_path, curves_path]}
+
+    analyzer = load_script('vibration')
+    if options.get('band'):
+        analyzer.FILTER_BAND_HZ = tuple(options['band'])
+    skip = option(options, 'skip', analyzer.SKIP_INITIAL_SAMPLES)
+    if method == 'channels':
+        return {'channels_f_n_Hz': analyzer.analyze_all_channels(input_path, skip)}
+    f_n = analyzer.analyze_and_plot_vibration(input_path, option(options, 'column', analyzer.TARGET_COLUMN), skip)
+    return {'f_n_Hz': f_n} if f_n is not None else {}
+
+
+def run_damping(input_path, options, results=None):
+    calculator = load_script('damping')
+    # Approximate f_n for the peak search: option > result of 'analyze' in the same batch > script constant
+    f_n = options.get('fn') or (results or {}).get('f_n_Hz')
+    if f_n:
+        calculator.APPROX_NATURAL_FREQUENCY_HZ = float(f_n)
+    zeta = calculator.analyze_damping(input_path, option(options, 'column', calculator.TARGET_COLUMN),
+                                      option(options, 'skip', calculator.SKIP_INITIAL_SAMPLES))
+    return {'zeta': zeta} if zeta is not None else {}
+
+
+def run_modes(input_path, options, results=None):
+    if option(options, 'method', 'phase') == 'field':
+        analyzer = load_module('full_field_tracker')
+        output_path = option(options, 'output', default_output(input_path, '_modes.csv'))
+        analysis = analyzer.analyze_full_field(input_path, output_path, option(options, 'skip', analyzer.SKIP_INITIAL_FRAMES))
+        result = {'outputs': [output_path], 'field_modes_Hz': [m['frequency_Hz'] for m in analysis['modes']]}
+        if analysis['modes'] and not (results or {}).get('f_n_Hz'):
+            result['f_n_Hz'] = analysis['modes'][0]['frequency_Hz']
+        return result
+
+    if option(options, 'method', 'phase') == 'ssi':
+        analyzer = load_script('ssi_analyzer.py')
+        output_path = option(options, 'output', default_output(input_path, '_ssi_modes.csv'))
+        analysis = analyzer.analyze_ssi(input_path, output_path, option(options, 'skip', analyzer.SKIP_INITIAL_SAMPLES))
+        modes = analysis['modes'] if analysis else []
+        result = {'outputs': [output_path], 'ssi_modes': [(m['frequency_Hz'], m['damping']) for m in modes]}
+        if modes and not (results or {}).get('f_n_Hz'):
+            result['f_n_Hz'] = modes[0]['frequency_Hz']
+        return result
+
+    analyzer = load_script('mode_shape')
+    f_n = options.get('fn') or (results or {}).get('f_n_Hz') or analyzer.DOMINANT_FREQUENCY_HZ
+    phase = analyzer.analyze_mode_shape(input_path, option(options, 'skip', analyzer.SKIP_INITIAL_SAMPLES), float(f_n))
+    return {'relative_phase_deg': phase} if phase is not None else {}
+
+
+def run_uncertainty(input_path, options, results=None):
+    engine = load_module('uncertainty')
+    if options.get('replicates'):
+        engine.N_REPLICATES = options['replicates']
+    if options.get('budget'):
+        engine.TIME_BUDGET_S = options['budget']
+    output_path = option(options, 'output', default_output(input_path, '_uncertainty.csv'))
+    engine.analyze_uncertainty(input_path, output_path, option(options, 'skip', engine.SKIP_INITIAL_SAMPLES),
+                               option(options, 'methods', engine.METHODS))
+    return {'outputs': [output_path]}
+
+
+STEPS = {
+    'calibrate': (run_calibrate, ['calibration_finder']),
+    'track': (run_track, ['tracker', 'full_field_tracker', 'phase_motion']),
+    'convert': (run_convert, ['converter']),
+    'analyze': (run_analyze, ['vibration', 'time_frequency.py']),
+    'damping': (run_damping, ['damping']),
+    'modes': (run_modes, ['mode_shape', 'ssi_analyzer.py', 'full_field_tracker']),
+    'uncertainty': (run_uncertainty, ['uncertainty']),
+}
+
+
+def step_modules(step, options):
+    """The scripts a step will load (the settings are applied to these)."""
+    scripts = STEPS[step][1]
+    if step == 'analyze':
+        scripts = scripts[1:] if options.get('method') == 'time-frequency' else scripts[:1]
+    elif step == 'track':
+        scripts = scripts[2:] if options.get('phase') else scripts[1:2] if options.get('full_field') else scripts[:1]
+    elif step == 'modes':
+        scripts = scripts[{'phase': 0, 'ssi': 1, 'field': 2}[option(options, 'method', 'phase')]:][:1]
+    return [load_module(name) for name in scripts]
+
+# --- SUBCOMMANDS ---
+
+def command_step(args, config):
+    """calibrate / track / convert / analyze / damping / modes on a single file."""
+    options = {key: value for key, value in vars(args).items() if value is not None}
+    apply_settings(step_modules(args.command, options), config['settings'])
+    results = STEPS[args.command][0](args.input, options)
+
+    if args.command == 'calibrate' and results and args.write_config:
+        # Store the scale for 'convert' (command line and batch runs)
+        stored = read_config(args.write_config) if os.path.exists(args.write_config) else {}
+        stored.setdefault('convert', {}).update({key: results[key] for key in ('measured_px', 'known_mm') if key in results})
+        with open(args.write_config, 'w', encoding='utf-8') as f:
+            json.dump(stored, f, indent=2)
+        print(f"Calibration written to: {args.write_config}")
+    return 0
+
+
+def expand_inputs(patterns):
+    """Glob patterns are expanded here too (the Windows shell does not do it)."""
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        paths.extend(matches if matches else [pattern])
+    return paths
+
+
+def command_batch(args, config):
+    """Runs the given steps on every input file; a failing file does not stop the batch."""
+    import report_renderer
+    report_renderer.HEADLESS = True # Never block a batch on a plot window
+
+    steps = [step.strip() for step in args.steps.split(',') if step.strip()]
+    unknown = [step for step in steps if step not in STEPS or step == 'calibrate']
+    if unknown:
+        print(f"FATAL ERROR: Unknown batch step(s): {unknown}. Use: {', '.join(s for s in STEPS if s != 'calibrate')}")
+        return 1
+    step_options = {step: dict(config.get(step, {})) for step in steps}
+    if 'track' in step_options:
+        step_options['track']['no_window'] = True
+    apply_settings([m for step in steps for m in step_modules(step, step_options[step])], config['settings'])
+
+    inputs = expand_inputs(args.inputs)
+    report_dir = report_renderer.REPORT_DIR
+    summary = []
+    for n, input_path in enumerate(inputs, 1):
+        print(f"\n===== [{n}/{len(inputs)}] {input_path} =====")
+        row = {'run_id': os.path.splitext(os.path.basename(input_path))[0], 'input': input_path}
+        # One report folder per file (the figure names are the same for every file)
+        report_renderer.wait_for_reports()
+        report_renderer.REPORT_DIR = os.path.join(report_dir, row['run_id'])
+        results = {}
+        current_path = input_path
+        for step in steps:
+            try:
+                results.update(STEPS[step][0](current_path, step_options[step], results))
+            except (Exception, SystemExit) as e:
+                # Scripts report fatal input errors with sys.exit(1) after printing the reason
+                row['error'] = f"{step}: " + (f"exit code {e.code}" if isinstance(e, SystemExit) else f"{type(e).__name__}: {e}")
+                print(f"ERROR in step '{step}': {row['error']}")
+                break
+            current_path = results.pop('output', current_path)
+        row.update({key: results[key] for key in SUMMARY_COLUMNS if key in results})
+        summary.append(row)
+
+    report_renderer.wait_for_reports()
+    failed = sum(1 for row in summary if row.get('error'))
+
+    print("\n--- Batch Summary ---")
+    for row in summary:
+        values = [f"{key}={row[key]:.4f}" if isinstance(row.get(key), float) else f"{key}={row[key]}"
+                  for key in ('f_n_Hz', 'zeta', 'relative_phase_deg', 'error') if row.get(key) is not None]
+        print(f"{row['run_id']:<30} " + "  ".join(values))
+    print(f"{len(summary) - failed} of {len(summary)} file(s) processed successfully.")
+
+    if args.summary:
+        directory = os.path.dirname(args.summary)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.summary, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS)
+            writer.writeheader()
+            writer.writerows(summary)
+        print(f"Summary saved to: {args.summary}")
+    return 1 if failed else 0
+
+# --- ARGUMENT PARSING ---
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='shm_cli.py', description="Vibration analysis and SHM pipeline.")
+    parser.add_argument('--config', help=f"JSON config file (default: {DEFAULT_CONFIG_PATH} if it exists)")
+    parser.add_argument('--set', dest='settings', action='append', type=parse_setting, default=[], metavar='NAME=VALUE',
+                        help="Override a script constant, e.g. --set FILTER_BAND_HZ=[1,20] (repeatable)")
+    parser.add_argument('--headless', action='store_true', default=None,
+                        help="Export the figures to the report directory instead of opening windows")
+    parser.add_argument('--report-dir', help="Directory for exported figures (with --headless)")
+    parser.add_argument('--profile', action='store_true', default=None, help="Write a profiling report (profiler.py)")
+    commands = parser.add_subparsers(dest='command', required=True, metavar='COMMAND')
+
+    p = commands.add_parser('calibrate', help="Measure the pixel distance of a known length on the first frame")
+    p.add_argument('input', metavar='VIDEO')
+    p.add_argument('--known-mm', type=float, help="Physical distance between the two clicked points")
+    p.add_argument('--pixels', type=float, help="Use this pixel distance instead of clicking")
+    p.add_argument('--write-config', metavar='PATH', help="Store measured_px/known_mm for 'convert' in this config file")
+
+    p = commands.add_parser('track', help="Track the markers in a video -> pixel CSV")
+    p.add_argument('input', metavar='VIDEO')
+    p.add_argument('-o', '--output', help="Pixel CSV (default: <video>_pixels.csv)")
+    p.add_argument('--roi', action='append', metavar='X,Y,W,H', help="Marker box, once per marker (default: draw them)")
+    p.add_argument('--no-window', action='store_true', default=None, help="Track without a window (needs --roi)")
+    p.add_argument('--full-field', action='store_true', default=None,
+                   help="Optical flow on a point grid over the structure (--roi = structure box) -> <video>_field.npz")
+    p.add_argument('--phase', action='store_true', default=None,
+                   help="Sub-pixel motion of each --roi from the local phase (steerable pyramid) -> <video>_phase.csv")
+    p.add_argument('--magnify', type=float, metavar='FACTOR',
+                   help="With --phase: also render motion-magnified videos of the strongest modes")
+
+    p = commands.add_parser('convert', help="Pixel CSV -> displacement CSV (mm)")
+    p.add_argument('input', metavar='PIXEL_CSV')
+    p.add_argument('-o', '--output', help="Displacement CSV (default: <input>_mm.csv)")
+    p.add_argument('--known-mm', type=float)
+    p.add_argument('--measured-px', type=float)
+
+    p = commands.add_parser('analyze', help="Natural frequency (FFT), all channels, or f(t)/zeta(A) tracks")
+    p.add_argument('input', metavar='DISPLACEMENT_CSV')
+    p.add_argument('--method', choices=['fft', 'channels', 'time-frequency'])
+    p.add_argument('--column')
+    p.add_argument('--skip', type=int, help="Initial samples to skip")
+    p.add_argument('--band', type=float, nargs=2, metavar=('LOW', 'HIGH'), help="Band-pass filter (Hz)")
+
+    p = commands.add_parser('modes', help="Relative phase between the markers, modes by covariance SSI, or full-field shapes")
+    p.add_argument('input', metavar='DISPLACEMENT_CSV', help="Displacement CSV, or the .npz field with --method field")
+    p.add_argument('--method', choices=['phase', 'ssi', 'field'])
+    p.add_argument('--fn', type=float, help="Natural frequency for the phase (Hz)")
+    p.add_argument('--skip', type=int)
+    p.add_argument('-o', '--output', help="SSI / field modes CSV (default: <input>_ssi_modes.csv / <input>_modes.csv)")
+
+    p = commands.add_parser('damping', help="Damping ratio from the free decay (logarithmic decrement)")
+    p.add_argument('input', metavar='DISPLACEMENT_CSV')
+    p.add_argument('--column')
+    p.add_argument('--skip', type=int)
+    p.add_argument('--fn', type=float, help="Approximate natural frequency for the peak search (Hz)")
+
+    p = commands.add_parser('uncertainty', help="Confidence intervals of f_n, amplitude, phase and zeta")
+    p.add_argument('input', metavar='DISPLACEMENT_CSV')
+    p.add_argument('--methods', nargs='+', choices=['bootstrap', 'monte_carlo'])
+    p.add_argument('--replicates', type=int)
+    p.add_argument('--budget', type=float, metavar='SECONDS', help="Time budget of the Monte Carlo")
+    p.add_argument('--skip', type=int)
+    p.add_argument('-o', '--output', help="Interval table (default: <input>_uncertainty.csv)")
+
+    p = commands.add_parser('batch', help="Run several steps on many files (options from the config file)")
+    p.add_argument('inputs', nargs='+', metavar='FILE', help="Input files or glob patterns")
+    p.add_argument('--steps', default=','.join(DEFAULT_BATCH_STEPS),
+                   help=f"Comma-separated steps: track,convert,analyze,damping,modes,uncertainty (default: {','.join(DEFAULT_BATCH_STEPS)})")
+    p.add_argument('--summary', metavar='CSV', help="Write one row per file (damage_detector.py run history format)")
+    return parser
+
+
+def read_config(path):
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    if not isinstance(config, dict):
+        raise ValueError(f"{path}: the config file must contain a JSON object")
+    return config
+
+
+def resolve_config(args):
+    """Merges the config file into the parsed arguments (command line wins) and returns the config."""
+    path = args.config or (DEFAULT_CONFIG_PATH if os.path.exists(DEFAULT_CONFIG_PATH) else None)
+    config = read_config(path) if path else {}
+    for key in ('headless', 'report_dir', 'profile'):
+        if getattr(args, key) is None:
+            setattr(args, key, config.get(key))
+
+    if args.command != 'batch':
+        for key, value in config.get(args.command, {}).items():
+            if key not in vars(args) or key in ('input', 'command'):
+                raise ValueError(f"{path}: unknown option '{key}' for '{args.command}'")
+            if getattr(args, key) is None:
+                setattr(args, key, value)
+
+    config['settings'] = {**config.get('settings', {}), **dict(args.settings)}
+    return config
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        config = resolve_config(args)
+    except (OSError, ValueError) as e:
+        print(f"FATAL ERROR: {e}")
+        return 1
+
+    if args.profile:
+        import profiler
+        profiler.enable()
+    if args.headless or args.report_dir:
+        import report_renderer
+        report_renderer.HEADLESS = bool(args.headless) or report_renderer.HEADLESS
+        if args.report_dir:
+            report_renderer.REPORT_DIR = args.report_dir
+
+    if args.command == 'batch':
+        return command_batch(args, config)
+    return command_step(args, config)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
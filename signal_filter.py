@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+import os
+import profiler
+
+# --- CONFIGURATION (EDIT THIS) ---
+
+# 1. BUTTERWORTH FILTER
+# The filters are designed as second-order sections (SOS), which stay numerically stable
+# at high orders and narrow bands where the (b, a) form used by lfilter breaks down.
+FILTER_ORDER = 4
+
+# 2. BAND AROUND A MODE
+# Pass band used when filtering around a known natural frequency f_n:
+# [f_n * (1 - RELATIVE_HALF_WIDTH), f_n * (1 + RELATIVE_HALF_WIDTH)]
+RELATIVE_HALF_WIDTH = 0.5
+
+# 3. DECIMATION
+# After band-pass filtering the signal no longer contains energy far above the band,
+# so it can be kept at a lower sample rate. 'auto' picks the largest factor that keeps
+# the upper band edge below 1/OVERSAMPLING of the new sample rate; 1 disables decimation.
+DECIMATION_FACTOR = 'auto'
+OVERSAMPLING = 5.0
+
+# 4. STREAMING
+# Rows per chunk when a CSV file is filtered without loading it completely.
+CHUNK_ROWS = 100_000
+
+# --- FILTER DESIGN ---
+
+def band_around_mode(f_n_Hz, relative_half_width=None):
+    """Pass band (low_Hz, high_Hz) centered on one mode."""
+    relative_half_width = RELATIVE_HALF_WIDTH if relative_half_width is None else relative_half_width
+    return (f_n_Hz * (1.0 - relative_half_width), f_n_Hz * (1.0 + relative_half_width))
+
+
+def design_filter(band_Hz, sample_rate, order=None):
+    """
+    Butterworth filter in SOS form. band_Hz is (low, high) for a band-pass;
+    use None for one edge to get a high-pass (low, None) or a low-pass (None, high).
+    Edges outside (0, Nyquist) are dropped.
+    """
+    order = FILTER_ORDER if order is None else order
+    # scipy.signal takes longer to import than a quick analysis takes to run,
+    # so it is only imported once a filter is actually needed
+    from scipy.signal import butter
+    nyquist = sample_rate / 2.0
+    low, high = band_Hz
+    low = low if low is not None and 0 < low < nyquist else None
+    high = high if high is not None and 0 < high < nyquist else None
+
+    if low is not None and high is not None:
+        return butter(order, [low, high], btype='bandpass', fs=sample_rate, output='sos')
+    if low is not None:
+        return butter(order, low, btype='highpass', fs=sample_rate, output='sos')
+    if high is not None:
+        return butter(order, high, btype='lowpass', fs=sample_rate, output='sos')
+    return None
+
+
+def decimation_factor(band_Hz, sample_rate, factor=None):
+    """Resolves the decimation factor ('auto' or an integer) for a filtered band."""
+    factor = DECIMATION_FACTOR if factor is None else factor
+    if factor != 'auto':
+        return max(int(factor), 1)
+    high = band_Hz[1]
+    if high is None or high <= 0:
+        return 1
+    return max(int(sample_rate / (OVERSAMPLING * high)), 1)
+
+# --- ZERO-PHASE (OFFLINE) FILTERING ---
+
+def zero_phase_filter(signals, sample_rate, band_Hz, order=None):
+    """
+    Forward-backward (zero-phase) filtering with sosfiltfilt. 'signals' is one signal
+    (1-D) or all marker columns at once (2-D, samples x channels); each column is
+    filtered independently in a single vectorized call.
+    """
+    order = FILTER_ORDER if order is None else order
+    from scipy.signal import sosfiltfilt
+    sos = design_filter(band_Hz, sample_rate, order)
+    signals = np.asarray(signals, dtype=float)
+    if sos is None:
+        return signals
+    # The default padding of sosfiltfilt can exceed very short records
+    padlen = min(3 * (2 * len(sos) + 1), signals.shape[0] - 1)
+    return sosfiltfilt(sos, signals, axis=0, padlen=padlen)
+
+
+def filter_and_decimate(time_s, signals, sample_rate, band_Hz, factor=None):
+    """
+    Band-pass filters every column and keeps every q-th sample afterwards.
+    The band-pass itself acts as the anti-aliasing filter, so no second filter pass is needed.
+    Returns (time_s, filtered_signals, new_sample_rate).
+    """
+    factor = DECIMATION_FACTOR if factor is None else factor
+    with profiler.stage('filter'):
+        filtered = zero_phase_filter(signals, sample_rate, band_Hz)
+        q = decimation_factor(band_Hz, sample_rate, factor)
+        if q > 1:
+            time_s = np.asarray(time_s)[::q]
+            filtered = filtered[::q]
+    profiler.add_items('filter', len(filtered))
+    return time_s, filtered, sample_rate / q
+
+# --- STREAMING (CHUNKED) FILTERING ---
+
+def new_filter_state(sos, first_samples):
+    """
+    Initial state for streaming filtering, scaled to the first sample of every channel
+    (steady state for a constant input, so the filter does not ring at the start).
+    """
+    first_samples = np.atleast_1d(np.asarray(first_samples, dtype=float))
+    from scipy.signal import sosfilt_zi
+    zi = sosfilt_zi(sos) # (n_sections, 2)
+    return zi[:, :, None] * first_samples[None, None, :]
+
+
+def filter_chunk(sos, chunk, state):
+    """
+    Filters one chunk (samples x channels) causally with sosfilt, continuing from 'state'.
+    Returns (filtered_chunk, new_state). Feeding a record chunk by chunk gives exactly
+    the same output as filtering it in one piece.
+    """
+    from scipy.signal import sosfilt
+    chunk = np.asarray(chunk, dtype=float)
+    squeeze = chunk.ndim == 1
+    if squeeze:
+        chunk = chunk[:, None]
+    filtered, state = sosfilt(sos, chunk, axis=0, zi=state)
+    return (filtered[:, 0] if squeeze else filtered), state
+
+
+def filter_chunks(chunks, sample_rate, band_Hz, order=None):
+    """
+    Generator: causal filtering of a stream of chunks with the state carried across them.
+    Unlike zero_phase_filter this adds the filter's phase delay, but needs only one chunk in memory.
+    """
+    order = FILTER_ORDER if order is None else order
+    sos = design_filter(band_Hz, sample_rate, order)
+    state = None
+    for chunk in chunks:
+        if sos is None:
+            yield np.asarray(chunk, dtype=float)
+            continue
+        if state is None:
+            state = new_filter_state(sos, np.asarray(chunk, dtype=float)[0])
+        filtered, state = filter_chunk(sos, chunk, state)
+        yield filtered
+
+
+def filter_csv_stream(input_path, output_path, columns, sample_rate, band_Hz, chunk_rows=None):
+    """
+    Filters the given columns of a CSV file chunk by chunk (constant memory) and writes
+    them, together with the remaining columns, to output_path. Returns the number of rows.
+    """
+    chunk_rows = CHUNK_ROWS if chunk_rows is None else chunk_rows
+    reader = pd.read_csv(input_path, chunksize=chunk_rows)
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    sos = design_filter(band_Hz, sample_rate)
+    state = None
+    rows = 0
+    with profiler.stage('filter'):
+        for i, chunk in enumerate(reader):
+            values = chunk[columns].values.astype(float)
+            if sos is not None:
+                if state is None:
+                    state = new_filter_state(sos, values[0])
+                values, state = filter_chunk(sos, values, state)
+            chunk[columns] = values
+            chunk.to_csv(output_path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+            rows += len(chunk)
+    profiler.add_items('filter', rows)
+    return rows
@@ -0,0 +1,224 @@
+import numpy as np
+import pandas as pd
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+# --- CONFIGURATION (EDIT THIS) ---
+
+# 1. CACHE LOCATION AND SIZE
+# Results are stored as .npz files named after their key. When the folder grows above
+# the size limit, the least recently used entries are deleted first.
+CACHE_DIR = os.environ.get('SHM_CACHE_DIR', 'data/.spectral_cache')
+MAX_CACHE_MB = float(os.environ.get('SHM_CACHE_MAX_MB', '500'))
+
+# 2. ENABLE / DISABLE
+# Set SHM_CACHE=0 to always recompute (e.g. when timing the analysis itself).
+CACHE_ENABLED = os.environ.get('SHM_CACHE', '1') != '0'
+
+# 3. IN-MEMORY LAYER
+# Number of recent results also kept in memory (repeated use inside one process).
+MEMORY_ENTRIES = 16
+
+# --- INTERNAL STATE ---
+
+_memory = OrderedDict()
+_digest_memo = {}
+DIGEST_MEMO_FILE = 'file_digests.json'
+
+# --- KEYS ---
+
+def file_digest(path):
+    """
+    SHA-1 of the file contents. The digest is remembered per (path, size, mtime),
+    so an unchanged multi-GB log is only hashed once.
+    """
+    stat = os.stat(path)
+    abs_path = os.path.abspath(path)
+    signature = [stat.st_size, stat.st_mtime_ns]
+
+    if not _digest_memo:
+        _load_digest_memo()
+    memo = _digest_memo.get(abs_path)
+    if memo and memo[:2] == signature:
+        return memo[2]
+
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(block)
+    digest = sha1.hexdigest()
+
+    _digest_memo[abs_path] = signature + [digest]
+    _save_digest_memo()
+    return digest
+
+
+def array_digest(array):
+    """SHA-1 of an in-memory array (contents, dtype and shape)."""
+    data = np.ascontiguousarray(array)
+    sha1 = hashlib.sha1(data.view(np.uint8).reshape(-1))
+    sha1.update(f"{data.dtype.str}{data.shape}".encode())
+    return sha1.hexdigest()
+
+
+def make_key(source_digest, **params):
+    """
+    Cache key = hash of the input data digest plus every parameter that changes the
+    result (e.g. column, skip_samples, Fs, window). Parameters are sorted by name.
+    """
+    canonical = json.dumps({'source': source_digest, **params}, sort_keys=True, default=repr)
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+# --- STORAGE ---
+
+def _entry_path(key):
+    return os.path.join(CACHE_DIR, f"{key}.npz")
+
+
+def load(key):
+    """Returns the cached result dictionary for key, or None if it is not cached."""
+    if key in _memory:
+        _memory.move_to_end(key)
+        return _memory[key]
+
+    path = _entry_path(key)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as npz:
+            result = {name: (npz[name].item() if npz[name].ndim == 0 else npz[name]) for name in npz.files}
+    except (OSError, ValueError):
+        # Damaged entry (e.g. interrupted write): treat as a miss
+        return None
+
+    try:
+        os.utime(path) # Mark as recently used for the LRU eviction
+    except FileNotFoundError:
+        pass # Evicted by another process in the meantime; the result is still valid
+    _remember(key, result)
+    return result
+
+
+def store(key, result):
+    """Saves a result dictionary (arrays and scalars) and evicts old entries if needed."""
+    _remember(key, result)
+    if not os.path.exists(CACHE_DIR):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+
+    # Write to a temporary file first so a crash never leaves a half-written entry; the name is
+    # per process, so two processes storing the same key (e.g. service workers) do not collide
+    tmp_path = f"{_entry_path(key)}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **{name: np.asarray(value) for name, value in result.items()})
+    os.replace(tmp_path, _entry_path(key))
+
+    evict(MAX_CACHE_MB * 1e6)
+
+
+def evict(max_bytes):
+    """Deletes least recently used entries until the cache folder is below max_bytes."""
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        if name.endswith('.npz'):
+            path = os.path.join(CACHE_DIR, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue # Evicted by another process in the meantime
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass # Another process removed it first
+        total -= size
+        _memory.pop(os.path.splitext(os.path.basename(path))[0], None)
+
+
+def clear():
+    """Removes every cached result."""
+    _memory.clear()
+    if os.path.exists(CACHE_DIR):
+        evict(0)
+
+
+def _remember(key, result):
+    _memory[key] = result
+    _memory.move_to_end(key)
+    while len(_memory) > MEMORY_ENTRIES:
+        _memory.popitem(last=False)
+
+
+def _load_digest_memo():
+    path = os.path.join(CACHE_DIR, DIGEST_MEMO_FILE)
+    if os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                _digest_memo.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+
+
+def _save_digest_memo():
+    if not CACHE_ENABLED:
+        return
+    if not os.path.exists(CACHE_DIR):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+    # Written under a per-process temporary name and swapped in, so readers (and a crash
+    # mid-write) never see a truncated memo
+    path = os.path.join(CACHE_DIR, DIGEST_MEMO_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(_digest_memo, f)
+    os.replace(tmp_path, path)
+
+# --- HIGH-LEVEL HELPERS ---
+
+def cached(source_digest, compute, **params):
+    """
+    Returns the result of compute() for this input and parameters, from memory,
+    from disk, or by computing (and storing) it. compute() must return a dict of
+    NumPy arrays and/or scalars, or None if it failed (failures are not cached).
+    """
+    if not CACHE_ENABLED:
+        return compute()
+
+    key = make_key(source_digest, **params)
+    result = load(key)
+    if result is None:
+        result = compute()
+        if result is not None:
+            store(key, result)
+    return result
+
+
+def cached_for_file(input_path, compute, **params):
+    """Like cached(), with the key based on the contents of input_path (hashed only if caching is on)."""
+    if not CACHE_ENABLED:
+        return compute()
+    return cached(file_digest(input_path), compute, **params)
+
+
+def read_header(input_path):
+    """Column names of a CSV file (only the first line is read)."""
+    return list(pd.read_csv(input_path, nrows=0).columns)
+
+
+def read_columns(input_path, columns):
+    """
+    Reads the given CSV columns as NumPy arrays. The parsed columns are cached, so
+    downstream scripts analyzing the same file do not run pd.read_csv again.
+    """
+    columns = list(columns)
+
+    def parse():
+        df = pd.read_csv(input_path, usecols=columns)
+        return {name: df[name].values for name in columns}
+
+    return cached_for_file(input_path, parse, analysis='columns', columns=columns)
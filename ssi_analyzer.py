@@ -0,0 +1,348 @@
+import numpy as np
+import pandas as pd
+from scipy.fft import rfft, irfft, next_fast_len
+import os
+import sys
+import profiler
+import report_renderer
+import signal_filter
+import spectral_cache
+import timebase
+
+# --- CONFIGURATION (EDIT THIS) ---
+
+# 1. INPUT / OUTPUT FILES
+# The processed data file (in millimeters) from calibration_converter.py.
+# Unlike (E)-(F) this analysis needs no impact test: it identifies the modes from the
+# ambient (operational) response of all markers together.
+INPUT_CSV_PATH = 'data/processed_vibration_data.csv'
+OUTPUT_MODES_PATH = 'data/ssi_modes.csv'
+
+# 2. CHANNELS
+# None uses every displacement column (each axis of each marker). REFERENCE_CHANNELS
+# are the columns the output correlations are computed against; a few well-placed
+# references keep the correlation matrix small on many-channel records (None = all).
+CHANNELS = None
+REFERENCE_CHANNELS = None
+SKIP_INITIAL_SAMPLES = 50
+
+# 3. PRE-PROCESSING
+# Optional band (low_Hz, high_Hz) applied before the identification. With decimation
+# the block rows below span a longer time window, which helps for low modes.
+FILTER_BAND_HZ = None
+
+# 4. SSI SETTINGS
+# BLOCK_ROWS (i): the block Toeplitz matrix of output correlations uses lags 1 ... 2i-1.
+# i * n_channels must be at least the highest model order / 2, and the lag i / Fs
+# should cover a few periods of the lowest mode of interest.
+BLOCK_ROWS = 40
+MIN_MODEL_ORDER = 2
+MAX_MODEL_ORDER = 40
+ORDER_STEP = 2
+
+# 5. SVD
+# 'randomized': only the leading MAX_MODEL_ORDER singular vectors are computed
+# (randomized range finder), which stays fast on long many-channel records.
+# 'full': exact SVD of the whole block Toeplitz matrix (small problems only).
+SVD_METHOD = 'randomized'
+SVD_OVERSAMPLES = 10
+SVD_POWER_ITERATIONS = 2
+
+# 6. STABILIZATION CRITERIA
+# A pole is 'stable' if a pole of the next lower order has a relative frequency
+# difference below FREQ_TOLERANCE, a relative damping difference below DAMPING_TOLERANCE
+# and a mode shape correlation (MAC) of at least MIN_MAC.
+FREQ_TOLERANCE = 0.01
+DAMPING_TOLERANCE = 0.05
+MIN_MAC = 0.98
+MAX_DAMPING = 0.2          # Poles with higher (or negative) damping are treated as noise
+MIN_STABLE_FRACTION = 0.4  # A mode needs stable poles in at least this fraction of the model orders
+FREQUENCY_RANGE_HZ = (0.1, None) # (min, max); None = Nyquist
+
+# --- CORE FUNCTIONS ---
+
+def output_correlations(signals, max_lag, reference_index):
+    """
+    Output correlation matrices R_k = E[y(t+k) y_ref(t)^T] for k = 0 ... max_lag
+    (unbiased estimate). 'signals' is samples x channels; the result has the shape
+    (max_lag + 1, channels, references).
+    The correlations are computed with zero-padded FFTs, one reference at a time, so the
+    memory stays at one spectrum of the record instead of channels x references of them.
+    """
+    N, l = signals.shape
+    n_fft = next_fast_len(N + max_lag + 1)
+    spectra = rfft(signals, n=n_fft, axis=0)                     # n_freq x l
+    normalization = (N - np.arange(max_lag + 1))[:, None]       # unbiased: overlap length per lag
+
+    R = np.empty((max_lag + 1, l, len(reference_index)))
+    for j, ref in enumerate(reference_index):
+        cross = irfft(spectra * np.conj(spectra[:, ref:ref + 1]), n=n_fft, axis=0)
+        R[:, :, j] = cross[:max_lag + 1] / normalization
+    return R
+
+
+def block_toeplitz(R, block_rows):
+    """
+    Block Toeplitz matrix of the output correlations (the correlation form of the
+    block Hankel matrix of the data):
+
+        T = [[R_i,      R_{i-1},  ..., R_1  ],
+             [R_{i+1},  R_i,      ..., R_2  ],
+             ...
+             [R_{2i-1}, R_{2i-2}, ..., R_i  ]]
+
+    Shape (i * channels) x (i * references).
+    """
+    i = block_rows
+    _, l, r = R.shape
+    lags = i + np.arange(i)[:, None] - np.arange(i)[None, :]    # i x i block lag indices
+    blocks = R[lags]                                             # i x i x l x r
+    return blocks.transpose(0, 2, 1, 3).reshape(i * l, i * r)
+
+
+def randomized_svd(M, rank, oversamples=None, power_iterations=None, seed=0):
+    """
+    Leading 'rank' singular triplets of M with a randomized range finder:
+    M is projected onto rank + oversamples random directions, power iterations
+    sharpen the decay of the spectrum, and the small projected matrix is decomposed exactly.
+    Returns (U, S) - the right singular vectors are not needed for SSI.
+    """
+    oversamples = SVD_OVERSAMPLES if oversamples is None else oversamples
+    power_iterations = SVD_POWER_ITERATIONS if power_iterations is None else power_iterations
+    rng = np.random.default_rng(seed)
+    k = min(rank + oversamples, min(M.shape))
+    Q, _ = np.linalg.qr(M @ rng.standard_normal((M.shape[1], k)))
+    for _ in range(power_iterations):
+        # Re-orthonormalize after every product, otherwise small directions are lost to round-off
+        Q, _ = np.linalg.qr(M.T @ Q)
+        Q, _ = np.linalg.qr(M @ Q)
+    U_small, S, _ = np.linalg.svd(Q.T @ M, full_matrices=False)
+    return (Q @ U_small)[:, :rank], S[:rank]
+
+
+def truncated_svd(M, rank, method=None):
+    """Leading singular vectors/values of M, see SVD_METHOD."""
+    method = SVD_METHOD if method is None else method
+    if method == 'randomized' and rank < min(M.shape):
+        return randomized_svd(M, rank)
+    U, S, _ = np.linalg.svd(M, full_matrices=False)
+    return U[:, :rank], S[:rank]
+
+
+def poles_for_order(U, S, order, n_channels, sample_rate):
+    """
+    Modal parameters of the state-space model of one order:
+    observability matrix O = U_n S_n^1/2, output matrix C = first block row of O,
+    state matrix A from the shift structure of O (least squares).
+    Returns (frequencies_Hz, damping_ratios, mode_shapes[channels x poles]) for the
+    poles with positive imaginary part (one of each complex conjugate pair).
+    """
+    O = U[:, :order] * np.sqrt(S[:order])
+    C = O[:n_channels]
+    A = np.linalg.lstsq(O[:-n_channels], O[n_channels:], rcond=None)[0]
+
+    eigenvalues, eigenvectors = np.linalg.eig(A)
+    keep = eigenvalues.imag > 0
+    mu = np.log(eigenvalues[keep]) * sample_rate                # continuous-time poles
+    frequencies = np.abs(mu) / (2 * np.pi)
+    damping = -mu.real / np.abs(mu)
+    shapes = C @ eigenvectors[:, keep]
+    return frequencies, damping, shapes
+
+
+def mac(phi_a, phi_b):
+    """Modal assurance criterion between the columns of two (complex) mode shape matrices."""
+    numerator = np.abs(np.conj(phi_a).T @ phi_b) ** 2
+    norm_a = np.sum(np.abs(phi_a) ** 2, axis=0)
+    norm_b = np.sum(np.abs(phi_b) ** 2, axis=0)
+    return numerator / np.outer(norm_a, norm_b)
+
+
+def normalize_shape(phi):
+    """Rotates a complex mode shape so its largest component is real and positive, scaled to 1."""
+    largest = phi[np.argmax(np.abs(phi))]
+    return phi / largest
+
+
+def stabilization_diagram(U, S, n_channels, sample_rate, orders):
+    """
+    Poles of every model order, each classified against the previous order:
+    'stable' (frequency, damping and MAC), 'stable_freq' (frequency only) or 'new'.
+    Returns a dict of flat arrays (order, frequency_Hz, damping, status) and the shapes.
+    """
+    f_min, f_max = FREQUENCY_RANGE_HZ
+    f_max = f_max if f_max is not None else sample_rate / 2.0
+
+    table = {'order': [], 'frequency_Hz': [], 'damping': [], 'status': []}
+    shapes = []
+    previous = None
+    for order in orders:
+        freq, zeta, phi = poles_for_order(U, S, order, n_channels, sample_rate)
+        valid = (freq > f_min) & (freq < f_max) & (zeta > 0) & (zeta < MAX_DAMPING)
+        freq, zeta, phi = freq[valid], zeta[valid], phi[:, valid]
+
+        status = np.full(len(freq), 'new', dtype=object)
+        if previous is not None and len(freq) and len(previous[0]):
+            p_freq, p_zeta, p_phi = previous
+            df = np.abs(freq[:, None] - p_freq[None, :]) / freq[:, None]
+            dz = np.abs(zeta[:, None] - p_zeta[None, :]) / zeta[:, None]
+            modal = mac(phi, p_phi)
+            # Closest pole of the previous order (in frequency)
+            nearest = np.argmin(df, axis=1)
+            rows = np.arange(len(freq))
+            freq_ok = df[rows, nearest] < FREQ_TOLERANCE
+            all_ok = freq_ok & (dz[rows, nearest] < DAMPING_TOLERANCE) & (modal[rows, nearest] >= MIN_MAC)
+            status[freq_ok] = 'stable_freq'
+            status[all_ok] = 'stable'
+
+        table['order'].extend([order] * len(freq))
+        table['frequency_Hz'].extend(freq)
+        table['damping'].extend(zeta)
+        table['status'].extend(status)
+        shapes.extend(phi.T)
+        previous = (freq, zeta, phi)
+
+    poles = {key: np.array(values) for key, values in table.items()}
+    poles['shapes'] = np.array(shapes).reshape(len(shapes), n_channels)
+    return poles
+
+
+def select_modes(poles):
+    """
+    Groups the stable poles into physical modes: poles are sorted by frequency and
+    split where neighbours differ by more than 2 * FREQ_TOLERANCE. Groups with stable poles
+    in at least MIN_STABLE_FRACTION of the model orders become modes (median frequency and damping, shape of the
+    highest-order pole, which has the least model bias).
+    """
+    stable = np.flatnonzero(poles['status'] == 'stable')
+    if len(stable) == 0:
+        return []
+    stable = stable[np.argsort(poles['frequency_Hz'][stable])]
+    min_poles = max(int(np.ceil(MIN_STABLE_FRACTION * len(np.unique(poles['order'])))), 2)
+    freq = poles['frequency_Hz'][stable]
+    splits = np.flatnonzero(np.diff(freq) / freq[1:] > 2 * FREQ_TOLERANCE) + 1
+
+    modes = []
+    for group in np.split(stable, splits):
+        if len(group) < min_poles:
+            continue
+        best = group[np.argmax(poles['order'][group])]
+        modes.append({
+            'frequency_Hz': float(np.median(poles['frequency_Hz'][group])),
+            'damping': float(np.median(poles['damping'][group])),
+            'frequency_std_Hz': float(np.std(poles['frequency_Hz'][group])),
+            'n_poles': len(group),
+            'shape': normalize_shape(poles['shapes'][best]),
+        })
+    return modes
+
+
+def write_modes(modes, channels, output_path):
+    """Writes one row per mode: frequency, damping and the (real part of the) normalized shape."""
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    rows = []
+    for n, mode in enumerate(modes, start=1):
+        row = {'mode': n, 'frequency_Hz': mode['frequency_Hz'], 'damping_ratio': mode['damping'],
+               'stable_poles': mode['n_poles']}
+        for column, value in zip(channels, mode['shape']):
+            row[f"shape_{column}"] = value.real
+            row[f"phase_deg_{column}"] = np.degrees(np.angle(value))
+        rows.append(row)
+    pd.DataFrame(rows).to_csv(output_path, index=False)
+
+# --- MAIN ANALYSIS LOGIC ---
+
+def analyze_ssi(input_path, output_path, skip_samples):
+    """
+    Covariance-driven stochastic subspace identification (SSI-COV) of all selected
+    channels: output correlations -> block Toeplitz matrix -> truncated SVD ->
+    poles for every model order -> stabilization diagram -> modes.
+    """
+    if not os.path.exists(input_path):
+        print(f"FATAL ERROR: Processed data file not found at: {input_path}")
+        sys.exit(1)
+
+    header = spectral_cache.read_header(input_path)
+    channels = CHANNELS or [c for c in header if c.startswith('displacement_')]
+    references = REFERENCE_CHANNELS or channels
+    missing = [c for c in channels + references if c not in header]
+    if missing:
+        print(f"FATAL ERROR: Column(s) {missing} not found in {input_path}")
+        sys.exit(1)
+
+    with profiler.stage('read_csv'):
+        columns = spectral_cache.read_columns(input_path, ['time_s'] + channels)
+
+    time_s = columns['time_s'][skip_samples:]
+    signals = np.column_stack([columns[c][skip_samples:] for c in channels]) # samples x channels
+
+    gaps = timebase.detect_gaps(time_s)
+    T = gaps['dt'] if gaps['has_gaps'] else np.mean(np.diff(time_s))
+    Fs = 1.0 / T
+    n_channels = len(channels)
+    reference_index = [channels.index(c) for c in references]
+
+    i = BLOCK_ROWS
+    max_order = min(MAX_MODEL_ORDER, i * len(references))
+    if max_order < MAX_MODEL_ORDER:
+        print(f"WARNING: Block Toeplitz matrix supports model orders up to {max_order} only (increase BLOCK_ROWS).")
+
+    def identify():
+        data, sample_rate = signals, Fs
+        if gaps['has_gaps']:
+            print(f"WARNING: {len(gaps['gap_indices'])} gap(s) in the time axis, resampling to a uniform grid.")
+            _, data, _ = timebase.resample_uniform(time_s, signals, T)
+        if FILTER_BAND_HZ is not None:
+            _, data, sample_rate = signal_filter.filter_and_decimate(
+                np.arange(len(data)) / sample_rate, data, sample_rate, FILTER_BAND_HZ
+            )
+        data = data - data.mean(axis=0)
+
+        with profiler.stage('correlation'):
+            R = output_correlations(data, 2 * i - 1, reference_index)
+            toeplitz = block_toeplitz(R, i)
+        with profiler.stage('svd'):
+            U, S = truncated_svd(toeplitz, max_order)
+        return {'U': U, 'S': S, 'Fs': np.array(sample_rate)}
+
+    with profiler.stage('ssi'):
+        decomposition = spectral_cache.cached_for_file(
+            input_path, identify,
+            analysis='ssi_cov', columns=channels, references=references, skip_samples=skip_samples,
+            block_rows=i, max_order=max_order, band=FILTER_BAND_HZ, svd=SVD_METHOD
+        )
+    profiler.add_items('ssi', signals.size)
+    U, S, Fs = decomposition['U'], decomposition['S'], float(decomposition['Fs'])
+
+    orders = range(MIN_MODEL_ORDER, max_order + 1, ORDER_STEP)
+    with profiler.stage('poles'):
+        poles = stabilization_diagram(U, S, n_channels, Fs, orders)
+        modes = select_modes(poles)
+
+    print(f"\n--- SSI-COV Parameters ---")
+    print(f"Channels: {n_channels} ({len(references)} reference), Samples: {len(signals)}, Fs: {Fs:.2f} Hz")
+    print(f"Block rows: {i} (lags up to {(2 * i - 1) / Fs:.2f} s), Model orders: {orders.start}-{orders.stop - 1}")
+
+    print(f"\n--- Identified Modes ({len(modes)}) ---")
+    for n, mode in enumerate(modes, start=1):
+        print(f"Mode {n}: f = {mode['frequency_Hz']:.3f} Hz (std {mode['frequency_std_Hz']:.4f}), "
+              f"zeta = {mode['damping']:.4f}, stable poles: {mode['n_poles']}")
+        shape = "  ".join(f"{c}: {v.real:+.3f}" for c, v in zip(channels, mode['shape']))
+        print(f"        shape  {shape}")
+
+    write_modes(modes, channels, output_path)
+    print(f"\nModes saved to: {output_path}")
+
+    report_renderer.show_or_export(
+        'ssi_stabilization', report_renderer.draw_stabilization_diagram,
+        (poles, modes, S, Fs),
+        summary={f"mode {n} (Hz / zeta)": f"{m['frequency_Hz']:.3f} / {m['damping']:.4f}"
+                 for n, m in enumerate(modes, start=1)}
+    )
+    return {'modes': modes, 'poles': poles, 'singular_values': S, 'Fs': Fs, 'channels': channels}
+
+if __name__ == "__main__":
+    analyze_ssi(INPUT_CSV_PATH, OUTPUT_MODES_PATH, SKIP_INITIAL_SAMPLES)
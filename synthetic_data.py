@@ -0,0 +1,471 @@
+import cv2
+import numpy as np
+import pandas as pd
+import os
+import time
+import sensor_fusion
+
+# --- CONFIGURATION (EDIT THIS) ---
+
+# 1. OUTPUT FILE PATHS
+OUTPUT_VIDEO_PATH = 'data/synthetic_markers.avi'
+OUTPUT_SIGNAL_CSV_PATH = 'data/synthetic_displacement_mm.csv'
+
+# 2. GROUND TRUTH OF THE SIMULATED STRUCTURE
+# Each mode is (natural frequency in Hz, damping ratio zeta, amplitude, phase in radians)
+SYNTHETIC_MODES = [(5.0, 0.01, 1.0, 0.0)]
+
+# 3. SIGNAL SETTINGS
+SAMPLE_RATE_HZ = 90.0
+NUMBER_OF_SAMPLES = 1000
+NOISE_STD = 0.002 # Standard deviation of the white measurement noise (same unit as amplitude)
+
+# 4. VIDEO SETTINGS
+NUMBER_OF_MARKERS = 2
+FRAME_SIZE = (640, 480) # (width, height) in pixels
+MARKER_AMPLITUDE_PX = 6.0 # Peak displacement of the largest marker in pixels
+MARKER_SIZE_PX = 24 # Side length of the square ROI around each marker
+
+# 5. LIVE (STAND-IN CAMERA) SETTINGS
+# The live source repeats the free decay every LIVE_REPEAT_S seconds, like a structure
+# that is hit periodically, so it can run for as long as the live tracker needs.
+LIVE_REPEAT_S = 10.0
+
+# 6. INTERMEDIATE FILES WITHOUT VIDEO
+# Tracker output (frame_index, time_s, x/y_pixel_M*), processed displacement (mm) and
+# accelerometer logs are generated directly from the modal model, so the converter,
+# the analyzers and the benchmarks can run on records of any length. Long files are
+# generated and written in chunks of CHUNK_ROWS rows (constant memory).
+OUTPUT_PIXEL_CSV_PATH = 'data/synthetic_pixel_positions.csv'
+OUTPUT_ACCEL_CSV_PATH = 'data/synthetic_accelerometer.csv'
+CHUNK_ROWS = 1_000_000
+
+# 7. PIXEL TRACK SETTINGS
+# The mode amplitudes above are in mm here; markers follow the bending mode shapes
+# sin(k * pi * x / L) of a beam spanning the frame (mode k = 1, 2, ...).
+PIXELS_PER_MM = 4.0           # 40 px per 10 mm, as in calibrationconverter2.py
+RELEASE_TIME_S = 5.0          # The structure is at rest until it is released (450 frames at 90 fps)
+TRACK_NOISE_PX = 0.05         # Tracking jitter (standard deviation)
+QUANTIZATION_PX = 0.0         # Output resolution, e.g. 1.0 for whole pixels like raw_pixel_positions1.csv; 0 = none
+DROPOUT_RATE = 0.0            # Fraction of frames missing from the tracks (dropped frames / tracking failures)
+DROPOUT_BURST_FRAMES = 3      # Mean length of one run of missing frames
+
+# 8. ACCELEROMETER SETTINGS
+ACCEL_SAMPLE_RATE_HZ = 400.0
+ACCEL_MARKER = 1              # The accelerometer sits at this marker
+ACCEL_NOISE_G = 0.002
+ACCEL_RESOLUTION_G = 0.0001   # ADC step (quantization); 0 = none
+ACCEL_LAYOUT = 'arduino'      # 'arduino': quoted "counter, g" log; 'table': Time,Acceleration columns in g
+
+# 9. 'IDEAL' FILES OF THE SECOND SCRIPT SET
+# calibrationconverter2.py -> vibrationanalyzer2.py (78 % of THEORETICAL_FN = 25 Hz, i.e. a
+# 19.5 Hz response) and modeshapeanalyzer2.py. calibrationconverter2.py subtracts fixed rest
+# positions (Y_REST_D1, Y_REST_D2) and counts displacement positive UP (-delta Y-pixel), so
+# the pixel file is generated with those rest positions and that sign.
+IDEAL_PIXEL_CSV_PATH = 'data/ideal_pixel_positions_78_percent.csv'
+IDEAL_DISPLACEMENT_CSV_PATH = 'data/ideal_displacement_mm.csv'
+IDEAL_ANALYSIS_CONFIG_PATH = 'data/analysis_config.txt'
+IDEAL_MODES = [(19.5, 0.01, 1.0, 0.0)]
+IDEAL_REST_Y_PX = (327.0, 318.0)
+
+# --- CORE FUNCTIONS ---
+
+def modal_coordinates(time_s, modes, derivative=0):
+    """
+    Free decay of every mode, A_k * exp(-zeta_k*w_k*t) * sin(w_d,k*t + phi_k), as an array
+    (samples x modes) computed in one broadcast operation. derivative=2 returns the exact
+    second time derivative (acceleration) instead.
+    """
+    time_s = np.asarray(time_s, dtype=float)[:, None]
+    f_n, zeta, amplitude, phase = (np.array(column, dtype=float)[None, :] for column in zip(*modes))
+    omega_n = 2 * np.pi * f_n
+    sigma = zeta * omega_n                      # Decay rate
+    omega_d = omega_n * np.sqrt(1.0 - zeta**2)  # Damped natural frequency
+    envelope = amplitude * np.exp(-sigma * time_s)
+    angle = omega_d * time_s + phase
+    if derivative == 0:
+        return envelope * np.sin(angle)
+    if derivative == 2:
+        return envelope * ((sigma**2 - omega_d**2) * np.sin(angle) - 2 * sigma * omega_d * np.cos(angle))
+    raise ValueError(f"Unsupported derivative order: {derivative}")
+
+
+def damped_modes(time_s, modes):
+    """
+    Returns the free decay response sum_k A_k * exp(-zeta_k*w_k*t) * sin(w_d,k*t + phi_k)
+    for the given modes, evaluated on the time array (fully vectorized over time).
+    """
+    return modal_coordinates(time_s, modes).sum(axis=1)
+
+
+def synthetic_displacement(n_samples, sample_rate, modes, noise_std=0.0, seed=0):
+    """
+    Generates a noisy free-decay displacement record with known modal parameters.
+    Returns (time_s, displacement).
+    """
+    rng = np.random.default_rng(seed)
+    time_s = np.arange(n_samples) / sample_rate
+    displacement = damped_modes(time_s, modes)
+    if noise_std > 0:
+        displacement += rng.normal(0.0, noise_std, n_samples)
+    return time_s, displacement
+
+
+def marker_layout(n_markers, frame_size, marker_size):
+    """
+    Places the markers evenly along a horizontal "beam" in the middle of the frame.
+    Returns the rest positions (x, y) as float arrays and the tracker ROIs (x, y, w, h).
+    """
+    width, height = frame_size
+    x_rest = (np.arange(n_markers) + 1) * width / (n_markers + 1)
+    y_rest = np.full(n_markers, height / 2.0)
+    half = marker_size // 2
+    rois = [(int(round(x)) - half, int(round(y)) - half, marker_size, marker_size)
+            for x, y in zip(x_rest, y_rest)]
+    return x_rest, y_rest, rois
+
+
+def marker_trajectories(n_frames, frame_rate, n_markers, modes, amplitude_px, frame_size):
+    """
+    Returns the ground truth marker centers as an array (n_frames, n_markers) of Y-pixels.
+    The markers follow a first bending mode shape sin(pi * x / L), so the center
+    marker moves the most, and the image Y axis points down as in the real videos.
+    """
+    x_rest, y_rest, _ = marker_layout(n_markers, frame_size, MARKER_SIZE_PX)
+    time_s = np.arange(n_frames) / frame_rate
+    response = damped_modes(time_s, modes)
+    response /= max(np.max(np.abs(response)), 1e-12)
+    mode_shape = np.sin(np.pi * x_rest / frame_size[0])
+    return y_rest[None, :] - amplitude_px * response[:, None] * mode_shape[None, :]
+
+
+def beam_mode_shapes(n_modes, n_markers, frame_size=None):
+    """Mode shapes (modes x markers): sin(k * pi * x / L) at the marker rest positions, k = 1 ... n_modes."""
+    frame_size = FRAME_SIZE if frame_size is None else frame_size
+    x_rest, _, _ = marker_layout(n_markers, frame_size, MARKER_SIZE_PX)
+    k = np.arange(1, n_modes + 1)[:, None]
+    return np.sin(k * np.pi * x_rest[None, :] / frame_size[0])
+
+
+def structure_response(time_s, modes, n_markers, release_s=0.0, derivative=0, frame_size=None):
+    """
+    Displacement (or acceleration, derivative=2) of every marker (samples x markers):
+    modal coordinates times the beam mode shapes. The structure rests until release_s.
+    """
+    frame_size = FRAME_SIZE if frame_size is None else frame_size
+    time_s = np.asarray(time_s, dtype=float)
+    since_release = time_s - release_s
+    response = modal_coordinates(np.maximum(since_release, 0.0), modes, derivative) @ beam_mode_shapes(len(modes), n_markers, frame_size)
+    response[since_release < 0] = 0.0
+    return response
+
+
+def quantize(values, step):
+    """Rounds to multiples of step (sensor/tracker resolution); step 0 leaves the values unchanged."""
+    return np.round(values / step) * step if step > 0 else values
+
+
+def dropout_mask(n_samples, rate, burst_length, rng):
+    """
+    Boolean mask of the samples that are kept. About 'rate' of all samples are removed,
+    in runs with a geometric length distribution (mean burst_length), like frames lost
+    in bursts by a camera or tracker. Vectorized: run starts and ends are marked and
+    accumulated with one cumulative sum.
+    """
+    if rate <= 0 or n_samples == 0:
+        return np.ones(n_samples, dtype=bool)
+    starts = np.flatnonzero(rng.random(n_samples) < rate / max(burst_length, 1))
+    lengths = rng.geometric(1.0 / max(burst_length, 1), len(starts))
+    events = np.zeros(n_samples + 1, dtype=np.int64)
+    np.add.at(events, starts, 1)
+    np.add.at(events, np.minimum(starts + lengths, n_samples), -1)
+    return np.cumsum(events[:-1]) == 0
+
+
+def pixel_tracks(frame_index, frame_rate, modes, n_markers=None, pixels_per_mm=None,
+                 release_s=None, noise_px=None, quantization_px=None,
+                 dropout_rate=None, dropout_burst=None, frame_size=None, rest_y_px=None, upward=False, rng=None):
+    """
+    Tracker output for the given frame indices as a dict of columns, in the layout of
+    vision_tracker.py (frame_index, time_s, x_pixel_M*, y_pixel_M*). Missing frames
+    (dropouts) are left out, like frames where tracking failed.
+    rest_y_px overrides the rest Y-pixel of every marker (default: marker_layout).
+    upward=True moves the markers up the image for positive displacement, the convention
+    of calibrationconverter2.py; the default (down) is that of calibration_converter.py.
+    """
+    n_markers = NUMBER_OF_MARKERS if n_markers is None else n_markers
+    pixels_per_mm = PIXELS_PER_MM if pixels_per_mm is None else pixels_per_mm
+    release_s = RELEASE_TIME_S if release_s is None else release_s
+    noise_px = TRACK_NOISE_PX if noise_px is None else noise_px
+    quantization_px = QUANTIZATION_PX if quantization_px is None else quantization_px
+    dropout_rate = DROPOUT_RATE if dropout_rate is None else dropout_rate
+    dropout_burst = DROPOUT_BURST_FRAMES if dropout_burst is None else dropout_burst
+    frame_size = FRAME_SIZE if frame_size is None else frame_size
+    rng = rng if rng is not None else np.random.default_rng(0)
+    frame_index = np.asarray(frame_index)
+    time_s = frame_index / frame_rate
+    x_rest, y_rest, _ = marker_layout(n_markers, frame_size, MARKER_SIZE_PX)
+    if rest_y_px is not None:
+        y_rest = np.asarray(rest_y_px, dtype=float)
+
+    # calibration_converter.py takes displacement = +delta Y-pixel (image Y axis points down),
+    # so converting these tracks reproduces displacement_tracks() exactly
+    sign = -1.0 if upward else 1.0
+    y_px = y_rest[None, :] + sign * structure_response(time_s, modes, n_markers, release_s, frame_size=frame_size) * pixels_per_mm
+    x_px = np.broadcast_to(x_rest[None, :], y_px.shape).copy()
+    if noise_px > 0:
+        y_px += rng.normal(0.0, noise_px, y_px.shape)
+        x_px += rng.normal(0.0, noise_px, x_px.shape)
+    y_px, x_px = quantize(y_px, quantization_px), quantize(x_px, quantization_px)
+
+    keep = dropout_mask(len(frame_index), dropout_rate, dropout_burst, rng)
+    columns = {'frame_index': frame_index[keep], 'time_s': time_s[keep]}
+    for i in range(n_markers):
+        columns[f'x_pixel_M{i + 1}'] = x_px[keep, i]
+    for i in range(n_markers):
+        columns[f'y_pixel_M{i + 1}'] = y_px[keep, i]
+    return columns
+
+
+def displacement_tracks(sample_index, sample_rate, modes, n_markers=None, release_s=None,
+                        noise_mm=None, frame_size=None, rng=None):
+    """Processed displacement (calibration_converter.py layout: time_s, displacement_M*_mm) as a dict of columns."""
+    n_markers = NUMBER_OF_MARKERS if n_markers is None else n_markers
+    release_s = RELEASE_TIME_S if release_s is None else release_s
+    noise_mm = TRACK_NOISE_PX / PIXELS_PER_MM if noise_mm is None else noise_mm
+    frame_size = FRAME_SIZE if frame_size is None else frame_size
+    rng = rng if rng is not None else np.random.default_rng(0)
+    time_s = np.asarray(sample_index) / sample_rate
+    displacement = structure_response(time_s, modes, n_markers, release_s, frame_size=frame_size)
+    if noise_mm > 0:
+        displacement += rng.normal(0.0, noise_mm, displacement.shape)
+    columns = {'time_s': time_s}
+    for i in range(n_markers):
+        columns[f'displacement_M{i + 1}_mm'] = displacement[:, i]
+    return columns
+
+
+def accelerometer_stream(sample_index, sample_rate, modes, n_markers=None, marker=None,
+                         release_s=None, noise_g=None, resolution_g=None,
+                         frame_size=None, rng=None):
+    """
+    Accelerometer at one marker, in g: the exact second derivative of the marker
+    displacement (mm) plus noise, quantized to the ADC step. Returns (time_s, acceleration_g).
+    """
+    n_markers = NUMBER_OF_MARKERS if n_markers is None else n_markers
+    marker = ACCEL_MARKER if marker is None else marker
+    release_s = RELEASE_TIME_S if release_s is None else release_s
+    noise_g = ACCEL_NOISE_G if noise_g is None else noise_g
+    resolution_g = ACCEL_RESOLUTION_G if resolution_g is None else resolution_g
+    frame_size = FRAME_SIZE if frame_size is None else frame_size
+    rng = rng if rng is not None else np.random.default_rng(0)
+    time_s = np.asarray(sample_index) / sample_rate
+    accel_mm_s2 = structure_response(time_s, modes, n_markers, release_s, derivative=2, frame_size=frame_size)[:, marker - 1]
+    accel_g = accel_mm_s2 / sensor_fusion.G_TO_MM_S2
+    if noise_g > 0:
+        accel_g = accel_g + rng.normal(0.0, noise_g, len(accel_g))
+    return time_s, quantize(accel_g, resolution_g)
+
+# --- WRITERS (INTERMEDIATE FORMATS) ---
+
+def write_in_chunks(path, n_rows, make_chunk, chunk_rows=None, seed=0):
+    """
+    Writes a CSV file chunk by chunk: make_chunk(indices, rng) returns a dict of columns
+    for the row indices of one chunk. Every chunk has its own random stream derived from
+    (seed, chunk number), so the file does not depend on the memory available.
+    Returns the number of rows written (dropouts make it smaller than n_rows).
+    """
+    chunk_rows = CHUNK_ROWS if chunk_rows is None else chunk_rows
+    output_dir = os.path.dirname(path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    rows = 0
+    for number, start in enumerate(range(0, n_rows, chunk_rows)):
+        indices = np.arange(start, min(start + chunk_rows, n_rows))
+        chunk = pd.DataFrame(make_chunk(indices, np.random.default_rng([seed, number])))
+        chunk.to_csv(path, mode='w' if number == 0 else 'a', header=(number == 0), index=False)
+        rows += len(chunk)
+    return rows
+
+
+def write_pixel_csv(path, n_frames, frame_rate, modes, seed=0, **options):
+    """Writes tracker output (see pixel_tracks; options are passed on). Returns the number of rows."""
+    return write_in_chunks(path, n_frames, lambda i, rng: pixel_tracks(i, frame_rate, modes, rng=rng, **options), seed=seed)
+
+
+def write_displacement_csv(path, n_samples, sample_rate, modes, seed=0, **options):
+    """Writes processed displacement in mm (see displacement_tracks). Returns the number of rows."""
+    return write_in_chunks(path, n_samples, lambda i, rng: displacement_tracks(i, sample_rate, modes, rng=rng, **options), seed=seed)
+
+
+def write_accelerometer_csv(path, n_samples, sample_rate, modes, layout=None, seed=0, **options):
+    """
+    Writes an accelerometer log readable by sensor_fusion.load_accelerometer:
+    'arduino' - the quoted "counter, g" lines of the Arduino logger, 'table' - Time,Acceleration (g).
+    """
+    layout = ACCEL_LAYOUT if layout is None else layout
+    if layout == 'table':
+        def table(indices, rng):
+            time_s, accel_g = accelerometer_stream(indices, sample_rate, modes, rng=rng, **options)
+            return {'Time': time_s, 'Acceleration': accel_g}
+        return write_in_chunks(path, n_samples, table, seed=seed)
+
+    output_dir = os.path.dirname(path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(path, 'w') as f:
+        f.write('"e, g"\n')
+        for number, start in enumerate(range(0, n_samples, CHUNK_ROWS)):
+            indices = np.arange(start, min(start + CHUNK_ROWS, n_samples))
+            _, accel_g = accelerometer_stream(indices, sample_rate, modes, rng=np.random.default_rng([seed, number]), **options)
+            # The whole chunk is formatted by one %-operation (no per-row Python loop or f-string)
+            values = np.empty(2 * len(indices), dtype=object)
+            values[0::2], values[1::2] = indices.tolist(), np.asarray(accel_g).tolist()
+            f.write(('"%d, %.4f"\n' * len(indices)) % tuple(values))
+    return n_samples
+
+
+def write_analysis_config(path, f_n, sample_rate, skip_samples):
+    """Writes the key=value file read by modeshapeanalyzer2.py (same format as vibrationanalyzer2.py)."""
+    with open(path, 'w') as f:
+        f.write(f"f_n={f_n}\n")
+        f.write(f"Fs={sample_rate}\n")
+        f.write(f"skip_samples={skip_samples}\n")
+
+
+def render_frame(background, x_centers, y_centers, marker_size):
+    """
+    Draws each marker as a dark Gaussian dot with a bright ring at a sub-pixel
+    position on a copy of the background (grayscale uint8).
+    """
+    frame = background.astype(np.float32)
+    radius = marker_size // 2 + 4
+    offsets = np.arange(-radius, radius + 1)
+    sigma = marker_size / 6.0
+    for x_c, y_c in zip(x_centers, y_centers):
+        x0, y0 = int(round(x_c)), int(round(y_c))
+        dx = (x0 + offsets)[None, :] - x_c
+        dy = (y0 + offsets)[:, None] - y_c
+        r2 = (dx**2 + dy**2) / (2 * sigma**2)
+        patch = 40.0 * np.exp(-r2 / 9.0) - 180.0 * np.exp(-r2)
+        rows = slice(max(y0 - radius, 0), min(y0 + radius + 1, frame.shape[0]))
+        cols = slice(max(x0 - radius, 0), min(x0 + radius + 1, frame.shape[1]))
+        frame[rows, cols] += patch[rows.start - (y0 - radius):rows.stop - (y0 - radius),
+                                   cols.start - (x0 - radius):cols.stop - (x0 - radius)]
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def write_synthetic_video(video_path, n_frames, frame_rate, n_markers, modes,
+                          amplitude_px=None, frame_size=None,
+                          noise_std=2.0, seed=0):
+    """
+    Writes a grayscale MJPG video of moving markers with known motion.
+    Returns (truth_y, rois): the ground truth Y-pixel centers (n_frames, n_markers)
+    and the ROIs of the markers in the first frame (to initialize the trackers).
+    """
+    amplitude_px = MARKER_AMPLITUDE_PX if amplitude_px is None else amplitude_px
+    frame_size = FRAME_SIZE if frame_size is None else frame_size
+    output_dir = os.path.dirname(video_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    rng = np.random.default_rng(seed)
+    width, height = frame_size
+    x_rest, _, rois = marker_layout(n_markers, frame_size, MARKER_SIZE_PX)
+    truth_y = marker_trajectories(n_frames, frame_rate, n_markers, modes, amplitude_px, frame_size)
+
+    # Smooth background texture, the same for every frame
+    background = np.full((height, width), 200.0) + rng.normal(0.0, 4.0, (height, width))
+
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'MJPG'), frame_rate, (width, height), False)
+    if not writer.isOpened():
+        raise IOError(f"Could not open video writer for: {video_path}")
+
+    for i in range(n_frames):
+        frame = render_frame(background, x_rest, truth_y[i], MARKER_SIZE_PX)
+        if noise_std > 0:
+            frame = np.clip(frame + rng.normal(0.0, noise_std, frame.shape), 0, 255).astype(np.uint8)
+        writer.write(frame)
+    writer.release()
+
+    return truth_y, rois
+
+
+def live_frame_source(frame_rate, n_markers, modes, amplitude_px=None,
+                      frame_size=None, noise_std=2.0, seed=0, realtime=True):
+    """
+    Stand-in for a camera: returns (read, rois, truth), where read() behaves like
+    cv2.VideoCapture.read() and returns (True, BGR frame) rendered on the fly.
+    With realtime=True read() waits for the next frame period and, like a camera,
+    skips the frames whose time has already passed when the caller is too slow.
+    truth(frame_index) gives the true Y-pixel centers of the markers in that frame.
+    """
+    amplitude_px = MARKER_AMPLITUDE_PX if amplitude_px is None else amplitude_px
+    frame_size = FRAME_SIZE if frame_size is None else frame_size
+    rng = np.random.default_rng(seed)
+    width, height = frame_size
+    x_rest, y_rest, rois = marker_layout(n_markers, frame_size, MARKER_SIZE_PX)
+    background = np.full((height, width), 200.0) + rng.normal(0.0, 4.0, (height, width))
+    mode_shape = np.sin(np.pi * x_rest / width)
+    peak = max(sum(abs(mode[2]) for mode in modes), 1e-12)
+    state = {'next_index': 0, 'start': None}
+
+    def truth(frame_index):
+        t = np.array([(frame_index / frame_rate) % LIVE_REPEAT_S])
+        return y_rest - amplitude_px * damped_modes(t, modes)[0] / peak * mode_shape
+
+    def read():
+        if realtime:
+            if state['start'] is None:
+                state['start'] = time.perf_counter()
+            due = state['start'] + state['next_index'] / frame_rate
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Frames whose exposure time has passed are lost, as with a real sensor
+                state['next_index'] = max(state['next_index'],
+                                          int((time.perf_counter() - state['start']) * frame_rate))
+        index = state['next_index']
+        state['next_index'] += 1
+        frame = render_frame(background, x_rest, truth(index), MARKER_SIZE_PX)
+        if noise_std > 0:
+            frame = np.clip(frame + rng.normal(0.0, noise_std, frame.shape), 0, 255).astype(np.uint8)
+        read.last_index = index
+        return True, cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+
+    read.last_index = -1
+    return read, rois, truth
+
+
+if __name__ == "__main__":
+    if not os.path.exists('data'):
+        os.makedirs('data')
+
+    time_s, displacement = synthetic_displacement(NUMBER_OF_SAMPLES, SAMPLE_RATE_HZ, SYNTHETIC_MODES, NOISE_STD)
+    np.savetxt(OUTPUT_SIGNAL_CSV_PATH, np.column_stack([time_s, displacement]), delimiter=',',
+               header='time_s,displacement_M1_mm', comments='')
+    print(f"Synthetic displacement ({NUMBER_OF_SAMPLES} samples) saved to: {OUTPUT_SIGNAL_CSV_PATH}")
+
+    truth_y, rois = write_synthetic_video(OUTPUT_VIDEO_PATH, NUMBER_OF_SAMPLES, SAMPLE_RATE_HZ,
+                                          NUMBER_OF_MARKERS, SYNTHETIC_MODES)
+    print(f"Synthetic video ({NUMBER_OF_SAMPLES} frames, {NUMBER_OF_MARKERS} markers) saved to: {OUTPUT_VIDEO_PATH}")
+    print(f"Marker ROIs in the first frame (x, y, w, h): {rois}")
+
+    rows = write_pixel_csv(OUTPUT_PIXEL_CSV_PATH, NUMBER_OF_SAMPLES, SAMPLE_RATE_HZ, SYNTHETIC_MODES)
+    print(f"Synthetic tracker output ({rows} frames) saved to: {OUTPUT_PIXEL_CSV_PATH}")
+
+    # The 'ideal' files of calibrationconverter2.py / vibrationanalyzer2.py / modeshapeanalyzer2.py
+    rows = write_pixel_csv(IDEAL_PIXEL_CSV_PATH, NUMBER_OF_SAMPLES, SAMPLE_RATE_HZ, IDEAL_MODES,
+                           n_markers=len(IDEAL_REST_Y_PX), rest_y_px=IDEAL_REST_Y_PX, upward=True)
+    print(f"Ideal tracker output ({rows} frames, {IDEAL_MODES[0][0]} Hz) saved to: {IDEAL_PIXEL_CSV_PATH}")
+    write_displacement_csv(IDEAL_DISPLACEMENT_CSV_PATH, NUMBER_OF_SAMPLES, SAMPLE_RATE_HZ, IDEAL_MODES,
+                           n_markers=len(IDEAL_REST_Y_PX))
+    write_analysis_config(IDEAL_ANALYSIS_CONFIG_PATH, IDEAL_MODES[0][0], SAMPLE_RATE_HZ,
+                          int(RELEASE_TIME_S * SAMPLE_RATE_HZ))
+    print(f"Ideal displacement ({len(IDEAL_REST_Y_PX)} markers) saved to: {IDEAL_DISPLACEMENT_CSV_PATH}")
+
+    n_accel = int(NUMBER_OF_SAMPLES / SAMPLE_RATE_HZ * ACCEL_SAMPLE_RATE_HZ)
+    write_accelerometer_csv(OUTPUT_ACCEL_CSV_PATH, n_accel, ACCEL_SAMPLE_RATE_HZ, SYNTHETIC_MODES)
+    print(f"Synthetic accelerometer log ({n_accel} samples, {ACCEL_LAYOUT}) saved to: {OUTPUT_ACCEL_CSV_PATH}")
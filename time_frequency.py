@@ -0,0 +1,343 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.fft import fft, ifft, rfft, rfftfreq, fftfreq, next_fast_len
+from scipy.ndimage import uniform_filter1d
+from scipy.signal import hilbert, savgol_filter
+import os
+import sys
+import profiler
+import report_renderer
+import signal_filter
+import spectral_cache
+import timebase
+
+# --- CONFIGURATION (EDIT THIS) ---
+
+# 1. INPUT / OUTPUT FILES
+# The processed data file (in millimeters) from calibration_converter.py. The record
+# should contain a free decay (impact test), like the input of damping_calculator.py.
+INPUT_CSV_PATH = 'data/processed_vibration_data.csv'
+OUTPUT_TRACKS_PATH = 'data/time_frequency_tracks.csv'   # f(t), A(t), zeta(t) per method and channel
+OUTPUT_CURVES_PATH = 'data/amplitude_curves.csv'        # f(A) and zeta(A) per method and channel
+
+# 2. CHANNELS
+# None analyzes every displacement column; all channels are processed together.
+CHANNELS = None
+SKIP_INITIAL_SAMPLES = 50
+
+# 3. METHODS
+# 'hilbert': band-pass + analytic signal, instantaneous frequency/amplitude per sample.
+# 'cwt'    : Morlet wavelet transform, ridge (strongest scale) per sample.
+# 'stft'   : short-time Fourier transform (spectrogram), ridge per frame.
+# A single FFT averages over the whole decay; these follow the frequency as the amplitude
+# decays, which shows softening/stiffening of cracked or bolted joints.
+METHODS = ['hilbert', 'cwt', 'stft']
+
+# 4. FREQUENCY BAND OF THE MODE
+# None: band around the dominant frequency of all channels (signal_filter.band_around_mode).
+FREQUENCY_BAND_HZ = None
+
+# 5. METHOD SETTINGS
+INSTANTANEOUS_SMOOTHING_CYCLES = 2.0 # Moving average of the Hilbert frequency (removes noise ripple)
+CWT_CYCLES = 6.0                     # Morlet width: higher = finer frequency, coarser time resolution
+CWT_VOICES = 48                      # Number of wavelet frequencies across the band
+STFT_WINDOW_CYCLES = 8.0             # STFT window length in periods of the band center
+STFT_HOP_FRACTION = 0.1              # Frame step as a fraction of the window
+STFT_ZERO_PADDING = 4                # FFT length = window x this (finer ridge interpolation)
+
+# 6. OUTPUT SAMPLING AND DAMPING
+# The per-sample tracks are reduced to OUTPUT_RATE_HZ. zeta(t) is the slope of ln A(t) over
+# ZETA_WINDOW_CYCLES periods: zeta = -d(ln A)/dt / (2 pi f). Samples before the largest
+# amplitude, and below AMPLITUDE_FLOOR_FRACTION of it, are not used for the curves.
+OUTPUT_RATE_HZ = 20.0
+ZETA_WINDOW_CYCLES = 5.0
+AMPLITUDE_FLOOR_FRACTION = 0.02
+AMPLITUDE_BINS = 20
+
+# 7. CHUNKING
+# Long records are processed in chunks of this many samples (plus PAD_CYCLES periods of the
+# lower band edge on both sides, which are discarded), so the wavelet transform needs bounded
+# memory. The band-pass settles within ~7 periods, but the Hilbert transform's edge error only
+# decays with 1/distance, so it sets the padding. On a 5 Hz decay at 200 Hz cut into 4096-sample
+# chunks, the smoothed Hilbert frequency differed from the whole-record one by up to 0.019 Hz
+# with 10 periods, 0.007 Hz with 20 and 0.0005 Hz with 40 (above 2 % of the peak amplitude);
+# amplitudes by < 1 %. The wavelet and STFT ridges already agree to 1e-7 Hz with 10 periods.
+CHUNK_SAMPLES = 2**16
+PAD_CYCLES = 40.0
+
+# --- HELPERS ---
+
+def dominant_frequency(signals, sample_rate):
+    """Peak of the summed power spectrum of all channels (the mode most channels share)."""
+    spectrum = np.abs(rfft(signals - signals.mean(axis=0), axis=0)) ** 2
+    xf = rfftfreq(len(signals), 1.0 / sample_rate)
+    return xf[np.argmax(spectrum[1:].sum(axis=1)) + 1]
+
+
+def process_in_chunks(signals, chunk_samples, pad_samples, func):
+    """
+    Applies func(block) -> tuple of (samples x channels) arrays to overlapping blocks and
+    stitches the cores together. The padding on both sides absorbs the edge effects of
+    filtering, the Hilbert transform and the wavelets; the result is close to, not identical
+    with, one block over the whole record (see PAD_CYCLES for the measured differences).
+    """
+    n = len(signals)
+    outputs = None
+    for start in range(0, n, chunk_samples):
+        stop = min(start + chunk_samples, n)
+        lo, hi = max(start - pad_samples, 0), min(stop + pad_samples, n)
+        results = func(signals[lo:hi])
+        if outputs is None:
+            outputs = [np.empty((n,) + r.shape[1:], dtype=r.dtype) for r in results]
+        for output, result in zip(outputs, results):
+            output[start:stop] = result[start - lo:stop - lo]
+    return outputs
+
+
+def parabolic_peak(magnitude, index, axis_values):
+    """
+    Refines the ridge position between grid points with a parabola through the peak
+    and its two neighbours (magnitude: ... x bins, index: ... best bin).
+    Returns (interpolated axis value, interpolated peak magnitude).
+    """
+    n_bins = magnitude.shape[-1]
+    index = np.clip(index, 1, n_bins - 2)
+    a = np.take_along_axis(magnitude, (index - 1)[..., None], -1)[..., 0]
+    b = np.take_along_axis(magnitude, index[..., None], -1)[..., 0]
+    c = np.take_along_axis(magnitude, (index + 1)[..., None], -1)[..., 0]
+    denominator = a - 2 * b + c
+    shift = np.where(denominator < 0, 0.5 * (a - c) / np.where(denominator < 0, denominator, 1.0), 0.0)
+    shift = np.clip(shift, -0.5, 0.5)
+    position = np.interp(index + shift, np.arange(n_bins), axis_values)
+    return position, b - 0.25 * (a - c) * shift
+
+# --- METHODS ---
+
+def hilbert_tracks(signals, sample_rate, band_Hz):
+    """Instantaneous frequency and amplitude (samples x channels) from the analytic signal."""
+    pad = int(PAD_CYCLES * sample_rate / band_Hz[0])
+
+    def block(x):
+        # Zero padding: the FFT-based transform would otherwise wrap the large start of
+        # the decay around onto its end
+        n = len(x)
+        analytic = hilbert(signal_filter.zero_phase_filter(x, sample_rate, band_Hz), N=next_fast_len(n + pad), axis=0)[:n]
+        phase = np.unwrap(np.angle(analytic), axis=0)
+        frequency = np.gradient(phase, axis=0) * sample_rate / (2 * np.pi)
+        return frequency, np.abs(analytic)
+
+    center = 0.5 * (band_Hz[0] + band_Hz[1])
+    frequency, amplitude = process_in_chunks(signals, CHUNK_SAMPLES, pad, block)
+    # The phase derivative ripples with noise and the second mode; average over a few periods
+    smoothing = max(int(INSTANTANEOUS_SMOOTHING_CYCLES * sample_rate / center), 1)
+    return uniform_filter1d(frequency, smoothing, axis=0), amplitude
+
+
+def cwt_ridge(signals, sample_rate, band_Hz):
+    """
+    Ridge of a Morlet continuous wavelet transform: for every sample the wavelet frequency
+    with the largest magnitude, refined by parabolic interpolation (log-frequency axis).
+    The wavelets are applied in the frequency domain (Gaussian of width f / CWT_CYCLES
+    on the positive frequencies, peak gain 1), so the magnitude is the amplitude.
+    """
+    frequencies = np.geomspace(band_Hz[0], band_Hz[1], CWT_VOICES)
+    pad = int(PAD_CYCLES * sample_rate / band_Hz[0])
+
+    def block(x):
+        n = len(x)
+        n_fft = next_fast_len(n + pad) # Zero padding against wrap-around, as in hilbert_tracks
+        spectrum = fft(x, n=n_fft, axis=0) # The wavelets have no gain at 0 Hz, no mean removal needed
+        freqs = fftfreq(n_fft, 1.0 / sample_rate)[:, None]
+        magnitude = np.empty((n, x.shape[1], CWT_VOICES), dtype=np.float32)
+        for k, f_k in enumerate(frequencies):
+            # One voice at a time keeps the memory at samples x channels x voices (float32)
+            wavelet = 2.0 * np.exp(-0.5 * ((freqs - f_k) * CWT_CYCLES / f_k) ** 2) * (freqs > 0)
+            magnitude[:, :, k] = np.abs(ifft(spectrum * wavelet, axis=0)[:n])
+        ridge = np.argmax(magnitude, axis=-1)
+        log_f, amplitude = parabolic_peak(magnitude.astype(float), ridge, np.log(frequencies))
+        return np.exp(log_f), amplitude
+
+    return process_in_chunks(signals, CHUNK_SAMPLES, pad, block)
+
+
+def stft_ridge(signals, sample_rate, band_Hz):
+    """
+    Ridge of the STFT (Hann window): frequency and amplitude of the strongest bin inside
+    the band for every frame. Frames are processed in batches (bounded memory).
+    Returns (frame_center_index, frequency, amplitude, (bin_freqs, magnitude of channel 1)).
+    """
+    center = 0.5 * (band_Hz[0] + band_Hz[1])
+    nperseg = min(int(STFT_WINDOW_CYCLES * sample_rate / center), len(signals))
+    hop = max(int(nperseg * STFT_HOP_FRACTION), 1)
+    n_fft = nperseg * STFT_ZERO_PADDING
+    window = np.hanning(nperseg)
+    bin_freqs = rfftfreq(n_fft, 1.0 / sample_rate)
+    in_band = np.flatnonzero((bin_freqs >= band_Hz[0]) & (bin_freqs <= band_Hz[1]))
+    in_band = np.arange(max(in_band[0] - 1, 0), min(in_band[-1] + 2, len(bin_freqs)))
+
+    starts = np.arange(0, len(signals) - nperseg + 1, hop)
+    batch = max(CHUNK_SAMPLES // nperseg, 1)
+    frequency, amplitude, first_channel = [], [], []
+    for i in range(0, len(starts), batch):
+        frames = sliding_window_view(signals, nperseg, axis=0)[starts[i:i + batch]] # frames x channels x nperseg
+        frames = frames - frames.mean(axis=-1, keepdims=True)
+        magnitude = np.abs(rfft(frames * window, n=n_fft, axis=-1)[..., in_band])
+        f, peak = parabolic_peak(magnitude, np.argmax(magnitude, axis=-1), bin_freqs[in_band])
+        frequency.append(f)
+        amplitude.append(2.0 * peak / window.sum())
+        first_channel.append(magnitude[:, 0, :])
+
+    spectrogram = (bin_freqs[in_band], 2.0 * np.concatenate(first_channel).T / window.sum())
+    return starts + nperseg // 2, np.concatenate(frequency), np.concatenate(amplitude), spectrogram
+
+# --- DAMPING AND AMPLITUDE CURVES ---
+
+def envelope_damping(amplitude, frequency, rate, cycles=None):
+    """
+    Damping ratio over time from the envelope slope: zeta = -d(ln A)/dt / (2 pi f),
+    with the slope from a Savitzky-Golay (local linear) fit over 'cycles' periods.
+    Vectorized over channels.
+    """
+    cycles = ZETA_WINDOW_CYCLES if cycles is None else cycles
+    window = int(cycles * rate / max(np.nanmedian(frequency), 1e-9)) // 2 * 2 + 1
+    window = max(min(window, (len(amplitude) - 1) // 2 * 2 + 1), 3)
+    if len(amplitude) < window:
+        return np.full(amplitude.shape, np.nan)
+    slope = savgol_filter(np.log(np.maximum(amplitude, 1e-12)), window, 1, deriv=1, delta=1.0 / rate, axis=0)
+    return -slope / (2 * np.pi * frequency)
+
+
+def amplitude_curves(amplitude, frequency, zeta, n_bins=None):
+    """
+    f(A) and zeta(A) of one channel: medians in logarithmic amplitude bins over the
+    decaying part of the record (after the largest amplitude, above the noise floor).
+    Returns a dict of arrays (amplitude, frequency_Hz, zeta, samples).
+    """
+    n_bins = AMPLITUDE_BINS if n_bins is None else n_bins
+    peak = int(np.argmax(amplitude))
+    a, f, z = amplitude[peak:], frequency[peak:], zeta[peak:]
+    floor = AMPLITUDE_FLOOR_FRACTION * amplitude[peak]
+    valid = (a > floor) & np.isfinite(z)
+    curves = {'amplitude': [], 'frequency_Hz': [], 'zeta': [], 'samples': []}
+    if valid.sum() < 3:
+        return {key: np.array(values) for key, values in curves.items()}
+
+    edges = np.geomspace(floor, amplitude[peak], n_bins + 1)
+    bins = np.digitize(a[valid], edges) - 1
+    for b in range(n_bins):
+        selected = bins == b
+        if selected.sum() < 3:
+            continue
+        curves['amplitude'].append(np.sqrt(edges[b] * edges[b + 1]))
+        curves['frequency_Hz'].append(np.median(f[valid][selected]))
+        curves['zeta'].append(np.median(z[valid][selected]))
+        curves['samples'].append(int(selected.sum()))
+    return {key: np.array(values) for key, values in curves.items()}
+
+# --- MAIN ANALYSIS LOGIC ---
+
+def analyze_time_frequency(input_path, tracks_path, curves_path, skip_samples, methods=None):
+    """
+    f(t), A(t) and zeta(t) of every channel with each method, plus the amplitude-dependent
+    frequency and damping curves f(A), zeta(A). Returns a dict {method: {...}}.
+    """
+    methods = METHODS if methods is None else methods
+    if not os.path.exists(input_path):
+        print(f"FATAL ERROR: Processed data file not found at: {input_path}")
+        sys.exit(1)
+
+    header = spectral_cache.read_header(input_path)
+    channels = CHANNELS or [c for c in header if c.startswith('displacement_')]
+    with profiler.stage('read_csv'):
+        columns = spectral_cache.read_columns(input_path, ['time_s'] + channels)
+
+    time_s = columns['time_s'][skip_samples:]
+    signals = np.column_stack([columns[c][skip_samples:] for c in channels]) # samples x channels
+    if len(time_s) < 2:
+        print("Error: Dataset is empty after skipping initial samples.")
+        return
+
+    gaps = timebase.detect_gaps(time_s)
+    if gaps['has_gaps']:
+        print(f"WARNING: {len(gaps['gap_indices'])} gap(s) in the time axis, resampling to a uniform grid.")
+        time_s, signals, _ = timebase.resample_uniform(time_s, signals, gaps['dt'])
+    Fs = 1.0 / (gaps['dt'] if gaps['has_gaps'] else np.mean(np.diff(time_s)))
+
+    band = FREQUENCY_BAND_HZ or signal_filter.band_around_mode(dominant_frequency(signals, Fs))
+    step = max(int(round(Fs / OUTPUT_RATE_HZ)), 1)
+
+    def compute():
+        result = {}
+        for method in methods:
+            with profiler.stage(method):
+                if method == 'stft':
+                    centers, frequency, amplitude, (bin_freqs, spectrogram) = stft_ridge(signals, Fs, band)
+                    result['spectrogram'] = spectrogram
+                    result['spectrogram_freqs'] = bin_freqs
+                    result['spectrogram_time'] = time_s[centers]
+                    t = time_s[centers]
+                else:
+                    frequency, amplitude = (hilbert_tracks if method == 'hilbert' else cwt_ridge)(signals, Fs, band)
+                    frequency, amplitude, t = frequency[::step], amplitude[::step], time_s[::step]
+            profiler.add_items(method, signals.size)
+            rate = 1.0 / np.median(np.diff(t)) if len(t) > 1 else OUTPUT_RATE_HZ
+            result[f'{method}_time'] = t
+            result[f'{method}_frequency'] = frequency
+            result[f'{method}_amplitude'] = amplitude
+            result[f'{method}_zeta'] = envelope_damping(amplitude, frequency, rate)
+        return result
+
+    with profiler.stage('time_frequency'):
+        result = spectral_cache.cached_for_file(
+            input_path, compute,
+            analysis='time_frequency', columns=channels, skip_samples=skip_samples, band=band, methods=list(methods),
+            output_rate=OUTPUT_RATE_HZ, cwt=(CWT_CYCLES, CWT_VOICES), stft=(STFT_WINDOW_CYCLES, STFT_HOP_FRACTION, STFT_ZERO_PADDING),
+            smoothing=INSTANTANEOUS_SMOOTHING_CYCLES, zeta_window=ZETA_WINDOW_CYCLES
+        )
+
+    print(f"\n--- Time-Frequency Analysis ---")
+    print(f"Channels: {len(channels)}, Samples: {len(signals)}, Fs: {Fs:.2f} Hz")
+    print(f"Band: {band[0]:.3f} - {band[1]:.3f} Hz, Methods: {', '.join(methods)}")
+
+    tracks, curve_rows, summary = [], [], {}
+    analysis = {}
+    for method in methods:
+        t = result[f'{method}_time']
+        analysis[method] = {'time_s': t, 'frequency': result[f'{method}_frequency'], 'curves': {}}
+        for i, channel in enumerate(channels):
+            f, a, z = (result[f'{method}_{key}'][:, i] for key in ('frequency', 'amplitude', 'zeta'))
+            tracks.append(pd.DataFrame({'method': method, 'channel': channel, 'time_s': t,
+                                        'frequency_Hz': f, 'amplitude': a, 'zeta': z}))
+            curves = amplitude_curves(a, f, z)
+            analysis[method]['curves'][channel] = curves
+            curve_rows.append(pd.DataFrame({'method': method, 'channel': channel, **curves}))
+
+            if len(curves['amplitude']):
+                # Highest and lowest amplitude bin: the frequency/damping change over the decay
+                print(f"{method:<8} {channel:<22} f: {curves['frequency_Hz'][-1]:.3f} Hz (A = {curves['amplitude'][-1]:.3g})"
+                      f" -> {curves['frequency_Hz'][0]:.3f} Hz (A = {curves['amplitude'][0]:.3g}),"
+                      f"  zeta: {curves['zeta'][-1]:.4f} -> {curves['zeta'][0]:.4f}")
+                summary[f"{method} {channel} f (Hz, high -> low A)"] = f"{curves['frequency_Hz'][-1]:.3f} -> {curves['frequency_Hz'][0]:.3f}"
+            else:
+                print(f"{method:<8} {channel:<22} no decay above the amplitude floor")
+
+    for path, frames in ((tracks_path, tracks), (curves_path, curve_rows)):
+        output_dir = os.path.dirname(path)
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        pd.concat(frames, ignore_index=True).to_csv(path, index=False)
+    print(f"\nTracks saved to: {tracks_path}")
+    print(f"Amplitude curves saved to: {curves_path}")
+
+    spectrogram = None
+    if 'spectrogram' in result:
+        spectrogram = (result['spectrogram_time'], result['spectrogram_freqs'], result['spectrogram'])
+    report_renderer.show_or_export(
+        'time_frequency', report_renderer.draw_time_frequency,
+        (analysis, channels, spectrogram), figsize=(12, 10), summary=summary
+    )
+    return analysis
+
+if __name__ == "__main__":
+    analyze_time_frequency(INPUT_CSV_PATH, OUTPUT_TRACKS_PATH, OUTPUT_CURVES_PATH, SKIP_INITIAL_SAMPLES)
@@ -0,0 +1,136 @@
+import numpy as np
+
+# --- CONFIGURATION (EDIT THIS) ---
+
+# 1. GAP DETECTION
+# A time step longer than GAP_TOLERANCE x the nominal frame interval counts as a gap
+# (frames dropped by the camera/encoder, or frames where tracking failed).
+GAP_TOLERANCE = 1.5
+
+# 2. SPECTRUM METHOD FOR RECORDS WITH GAPS
+# 'resample'     : linear interpolation onto a uniform grid, then the normal FFT (fast).
+# 'lomb_scargle' : least-squares spectrum evaluated directly on the real timestamps (no interpolation).
+NONUNIFORM_METHOD = 'resample'
+
+# If more than this fraction of the uniform grid would have to be interpolated,
+# 'resample' falls back to 'lomb_scargle' (interpolating large gaps invents data).
+MAX_INTERPOLATED_FRACTION = 0.2
+
+# --- CORE FUNCTIONS ---
+
+def nominal_interval(time_s):
+    """Nominal sample interval: the median time step (robust against gaps)."""
+    return float(np.median(np.diff(time_s)))
+
+
+def detect_gaps(time_s, tolerance=None):
+    """
+    Finds the gaps in a timestamp array.
+    Returns a dict with the nominal interval, the indices i where time_s[i+1] - time_s[i]
+    is a gap, and the estimated number of missing samples. Steps much shorter than the
+    nominal interval (denser stretches, e.g. from adaptive frame skipping) are listed in
+    'dense_indices'; either kind makes 'has_gaps' True, i.e. the record is not uniform.
+    """
+    tolerance = GAP_TOLERANCE if tolerance is None else tolerance
+    time_s = np.asarray(time_s, dtype=float)
+    steps = np.diff(time_s)
+    dt = float(np.median(steps))
+    gap_indices = np.flatnonzero(steps > tolerance * dt)
+    dense_indices = np.flatnonzero(steps < dt / tolerance)
+    missing = int(np.sum(np.round(steps[gap_indices] / dt) - 1)) if len(gap_indices) else 0
+    return {'dt': dt, 'gap_indices': gap_indices, 'dense_indices': dense_indices, 'missing_samples': missing,
+            'has_gaps': bool(len(gap_indices) or len(dense_indices)),
+            'missing_fraction': missing / max(len(time_s) + missing, 1)}
+
+
+def resample_uniform(time_s, signals, dt=None):
+    """
+    Linearly interpolates one signal (1-D) or several columns (2-D, samples x channels)
+    onto a uniform time grid with step dt (default: the nominal interval).
+    Returns (uniform_time_s, uniform_signals, interpolated_mask), where the mask marks
+    grid points that fall inside a gap (i.e. were not measured).
+    """
+    time_s = np.asarray(time_s, dtype=float)
+    signals = np.asarray(signals, dtype=float)
+    dt = nominal_interval(time_s) if dt is None else dt
+
+    n_uniform = int(np.floor((time_s[-1] - time_s[0]) / dt + 1e-9)) + 1
+    uniform_time = time_s[0] + np.arange(n_uniform) * dt
+
+    if signals.ndim == 1:
+        uniform = np.interp(uniform_time, time_s, signals)
+    else:
+        # Interpolation weights are computed once and applied to all channels
+        right = np.clip(np.searchsorted(time_s, uniform_time, side='right'), 1, len(time_s) - 1)
+        left = right - 1
+        weight = (uniform_time - time_s[left]) / (time_s[right] - time_s[left])
+        uniform = signals[left] + weight[:, None] * (signals[right] - signals[left])
+
+    # Grid points farther than half a step from the nearest real sample were invented
+    nearest = np.clip(np.searchsorted(time_s, uniform_time), 1, len(time_s) - 1)
+    distance = np.minimum(np.abs(uniform_time - time_s[nearest - 1]), np.abs(time_s[nearest] - uniform_time))
+    interpolated = distance > 0.5 * dt
+
+    return uniform_time, uniform, interpolated
+
+
+def fill_missing(time_s, signals):
+    """
+    Linearly interpolates the NaN samples (e.g. frames where the rotation fit failed) of one
+    signal or of every column of a (samples x channels) array from their valid neighbours in
+    time; NaNs at the ends take the nearest valid value. Columns without any valid sample
+    stay NaN. Returns (filled copy, number of filled samples per column).
+    """
+    time_s = np.asarray(time_s, dtype=float)
+    filled = np.array(signals, dtype=float)
+    columns = filled[:, None] if filled.ndim == 1 else filled
+    missing = np.isnan(columns)
+    for i in np.flatnonzero(missing.any(axis=0) & ~missing.all(axis=0)):
+        valid = ~missing[:, i]
+        columns[~valid, i] = np.interp(time_s[~valid], time_s[valid], columns[valid, i])
+    return filled, missing.sum(axis=0)
+
+
+def lomb_scargle_spectrum(time_s, signal, frequencies_Hz):
+    """
+    Single-sided amplitude spectrum of a non-uniformly sampled signal (Lomb-Scargle),
+    scaled like the FFT amplitude spectrum 2/N*|FFT| so the two can be compared.
+    """
+    time_s = np.asarray(time_s, dtype=float)
+    signal = np.asarray(signal, dtype=float)
+    amplitude = np.zeros(len(frequencies_Hz))
+
+    # lombscargle is undefined at 0 Hz: the DC bin is left at zero (the mean is removed anyway)
+    positive = frequencies_Hz > 0
+    from scipy.signal import lombscargle # Slow import, only needed for records with gaps
+    power = lombscargle(time_s, signal - np.mean(signal), 2 * np.pi * frequencies_Hz[positive])
+    amplitude[positive] = np.sqrt(4.0 * power / len(signal))
+    return amplitude
+
+
+def amplitude_spectrum(time_s, signal, method=None):
+    """
+    Amplitude spectrum of a record that may contain gaps.
+    Returns (xf, psd, info) with the same frequency grid and scaling as the uniform FFT
+    (0 ... Fs/2 in steps of 1/(N*dt)); 'info' describes the gaps and the method used.
+    """
+    method = NONUNIFORM_METHOD if method is None else method
+    gaps = detect_gaps(time_s)
+    dt = gaps['dt']
+
+    if method == 'resample' and gaps['missing_fraction'] > MAX_INTERPOLATED_FRACTION:
+        method = 'lomb_scargle'
+
+    if method == 'resample':
+        _, uniform, _ = resample_uniform(time_s, signal, dt)
+        N = len(uniform)
+        yf = np.fft.rfft(uniform)
+        xf = np.fft.rfftfreq(N, dt)[:N//2]
+        psd = 2.0/N * np.abs(yf[:N//2])
+    else:
+        N = int(round((time_s[-1] - time_s[0]) / dt)) + 1
+        xf = np.arange(N//2) / (N * dt)
+        psd = lomb_scargle_spectrum(time_s, signal, xf)
+
+    info = dict(gaps, method=method)
+    return xf, psd, info
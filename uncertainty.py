@@ -0,0 +1,322 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.fft import rfft, rfftfreq
+import contextlib
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import profiler
+import report_renderer
+import signal_filter
+import spectral_cache
+import time_frequency
+import timebase
+from script_loader import load_script
+
+# --- CONFIGURATION (EDIT THIS) ---
+
+# 1. INPUT / OUTPUT FILES
+# The processed data file (in millimeters) from calibration_converter.py.
+INPUT_CSV_PATH = 'data/processed_vibration_data.csv'
+OUTPUT_CSV_PATH = 'data/uncertainty.csv' # Estimate, standard deviation and interval per quantity
+REFERENCE_COLUMN = 'displacement_M1_mm'  # f_n, amplitude and damping
+SECOND_COLUMN = 'displacement_M2_mm'     # Relative phase to the reference (None = no phase)
+SKIP_INITIAL_SAMPLES = 50
+FREQUENCY_RANGE_HZ = (0.5, None)         # Band searched for f_n (min, max); None = Nyquist
+
+# 2. METHODS
+# 'bootstrap'  : moving-block bootstrap over overlapping spectral segments (ambient or long
+#                records): f_n, amplitude and phase. Vectorized, a few hundred replicates
+#                take well under a second. The decay of an impact test is not stationary,
+#                so the damping ratio is not bootstrapped.
+# 'monte_carlo': the whole record is re-analyzed with random tracking noise and a random
+#                calibration error: f_n, amplitude, phase and the damping ratio (the same
+#                band-pass + logarithmic decrement as damping_calculator.py), on a process pool.
+METHODS = ['bootstrap', 'monte_carlo']
+CONFIDENCE_LEVEL = 0.95
+SEED = 0
+
+# 3. BUDGET
+# Monte Carlo stops at N_REPLICATES or after TIME_BUDGET_S seconds, whichever comes first;
+# the intervals are computed from the replicates finished by then.
+N_REPLICATES = 500
+TIME_BUDGET_S = 30.0
+WORKERS = max(1, (os.cpu_count() or 2) - 1)
+BATCH_REPLICATES = 20 # Replicates per pool task (their spectra are computed in one call)
+BATCH_MEMORY_MB = 200 # ...but a task never holds more noisy copies of the record than this
+BATCH_BUDGET_FRACTION = 0.05 # ...and never runs longer than this share of TIME_BUDGET_S (measured per replicate)
+
+# 4. BOOTSTRAP SETTINGS
+SEGMENT_SECONDS = 10.0 # Spectral segment (Hann window, 50 % overlap); sets the frequency resolution
+BLOCK_SEGMENTS = 3     # Consecutive segments drawn together (keeps the correlation of overlapping segments)
+
+# 5. MONTE CARLO NOISE MODEL
+# Tracking noise (px, white, independent per marker). None = estimated from the record:
+# the noise floor above NOISE_BAND_FRACTION of the Nyquist frequency, extrapolated to the full band.
+TRACKING_NOISE_PX = None
+NOISE_BAND_FRACTION = 0.6
+# Calibration: the ruler points are clicked with this uncertainty (px) on each end, so the
+# measured distance D_px is off by sqrt(2) x this. Scales all amplitudes, not f_n, zeta or phase.
+CALIBRATION_CLICK_PX = 1.0
+
+QUANTITIES = ['f_n_Hz', 'amplitude_mm', 'relative_phase_deg', 'zeta']
+
+# --- ESTIMATORS ---
+# Written for a leading batch axis, so many replicates are evaluated in one call.
+
+def peak_estimates(xf, power, cross, window_sum, band_Hz=None):
+    """
+    f_n (parabolic on the log power), amplitude (mm) and relative phase (0...180 deg, like
+    mode_shape_analyzer.py) from auto-spectra 'power' and cross-spectra 'cross' (... x bins).
+    """
+    band_Hz = FREQUENCY_RANGE_HZ if band_Hz is None else band_Hz
+    low, high = band_Hz
+    in_band = (xf >= (low or 0)) & (xf <= (high or xf[-1]))
+    index = np.argmax(np.where(in_band, power, -np.inf), axis=-1)
+    f_n, log_peak = time_frequency.parabolic_peak(np.log(power + 1e-300), index, xf)
+    amplitude = 2.0 * np.sqrt(np.exp(log_peak)) / window_sum
+    phase = np.full(f_n.shape, np.nan)
+    if cross is not None:
+        phase = np.abs(np.degrees(np.angle(np.take_along_axis(cross, index[..., None], -1)[..., 0])))
+    return f_n, amplitude, phase
+
+
+def spectral_estimates(signals, sample_rate, band_Hz=None):
+    """Estimates of whole records: signals is (... x samples x channels), channel 0 is the reference."""
+    window = np.hanning(signals.shape[-2])
+    X = rfft((signals - signals.mean(axis=-2, keepdims=True)) * window[:, None], axis=-2)
+    xf = rfftfreq(signals.shape[-2], 1.0 / sample_rate)
+    cross = X[..., 1] * np.conj(X[..., 0]) if signals.shape[-1] > 1 else None
+    return peak_estimates(xf, np.abs(X[..., 0]) ** 2, cross, window.sum(), band_Hz)
+
+
+def damping_estimate(damping, time_s, y, f_n):
+    """
+    Damping ratio as damping_calculator.py computes it with APPROX_NATURAL_FREQUENCY_HZ = f_n
+    (same optional band-pass, centred on the spectral peak of y); NaN if it finds too few peaks.
+    """
+    if not np.isfinite(f_n) or f_n <= 0:
+        return np.nan
+    time_s, y, _, _ = damping.filter_around_mode(time_s, y)
+    # Silences the "fewer than 3 peaks" messages and the log of a noise peak below zero (-> NaN)
+    with contextlib.redirect_stdout(io.StringIO()), np.errstate(invalid='ignore'):
+        zeta, _ = damping.calculate_logarithmic_decrement(y, time_s, f_n)
+    return np.nan if zeta is None else zeta
+
+
+def estimate_noise_mm(signal, sample_rate, fraction=None):
+    """White-noise level from the spectrum above fraction x Nyquist (where the structure has no modes)."""
+    fraction = NOISE_BAND_FRACTION if fraction is None else fraction
+    high_band = signal_filter.zero_phase_filter(signal, sample_rate, (fraction * sample_rate / 2.0, None))
+    return float(np.std(high_band) / np.sqrt(1.0 - fraction))
+
+# --- BLOCK BOOTSTRAP ---
+
+def segment_spectra(signals, sample_rate, segment_seconds=None):
+    """Hann-windowed spectra of 50 %-overlapping segments: (segments x bins x channels)."""
+    segment_seconds = SEGMENT_SECONDS if segment_seconds is None else segment_seconds
+    n_segment = min(int(segment_seconds * sample_rate), len(signals))
+    segments = sliding_window_view(signals, n_segment, axis=0)[::max(n_segment // 2, 1)] # segments x channels x n
+    window = np.hanning(n_segment)
+    X = rfft((segments - segments.mean(axis=-1, keepdims=True)) * window, axis=-1)
+    return rfftfreq(n_segment, 1.0 / sample_rate), np.moveaxis(X, 1, 2), window.sum()
+
+
+def block_bootstrap(signals, sample_rate, n_replicates, rng, block=None):
+    """
+    Moving-block bootstrap of the averaged spectrum. Every replicate is a weight vector over the
+    segments (how often each one was drawn), so all replicates are one matrix product.
+    Returns (replicates, estimates from the plain average of all segments, number of segments).
+    """
+    block = BLOCK_SEGMENTS if block is None else block
+    xf, X, window_sum = segment_spectra(signals, sample_rate, SEGMENT_SECONDS)
+    n_segments = len(X)
+    block = max(1, min(block, n_segments))
+    n_blocks = int(np.ceil(n_segments / block))
+    starts = rng.integers(0, n_segments - block + 1, size=(n_replicates, n_blocks))
+    drawn = (starts[:, :, None] + np.arange(block)).reshape(n_replicates, -1)[:, :n_segments]
+    weights = np.zeros((n_replicates, n_segments))
+    np.add.at(weights, (np.arange(n_replicates)[:, None], drawn), 1.0 / n_segments)
+    weights = np.vstack([np.full(n_segments, 1.0 / n_segments), weights]) # Row 0: the estimate itself
+
+    power = weights @ (np.abs(X[..., 0]) ** 2)
+    cross = weights @ (X[..., 1] * np.conj(X[..., 0])) if X.shape[-1] > 1 else None
+    results = dict(zip(['f_n_Hz', 'amplitude_mm', 'relative_phase_deg'], peak_estimates(xf, power, cross, window_sum)))
+    return ({q: values[1:] for q, values in results.items()},
+            {q: float(values[0]) for q, values in results.items()}, n_segments)
+
+# --- MONTE CARLO (PROCESS POOL) ---
+
+_worker_data = {}
+
+
+def init_worker(time_s, signals, sample_rate, noise_mm, calibration_std, band_Hz):
+    """
+    Pool initializer: the record is sent to every worker once, not with every task.
+    The band is passed along, so an overridden FREQUENCY_RANGE_HZ also reaches spawned workers.
+    """
+    _worker_data.update(time_s=time_s, signals=signals, sample_rate=sample_rate, noise_mm=noise_mm, band_Hz=band_Hz,
+                        calibration_std=calibration_std, damping=load_script('damping'))
+
+
+def monte_carlo_batch(seeds):
+    """Re-analyzes one noisy, re-scaled copy of the record per seed; returns ((n x quantities) estimates, seconds taken)."""
+    start = time.perf_counter()
+    data = _worker_data
+    signals = data['signals']
+    n_replicates = len(seeds)
+    noisy = np.empty((n_replicates,) + signals.shape)
+    for i, seed in enumerate(seeds):
+        rng = np.random.default_rng(seed)
+        scale = 1.0 + data['calibration_std'] * rng.standard_normal()
+        noisy[i] = scale * (signals + data['noise_mm'] * rng.standard_normal(signals.shape))
+
+    f_n, amplitude, phase = spectral_estimates(noisy, data['sample_rate'], data['band_Hz'])
+    zeta = [damping_estimate(data['damping'], data['time_s'], noisy[i, :, 0], f_n[i]) for i in range(n_replicates)]
+    return np.column_stack([f_n, amplitude, phase, zeta]), time.perf_counter() - start
+
+
+def run_monte_carlo(time_s, signals, sample_rate, noise_mm, calibration_std,
+                    n_replicates=None, time_budget_s=None, workers=None):
+    """
+    Runs batches on a process pool until n_replicates are done or the time budget is used up.
+    Every replicate has its own seed (SeedSequence), so the result does not depend on the batching.
+    The first batches hold one replicate; later ones are sized from the measured time per replicate so
+    that a batch still running when the budget expires (and is abandoned) overruns it only a little.
+    Returns the estimates and the real elapsed time.
+    """
+    n_replicates = N_REPLICATES if n_replicates is None else n_replicates
+    time_budget_s = TIME_BUDGET_S if time_budget_s is None else time_budget_s
+    workers = WORKERS if workers is None else workers
+    batch = max(1, min(BATCH_REPLICATES, int(BATCH_MEMORY_MB * 1e6 / (3 * signals.nbytes))))
+    seeds = np.random.SeedSequence([SEED, 1]).spawn(n_replicates)
+    results = []
+    submitted = 0
+    per_replicate_s = None
+    start = time.perf_counter()
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                               initargs=(time_s, signals, sample_rate, noise_mm, calibration_std, FREQUENCY_RANGE_HZ))
+    try:
+        pending = set()
+        while True:
+            # Keep two batches per worker in flight while there is budget left
+            while submitted < n_replicates and len(pending) < 2 * workers and time.perf_counter() - start < time_budget_s:
+                size = 1 if per_replicate_s is None else max(1, min(batch, int(BATCH_BUDGET_FRACTION * time_budget_s / per_replicate_s)))
+                size = min(size, n_replicates - submitted)
+                pending.add(pool.submit(monte_carlo_batch, seeds[submitted:submitted + size]))
+                submitted += size
+            if not pending:
+                break
+            done, pending = wait(pending, timeout=max(time_budget_s - (time.perf_counter() - start), 0.0),
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                estimates, seconds = future.result()
+                results.append(estimates)
+                per_replicate_s = max(per_replicate_s or 0.0, seconds / len(estimates))
+            if time.perf_counter() - start >= time_budget_s:
+                break
+    finally:
+        # Don't wait for batches still running: their results would come in after the budget anyway
+        pool.shutdown(wait=False, cancel_futures=True)
+    estimates = np.vstack(results) if results else np.empty((0, len(QUANTITIES)))
+    return dict(zip(QUANTITIES, estimates.T)), time.perf_counter() - start
+
+
+def interval(samples, level=None):
+    """Standard deviation and percentile interval of the finite replicates."""
+    level = CONFIDENCE_LEVEL if level is None else level
+    samples = samples[np.isfinite(samples)]
+    if len(samples) < 2:
+        return np.nan, np.nan, np.nan, len(samples)
+    alpha = 100 * (1 - level) / 2
+    low, high = np.percentile(samples, [alpha, 100 - alpha])
+    return float(np.std(samples, ddof=1)), float(low), float(high), len(samples)
+
+# --- MAIN ANALYSIS LOGIC ---
+
+def analyze_uncertainty(input_path, output_path, skip_samples, methods=None):
+    """
+    Point estimates of f_n, amplitude, relative phase and zeta with their confidence
+    intervals from a block bootstrap and/or a Monte Carlo over tracking and calibration noise.
+    """
+    methods = METHODS if methods is None else methods
+    if not os.path.exists(input_path):
+        print(f"FATAL ERROR: Processed data file not found at: {input_path}")
+        sys.exit(1)
+
+    columns = [REFERENCE_COLUMN] + ([SECOND_COLUMN] if SECOND_COLUMN else [])
+    missing = [c for c in columns if c not in spectral_cache.read_header(input_path)]
+    if missing:
+        print(f"FATAL ERROR: Column(s) {missing} not found in {input_path}")
+        sys.exit(1)
+
+    with profiler.stage('read_csv'):
+        data = spectral_cache.read_columns(input_path, ['time_s'] + columns)
+    time_s = data['time_s'][skip_samples:]
+    signals = np.column_stack([data[c][skip_samples:] for c in columns])
+    if timebase.detect_gaps(time_s)['has_gaps']:
+        print("WARNING: Gaps in the time axis, resampling to a uniform grid.")
+        time_s, signals, _ = timebase.resample_uniform(time_s, signals)
+    Fs = 1.0 / timebase.nominal_interval(time_s)
+
+    damping = load_script('damping')
+    f_n, amplitude, phase = [float(v) for v in spectral_estimates(signals, Fs)]
+    # Whole-record estimates; the bootstrap has its own (the Welch average of the segments it resamples)
+    estimates = {'record': {'f_n_Hz': f_n, 'amplitude_mm': amplitude, 'relative_phase_deg': phase,
+                                 'zeta': damping_estimate(damping, time_s, signals[:, 0], f_n)}}
+
+    converter = load_script('converter')
+    mm_per_px = converter.KNOWN_PHYSICAL_DISTANCE_MM / converter.MEASURED_PIXEL_DISTANCE
+    noise_mm = TRACKING_NOISE_PX * mm_per_px if TRACKING_NOISE_PX is not None else estimate_noise_mm(signals[:, 0], Fs)
+    calibration_std = np.sqrt(2) * CALIBRATION_CLICK_PX / converter.MEASURED_PIXEL_DISTANCE
+
+    rng = np.random.default_rng(SEED)
+    samples = {}
+    notes = {}
+    if 'bootstrap' in methods:
+        with profiler.stage('block_bootstrap'):
+            samples['bootstrap'], estimates['bootstrap'], n_segments = block_bootstrap(signals, Fs, N_REPLICATES, rng, BLOCK_SEGMENTS)
+        notes['bootstrap'] = f"{N_REPLICATES} replicates of {n_segments} segments ({SEGMENT_SECONDS:g} s, blocks of {BLOCK_SEGMENTS})"
+        if n_segments < 10:
+            print(f"WARNING: Only {n_segments} bootstrap segments; the intervals are unreliable (shorten SEGMENT_SECONDS).")
+    if 'monte_carlo' in methods:
+        with profiler.stage('monte_carlo'):
+            samples['monte_carlo'], elapsed = run_monte_carlo(time_s, signals, Fs, noise_mm, calibration_std,
+                                                              N_REPLICATES, TIME_BUDGET_S, WORKERS)
+        done = len(samples['monte_carlo']['f_n_Hz'])
+        notes['monte_carlo'] = (f"{done} replicates in {elapsed:.1f} s on {WORKERS} worker(s), noise {noise_mm:.2e} mm, "
+                                f"calibration {100 * calibration_std:.2f} %")
+        if done < N_REPLICATES:
+            print(f"NOTE: Time budget reached after {done} of {N_REPLICATES} Monte Carlo replicates.")
+
+    rows = []
+    for method, method_samples in samples.items():
+        for quantity, values in method_samples.items():
+            std, low, high, n = interval(values)
+            rows.append({'method': method, 'quantity': quantity, 'estimate': estimates.get(method, estimates['record'])[quantity], 'std': std,
+                         'ci_low': low, 'ci_high': high, 'confidence': CONFIDENCE_LEVEL, 'replicates': n})
+
+    print(f"\n--- Uncertainty ({CONFIDENCE_LEVEL:.0%} intervals, Fs = {Fs:.2f} Hz) ---")
+    for method, note in notes.items():
+        print(f"{method}: {note}")
+    for row in rows:
+        print(f"{row['method']:<12} {row['quantity']:<20} {row['estimate']:10.4f}  +/- {row['std']:.4f}  "
+              f"[{row['ci_low']:.4f}, {row['ci_high']:.4f}]")
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    pd.DataFrame(rows).to_csv(output_path, index=False)
+    print(f"\nUncertainty table saved to: {output_path}")
+
+    report_renderer.show_or_export(
+        'uncertainty', report_renderer.draw_uncertainty, (samples, rows),
+        summary={f"{r['method']} {r['quantity']}": f"{r['estimate']:.4f} [{r['ci_low']:.4f}, {r['ci_high']:.4f}]" for r in rows}
+    )
+    return {'estimates': estimates, 'intervals': rows}
+
+if __name__ == "__main__":
+    analyze_uncertainty(INPUT_CSV_PATH, OUTPUT_CSV_PATH, SKIP_INITIAL_SAMPLES)
@@ -1,10 +1,13 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 from scipy.fft import fft, fftfreq
 from scipy.signal import detrend
 import os
 import sys
+import profiler
+import report_renderer
+import spectral_cache
+import timebase
 
 # --- CONFIGURATION (UPDATED FOR REAL DATA PIPELINE) ---
 
@@ -25,8 +28,10 @@ TARGET_COLUMN = 'Displacement_D1_mm'
 SKIP_INITIAL_SAMPLES = 450 
 
 # 4. ASSUMED VIDEO FRAME RATE
-# CRITICAL: Must match the VIDEO_FRAME_RATE used when generating the raw data.
+# Fallback only: the sample rate is measured from the 'time_s' timestamps when
+# USE_MEASURED_TIMESTAMPS is True. Must match the VIDEO_FRAME_RATE otherwise.
 Fs_estimate = 90.0 # Frames per second (Hz)
+USE_MEASURED_TIMESTAMPS = True
 
 # 5. ACCURACY TARGET (Used for reporting against the theoretical value)
 THEORETICAL_FN = 25.0 # The user's known theoretical value (Hz)
@@ -45,20 +50,23 @@ def analyze_vibration(input_path, freq_output_path, damping_output_path, target_
         sys.exit(1)
         
     try:
-        df = pd.read_csv(input_path)
+        available_columns = pd.read_csv(input_path, nrows=0).columns
     except Exception as e:
         print(f"FATAL ERROR: Could not read CSV file: {e}")
         sys.exit(1)
     
     # Ensure the target column exists
-    if target_column not in df.columns:
+    if target_column not in available_columns:
         print(f"FATAL ERROR: Column '{target_column}' not found in the CSV file.")
-        print(f"Available columns: {df.columns.tolist()}")
+        print(f"Available columns: {available_columns.tolist()}")
         sys.exit(1)
 
-    T = 1.0 / Fs # Time step
-    data_raw = df[target_column].values
-    time_raw = df['time_s'].values
+    # Parsed columns are cached, so re-analyzing the same file skips the full CSV parse
+    with profiler.stage('read_csv'):
+        columns = spectral_cache.read_columns(input_path, ['time_s', target_column])
+
+    data_raw = columns[target_column]
+    time_raw = columns['time_s']
     
     if skip_samples >= len(data_raw):
         print(f"ERROR: SKIP_INITIAL_SAMPLES ({skip_samples}) is too large. Total samples: {len(data_raw)}")
@@ -67,6 +75,16 @@ def analyze_vibration(input_path, freq_output_path, damping_output_path, target_
     # 2. Prepare and Detrend Data
     data_analysis = data_raw[skip_samples:]
     time_analysis = time_raw[skip_samples:]
+
+    # Measure the sample rate from the real timestamps, and fill gaps left by dropped
+    # frames or tracking failures by resampling onto a uniform grid (needed by the FFT).
+    if USE_MEASURED_TIMESTAMPS and len(time_analysis) > 1:
+        gaps = timebase.detect_gaps(time_analysis)
+        Fs = 1.0 / gaps['dt']
+        if gaps['has_gaps']:
+            print(f"WARNING: {len(gaps['gap_indices'])} gap(s) in the time axis (~{gaps['missing_samples']} missing samples), resampling.")
+            time_analysis, data_analysis, _ = timebase.resample_uniform(time_analysis, data_analysis, gaps['dt'])
+    T = 1.0 / Fs # Time step
     N_total = len(data_raw)
     N = len(data_analysis)
     
@@ -74,19 +92,33 @@ def analyze_vibration(input_path, freq_output_path, damping_output_path, target_
     data_detrended = detrend(data_analysis, type='constant')
 
     # 3. Perform Fast Fourier Transform (FFT)
-    yf = np.fft.fft(data_detrended)
-    xf = np.fft.fftfreq(N, T)[:N//2]
-    # Power Spectral Density (PSD)
-    PSD = 2.0/N * np.abs(yf[0:N//2])
+    def spectrum_and_peak():
+        yf = np.fft.fft(data_detrended)
+        xf = np.fft.fftfreq(N, T)[:N//2]
+        # Power Spectral Density (PSD)
+        PSD = 2.0/N * np.abs(yf[0:N//2])
+        # Peak excluding the 0 Hz DC component
+        return {'xf': xf, 'psd': PSD, 'peak_index': int(np.argmax(PSD[1:]) + 1)}
+
+    # The spectrum is cached on disk, keyed by the file contents and the analysis settings
+    with profiler.stage('fft'):
+        spectrum = spectral_cache.cached_for_file(
+            input_path, spectrum_and_peak,
+            analysis='detrended_amplitude_spectrum', column=target_column,
+            skip_samples=skip_samples, Fs=Fs, window='none'
+        )
+    profiler.add_items('fft', N)
+    xf, PSD = spectrum['xf'], spectrum['psd']
     
     # 4. Find the Peak Natural Frequency (excluding 0 Hz DC component)
-    peak_index = np.argmax(PSD[1:]) + 1 
+    peak_index = spectrum['peak_index']
     f_n = xf[peak_index]
     
     # 5. Export Data and Frequency
     # Save the detrended signal for the damping calculation script
     df_decay = pd.DataFrame({'time_index': np.arange(N), 'displacement_mm': data_detrended})
-    df_decay.to_csv(damping_output_path, index=False)
+    with profiler.stage('csv_write'):
+        df_decay.to_csv(damping_output_path, index=False)
     
     # Save frequency and Fs to the config file
     try:
@@ -107,26 +139,14 @@ def analyze_vibration(input_path, freq_output_path, damping_output_path, target_
     print(f"Detrended signal saved for damping analysis to: {damping_output_path}")
 
     # 6. Plotting
-    fig, axes = plt.subplots(2, 1, figsize=(12, 8))
-    
-    # --- Top Plot: Time History ---
-    axes[0].plot(time_raw, data_raw, label=f'Calibrated Displacement ({target_column})')
-    axes[0].axvline(x=time_raw[skip_samples], color='r', linestyle='--', label='Analysis Start Point', linewidth=2)
-    axes[0].set_title(f"Vibration Analysis - Calculated F_n: {f_n:.3f} Hz")
-    axes[0].set_xlabel("Time (s)"); axes[0].set_ylabel("Displacement (mm)"); axes[0].grid(True, linestyle='--')
-    axes[0].legend()
-    
-    # --- Bottom Plot: Frequency Spectrum ---
-    axes[1].plot(xf, PSD, color='red', label='Power Spectral Density')
-    axes[1].scatter(f_n, PSD[peak_index], color='green', s=100, label=f'Peak F_n: {f_n:.3f} Hz', zorder=5)
-    axes[1].set_title("Frequency Spectrum (FFT/PSD)"); axes[1].set_xlabel("Frequency (Hz)"); 
-    axes[1].set_ylabel("Amplitude (mm)"); 
-    axes[1].set_xlim(0, Fs / 2); 
-    axes[1].set_ylim(0, np.max(PSD) * 1.2)
-    axes[1].grid(True, linestyle='--'); axes[1].legend()
-
-    plt.tight_layout()
-    plt.show()
+    # Opens a window, or exports PNG/SVG/HTML in the background when SHM_HEADLESS=1
+    report_renderer.show_or_export(
+        f"vibration2_{target_column}",
+        report_renderer.draw_analysis_with_start,
+        (time_raw, data_raw, time_raw[skip_samples], xf, PSD, peak_index, target_column, Fs),
+        figsize=(12, 8),
+        summary={'f_n (Hz)': f"{f_n:.3f}", 'Theoretical f_n (Hz)': theoretical_fn, 'Accuracy (%)': f"{accuracy:.2f}"}
+    )
 
 if __name__ == "__main__":
     output_dir = os.path.dirname(NATURAL_FREQUENCY_OUTPUT_PATH)